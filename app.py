@@ -3,112 +3,25 @@ import json
 import os
 import random
 import base64
-import edge_tts
-import asyncio
-import re
-import tempfile
 import html
+import uuid
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
-
-# ==================== System Instruction ====================
-# 基础教练指令（所有模式共享）
-BASE_COACH_INSTRUCTION = """
-You are a strict Reformed Theological Translation Consultant training Chinese students for cross-cultural missions (South Asia/Africa).
-Your goal is to train students to translate Chinese (CUV) into precise ESV English, while equipping them with cultural sensitivity for KJV-loving mission fields.
-
-**CORE EVALUATION LOGIC:**
-
-1.  **Context is King (Theology):**
-    * Evaluate based on the specific Bible Verse (e.g., Gen 17:7).
-    * Distinguish between "Passable synonyms" and "Theological Precision".
-    * *Example:* In Gen 15, "Cut (Karat)" is correct. In Gen 17, "Establish (Hēqîm)" is better.
-
-2.  **The "Missionary Bridge" (KJV Handling):**
-    * Your target audience respects the KJV. If the user uses a **KJV term** (e.g., "Holy Ghost", "Charity", "Seed", "Quickened") instead of the ESV target:
-    * **Status:** 🟢 **GREEN (Pass)** or 🟡 **YELLOW (Valid Variant)** - DO NOT FAIL THEM.
-    * **Feedback:** Acknowledge the KJV validity for the mission field, but gently guide back to ESV for academic precision.
-    * *Example:* "Valid KJV term. 工场老信徒常用 'Holy Ghost'，但 ESV 为求清晰使用 'Holy Spirit'。"
-
-3.  **The "Anti-Chinglish" Filter (Chinese Habit):**
-    * Strictly monitor for "Chinglish" errors where students translate Chinese characters literally.
-    * **Status:** 🔴 **RED (Fail)**.
-    * *Example:* Translating "肉体" (Flesh/Sinful nature) as "Meat" or "Body".
-    * *Example:* Translating "立约" (Make/Cut covenant) as "Build a contract".
-
-4.  **Traffic Light System (Summary):**
-    * 🟢 **GREEN (Pass):** Perfect ESV match OR Strong KJV variant.
-    * 🟡 **YELLOW (Warning):** Passable word but missed nuance / Archaic KJV term.
-    * 🔴 **RED (Fail):** Wrong meaning, Secular term (Contract), or Chinglish.
-
-**FEEDBACK STYLE RULES (Crucial):**
-
-* **Language:** Speak in **Chinese**, but keep Key Theological Terms in **English**.
-* **Original Language:** ONLY cite Hebrew/Greek if it helps explain a nuanced distinction (e.g., distinguishing *Karat* vs *Qum*). Do NOT use it for simple vocabulary mistakes.
-* **Anti-Redundancy:** The user sees the correct answer. Do NOT say "Correct answer is X". Instead, explain the **logic gap**.
-    * *Bad:* "You said Make. The correct word is Establish."
-    * *Good:* "这里用 Make 稍显软弱。Gen 17 是在确认旧约，原文 *Hēqîm* 强调 'Establish' (坚立) 而非新立。"
-    * *Good (Chinglish):* "不要用 'Meat'。保罗神学中，'肉体'指罪性 (Flesh)，不是菜市场的肉。"
-
-**COMPARISON-BASED COACHING (Core Function):**
-
-You MUST compare the user's transcribed speech with the ESV target word-by-word and phrase-by-phrase.
-
-1. **Precise Comparison:**
-   * Identify EXACT differences: missing words, wrong word choice, word order, grammar errors.
-   * Focus on the KEY TERM first, then sentence structure.
-
-2. **Concise & Actionable Feedback:**
-   * **Word Count:** Maximum 2 sentences (ideally 1 sentence). Be BRIEF but PRECISE.
-   * **Focus on Improvement:** Don't just point out errors. Explain WHY the ESV choice is better and HOW to improve.
-   * **Pattern Recognition:** If the error suggests a deeper issue (e.g., always using weak verbs), hint at the pattern.
-   
-3. **Examples of Good Feedback:**
-   * *Bad (too long):* "You said 'make' but the correct answer is 'establish'. In Hebrew, the word Hēqîm means to establish or confirm something that already exists, not to create something new. So you should use 'establish' instead of 'make'."
-   * *Good (concise & actionable):* "用 'Establish' 替代 'Make'。这里强调坚立旧约，不是新立。"
-   * *Good (pattern-focused):* "避免通用动词 'Give'。神学语境中，'Present' 更精准，强调主动献上。"
-
-4. **Feedback Priority:**
-   * If KEY TERM is wrong → Focus on theological precision.
-   * If structure is wrong → Focus on English syntax.
-   * If both are wrong → Focus on KEY TERM first.
-
-**Output Format:**
-Return a JSON object: 
-{
-  "status": "pass" | "warning" | "fail", 
-  "user_said": "exact transcription from audio",
-  "feedback": "Markdown in Chinese with THREE ultra-short lines: '### 1. 神学核心 (Theology)：...'; '### 2. 演绎表现 (Delivery)：...'; '### 3. 成长聚焦 (Growth)：...'. Each line ≤ 16 Chinese characters, keep key theological terms in English."
-}
-"""
-
-# 模式特定的系统指令
-MODE_INSTRUCTIONS = {
-    "🎙️ 讲台口译 (Pulpit)": """你是一位在跨文化宣教工场服侍多年的**资深讲台口译导师**。
-重点评估：
-1. **强动词气势**: 拒绝软绵绵的词 (如 Give vs Present)。
-2. **语音语调**: 用词力度和权威感。
-3. **反中式搭配**: 严禁 Chinglish。
-风格：激情、直接、像讲道学教授。""",
-    
-    "🏫 神学课堂 (Classroom)": """你是一位严谨的**改革宗神学教授**。
-重点评估：
-1. **句法逻辑**: 连接词 (For, Therefore) 是否准确。
-2. **教义微调**: 严防神学错误 (如 Justify vs Make Righteous)。
-风格：冷静、学术、关注逻辑链。""",
-    
-    "🙏 祷告/灵修 (Devotional)": """你是一位**属灵导师**。
-重点评估：
-1. **情感深度**: 使用强烈的关系动词 (Pants for vs Miss)。
-2. **KJV 亲和力**: 鼓励使用 Thee/Thou。
-风格：温柔、敏锐、关注内心。"""
-}
-
-def get_coach_instruction(mode):
-    """根据模式返回完整的系统指令；mode 必须来自界面下拉框"""
-    # 这里假设 mode 已经由界面 selectbox 保证合法，不再强制回退到讲台模式
-    mode_instruction = MODE_INSTRUCTIONS[mode]
-    return BASE_COACH_INSTRUCTION + "\n\n**MODE-SPECIFIC FOCUS:**\n" + mode_instruction
+from llm_clients import get_openai_client, client_registry, PROXY_BASE_URL
+import bible_library
+from card_repository import card_repository
+from card_search import card_search
+from tts_cache import tts_cache, ESV_VOICE, CHINESE_VOICE
+from audio_prefetch import audio_prefetcher
+from eval_jobs import evaluation_jobs, JobLimitError
+from eval_cache import evaluation_cache, evaluation_key
+from audio_prep import compact_audio
+from json_stream import IncrementalJSONObject, salvage_json_object
+from llm_governor import llm_governor, describe_stats as describe_governor_stats
+from structured_output import (EVALUATION_SCHEMA, VALID_STATUSES, describe_metrics, gemini_generation_config,
+                               openai_response_format, parse_metrics, request_with_schema)
+from coach_prompts import (MODE_INSTRUCTIONS, PROMPT_VERSION, get_coach_instruction, build_user_prompt,
+                           estimate_tokens, get_cached_gemini_model, gemini_cache_error)
 
 # 1. 配置与初始化
 st.set_page_config(
@@ -335,32 +248,20 @@ load_dotenv()
 API_KEY = os.getenv("GEMINI_API_KEY")
 BASE_URL = os.getenv("GEMINI_BASE_URL", "https://api.laozhang.ai/v1")
 MODEL_NAME = "gemini-2.5-flash"
+# 直连 Google 时的模型回退顺序；上下文缓存按第一个模型创建，与未命中缓存时实际使用的模型一致
+GEMINI_MODELS = ("gemini-2.0-flash-exp", "gemini-1.5-pro", "gemini-2.5-flash")
+EVALUATION_PARSE_RETRIES = 1  # 响应里一个合法 status 都解析不出时，自动重新请求的次数
+REPOSITORY_SYNC_INTERVAL = 30  # 侧边栏章节索引：切换书卷或超过该秒数才重新检查书卷 JSON
+SEARCH_REFRESH_INTERVAL = 30  # 搜索索引：超过该秒数才在后台重新检查书卷是否变化
 
 if not API_KEY:
     st.error("❌ 未找到 API Key，请检查 .env 文件")
     st.stop()
 
-client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
-
-# 2. 加载数据函数
-@st.cache_data
-def load_library():
-    data_dir = "assets/bible_data"
-    library = {}
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        return library
-    
-    # 过滤掉 blueprint 文件（这些是给工厂脚本用的，不是给用户的）
-    files = [f for f in os.listdir(data_dir) 
-             if f.endswith(".json") and not f.startswith("blueprint")]
-    for f in files:
-        book_name = f.replace(".json", "")
-        with open(os.path.join(data_dir, f), "r", encoding="utf-8") as file:
-            library[book_name] = json.load(file)
-    return library
+client = get_openai_client(API_KEY, BASE_URL)
 
-library = load_library()
+# 2. 书卷库：按需加载、文件变化自动刷新，所有会话共享同一份只读数据
+library = bible_library.library
 
 # ==================== Helper Functions ====================
 
@@ -382,216 +283,238 @@ def get_audio_mime_type(audio_data):
     else:
         return "audio/webm"
 
-def generate_audio_sync(text, filename='esv_demo.mp3', voice='en-US-ChristopherNeural', rate='-10%'):
-    """Generate audio synchronously using edge_tts and save to cache directory"""
-    async def _gen():
+def generate_audio_sync(text, voice=ESV_VOICE[0], rate=ESV_VOICE[1]):
+    """Return a cached mp3 path for (text, voice, rate); edge_tts is only called on a cache miss"""
+    try:
+        if not text:
+            raise ValueError("Text is empty")
+        return tts_cache.get(text, voice, rate)
+    except Exception as e:
+        # Clean error message
         try:
-            if not text:
-                raise ValueError("Text is empty")
-            
-            # 清理特殊符号（Markdown格式符号），避免TTS读出这些符号
-            clean_text = str(text)
-            # 移除 Markdown 格式符号：* _ ` [ ] ( ) # 等
-            clean_text = re.sub(r'[*_`\[\]()#]', '', clean_text)
-            # 移除多余的空白字符
-            clean_text = re.sub(r'\s+', ' ', clean_text).strip()
-            
-            if not clean_text:
-                raise ValueError("Text contains no valid characters after cleaning")
-            
-            # Set locale to UTF-8 to avoid encoding issues
-            os.environ['LC_ALL'] = 'C.UTF-8'
-            os.environ['LANG'] = 'C.UTF-8'
-            
-            communicate = edge_tts.Communicate(text=clean_text, voice=voice, rate=rate)
-            audio_data = b""
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    audio_data += chunk["data"]
-            
-            # Save to cache directory (temp directory)
-            cache_dir = os.path.join(tempfile.gettempdir(), "pulpit_power_cache")
-            os.makedirs(cache_dir, exist_ok=True)
-            output_path = os.path.join(cache_dir, filename)
-            with open(output_path, 'wb') as f:
-                f.write(audio_data)
-            
-            return output_path
-        except Exception as e:
-            # Clean error message
-            try:
-                clean_error = str(e).encode('utf-8', errors='replace').decode('utf-8')
-                error_msg = clean_error
-            except:
-                error_msg = "Unknown error"
-            raise Exception(f"Audio generation failed: {error_msg}")
-    
-    # Run async function in sync wrapper
-    return asyncio.run(_gen())
+            clean_error = str(e).encode('utf-8', errors='replace').decode('utf-8')
+            error_msg = clean_error
+        except:
+            error_msg = "Unknown error"
+        raise Exception(f"Audio generation failed: {error_msg}")
 
-def generate_chinese_audio_sync(text, filename='chinese_phrase.mp3'):
+def generate_chinese_audio_sync(text):
     """Generate Chinese audio using edge_tts"""
-    return generate_audio_sync(text, filename=filename, voice='zh-CN-XiaoxiaoNeural', rate='-5%')
+    return generate_audio_sync(text, voice=CHINESE_VOICE[0], rate=CHINESE_VOICE[1])
 
 # 4. AI 评估函数（支持音频输入）
 def evaluate_translation(audio_data, card, mode):
     """
-    评估翻译：使用音频输入，AI 会转录并评分
+    提交评估任务：立即返回任务句柄 (EvaluationJob)，AI 调用在后台线程执行
+    音频字节与 use_proxy 在此处（脚本线程）读取，工作线程不访问 session_state
+    """
+    audio_bytes = audio_data.read() if audio_data else b""
+    audio_mime_type = get_audio_mime_type(audio_data) if audio_data else "audio/wav"
+    return evaluation_jobs.submit(
+        st.session_state.session_id,
+        cached_evaluation,
+        audio_bytes,
+        audio_mime_type,
+        st.session_state.selected_book,
+        card,
+        mode,
+        st.session_state.use_proxy,
+        governor_session=st.session_state.session_id,
+        context={"book": st.session_state.selected_book, "index": st.session_state.current_index},
+        progress=True,
+    )
+
+def cached_evaluation(audio_bytes, audio_mime_type, book, card, mode, use_proxy, on_partial=None, governor_session=None):
+    """同一录音 + 卡片 + 模式 + 提示词版本只评估一次；并发的相同提交共享同一请求"""
+    if not audio_bytes:
+        return run_evaluation(audio_bytes, audio_mime_type, card, mode, use_proxy)
+
+    computed = []
+
+    def compute():
+        computed.append(True)
+        # 上传前压缩：单声道 / 16 kHz / 裁掉首尾静音；解码失败时自动使用原始字节
+        prep = compact_audio(audio_bytes, audio_mime_type)
+        if prep.has_speech is False:
+            # 本地 VAD 判定无人声：直接判 fail，不发起网络请求
+            return {"status": "fail", "user_said": "NO_AUDIO", "feedback": "未检测到语音，请靠近麦克风重新录音"}
+        result = run_evaluation(prep.data, prep.mime_type, card, mode, use_proxy, on_partial=on_partial,
+                                governor_session=governor_session)
+        result['audio_prep'] = prep.summary()
+        return result
+
+    key = evaluation_key(audio_bytes, book, card, mode, PROMPT_VERSION)
+    result = evaluation_cache.get_or_compute(
+        key,
+        compute,
+        should_cache=lambda result: result.get('user_said') != 'ERROR' and not result.get('_salvaged'),
+    )
+    if not computed:
+        # 缓存命中 / 合并到在途请求：本次没有发请求，原请求的耗时与提示词统计不适用
+        result.pop('_timing', None)
+        result.pop('_prompt', None)
+        result['_cached'] = True
+    return result
+
+def run_evaluation(audio_bytes, audio_mime_type, card, mode, use_proxy, on_partial=None, governor_session=None):
+    """
+    评估翻译：使用音频输入，AI 会转录并评分（在后台工作线程中运行）
     mode: 训练模式（讲台/课堂/祷告）
+    on_partial: 流式输出时每收到一块就以当前解析快照回调（status / user_said / 部分 feedback）
+    governor_session: 进程级限流器按会话轮流放行（同时提交的学生公平排队）
     """
     # 构建用户提示词（包含当前模式及其三大评估重点）
-    user_prompt = f"""Here is the audio recording. The user will translate this Chinese phrase to English.
-
-**Context:**
-- Reference: {card.get('ref', 'N/A')}
-- Chinese phrase: "{card.get('phrase_cn', 'N/A')}"
-- Full context: "{card.get('sentence_context', 'N/A')}"
-- Expected ESV target: "{card.get('phrase_en', 'N/A')}"
-- Key term to focus on: "{card.get('key_term', 'N/A')}"
-- Trap to avoid: {card.get('trap', [])}
-
-**Mode & Focus (VERY IMPORTANT):**
-- Current mode: {mode}
-- Mode-specific focus in Chinese (three bullet points you MUST follow exactly, in order):
-{MODE_INSTRUCTIONS[mode]}
-
-**Your task:**
-1. Listen to the audio and transcribe EXACTLY what you hear (or "NO_AUDIO" if you hear nothing).
-2. **Compare word-by-word:** Your transcription vs ESV target "{card.get('phrase_en', 'N/A')}".
-   - Identify missing words, wrong word choices, word order issues.
-   - Pay special attention to the KEY TERM: "{card.get('key_term', 'N/A')}".
-3. **Evaluate using theological coach rules** from system instruction.
-4. **Generate concise feedback:** Compare ESV vs user's speech, explain WHY the difference matters, and HOW to improve. 
-   Your feedback MUST be structured into THREE ultra-short lines in Chinese, each line corresponding to ONE bullet point of the current mode:
-   - Line 1 = 神学核心 (Theology) → Comment on the FIRST bullet of the current mode.
-   - Line 2 = 演绎表现 (Delivery) → Comment on the SECOND bullet of the current mode.
-   - Line 3 = 成长聚焦 (Growth) → Comment on the THIRD bullet of the current mode, giving ONE concrete next-step tip.
-
-**CRITICAL: Comparison-Based Feedback**
-- Compare: "User said: [transcription]" vs "ESV: {card.get('phrase_en', 'N/A')}"
-- Focus on KEY TERM accuracy first, then sentence structure.
-- Be BRIEF but PRECISE. Focus on improvement, not just error listing.
-- Example: "用 'Establish' 替代 'Make'。这里强调坚立旧约，不是新立。"
-
-**Output JSON format:**
-{{
-  "status": "pass/warning/fail",
-  "user_said": "exact transcription or 'NO_AUDIO'",
-  "feedback": "Generate a Markdown-formatted coaching comment in Chinese. Structure it strictly as follows:
-
-**1. 🎯 诊断 (Diagnosis):** Identify the specific gap. Was it a weak verb? A theological drift? Or a lack of rhythm? (Max 1 sentence).
-
-**2. 💡 修正 (Correction):** Provide the specific fix based on the current Mode. 
-- If Pulpit Mode: Focus on power ('Use Proclaim!'). 
-- If Classroom Mode: Focus on logic ('Add Therefore!'). 
-- If Prayer Mode: Focus on emotion ('Use Pant for!').
-
-**3. 🧠 洞见 (Insight):** A brief, memorable 'Theological Rule of Thumb' or 'Mission Field Tip'. (e.g., '神的主权不容被动语态', or '工场上 KJV 的 Thee 更显亲密').
-
-**Style Constraint:** - Professional, authoritative, yet encouraging.
-- Total length: Keep it under 150 Chinese characters total.
-- Use bolding for key terms."
-}}
-
-⚠️ If audio is SILENT/EMPTY: user_said must be "NO_AUDIO" and status must be "fail"
-⚠️ user_said MUST be what you actually HEAR, not the expected answer
-⚠️ feedback MUST compare ESV vs user_said and provide actionable improvement advice
-
-Output ONLY valid JSON object."""
+    user_prompt = build_user_prompt(card)
     
     try:
-        if not audio_data:
-            return {"status": "fail", "user_said": "NO_AUDIO", "feedback": "未检测到音频输入"}
-        
-        # 读取音频字节
-        audio_bytes = audio_data.read()
-        
-        if len(audio_bytes) == 0:
+        if not audio_bytes:
             return {"status": "fail", "user_said": "NO_AUDIO", "feedback": "音频文件为空"}
         
         # 根据模式获取系统指令
         coach_instruction = get_coach_instruction(mode)
         
-        # 根据 use_proxy 设置创建 client
-        if st.session_state.use_proxy:
+        # 流式接收：增量解析 JSON，记录首字 / 首条反馈耗时
+        start = time.perf_counter()
+        timing = {}
+        usage = {}
+        pieces = []
+        parser = IncrementalJSONObject()
+        
+        def consume(piece):
+            if not piece:
+                return
+            if 'first_token' not in timing:
+                timing['first_token'] = time.perf_counter() - start
+            pieces.append(piece)
+            snapshot = parser.feed(piece)
+            if 'first_feedback' not in timing and snapshot.get('feedback'):
+                timing['first_feedback'] = time.perf_counter() - start
+            if on_partial:
+                on_partial(snapshot)
+        
+        # 根据 use_proxy 设置选择 client（进程级复用，保持 keep-alive）
+        if use_proxy:
             # 使用 laozhang.ai 代理
-            api_client = OpenAI(
-                api_key=API_KEY,
-                base_url="https://api.laozhang.ai/v1"
-            )
+            api_client = get_openai_client(API_KEY, PROXY_BASE_URL)
             
             # Convert audio to base64
             audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-            audio_mime_type = get_audio_mime_type(audio_data)
             
-            # Call via OpenAI-compatible API with system instruction
-            response = api_client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": coach_instruction
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": user_prompt},
-                            {
-                                "type": "input_audio",
-                                "input_audio": {
-                                    "data": audio_base64,
-                                    "format": audio_mime_type.split('/')[-1]
+            def send(schema):
+                # 代理支持时用 response_format 约束输出为评估 JSON Schema
+                extra = {"response_format": openai_response_format(schema, "evaluation")} if schema else {}
+                # Call via OpenAI-compatible API with system instruction
+                return api_client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": coach_instruction
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": user_prompt},
+                                {
+                                    "type": "input_audio",
+                                    "input_audio": {
+                                        "data": audio_base64,
+                                        "format": audio_mime_type.split('/')[-1]
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ]
-            )
+                            ]
+                        }
+                    ],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **extra
+                )
             
-            response_text = response.choices[0].message.content
+            def stream_response():
+                response = request_with_schema(f"proxy:{MODEL_NAME}", EVALUATION_SCHEMA, send)
+                for chunk in response:
+                    if chunk.choices:
+                        consume(chunk.choices[0].delta.content)
+                    # 最后一块携带 usage：prompt_tokens 及命中前缀缓存的 cached_tokens
+                    if getattr(chunk, 'usage', None):
+                        details = getattr(chunk.usage, 'prompt_tokens_details', None)
+                        usage['prompt_tokens'] = chunk.usage.prompt_tokens
+                        usage['cached_tokens'] = getattr(details, 'cached_tokens', None) or 0
         else:
             # 使用直接 Google API（需要 google.generativeai）
             import google.generativeai as genai
             genai.configure(api_key=API_KEY)
             
+            # 优先引用已缓存的系统指令；不可用时按原顺序回退
             # Try gemini-2.0-flash-exp first, fallback to 1.5-pro, then 2.5-flash
-            try:
-                model = genai.GenerativeModel('gemini-2.0-flash-exp', system_instruction=coach_instruction)
-            except:
+            model = get_cached_gemini_model(genai, GEMINI_MODELS[0], mode)
+            if model is None:
+                usage['context_cache_error'] = gemini_cache_error(GEMINI_MODELS[0], mode)
                 try:
-                    model = genai.GenerativeModel('gemini-1.5-pro', system_instruction=coach_instruction)
+                    model = genai.GenerativeModel(GEMINI_MODELS[0], system_instruction=coach_instruction)
                 except:
-                    model = genai.GenerativeModel('gemini-2.5-flash')
+                    try:
+                        model = genai.GenerativeModel(GEMINI_MODELS[1], system_instruction=coach_instruction)
+                    except:
+                        model = genai.GenerativeModel(GEMINI_MODELS[2])
             
             # Prepare audio file
-            audio_mime_type = get_audio_mime_type(audio_data)
             audio_file = {
                 "mime_type": audio_mime_type,
                 "data": audio_bytes
             }
             
-            # Call Gemini API
-            response = model.generate_content([user_prompt, audio_file])
-            response_text = response.text
-        
-        # Parse JSON response
-        if not isinstance(response_text, str):
-            response_text = str(response_text)
-        response_text = response_text.strip()
-        
-        # Remove markdown code blocks if present
-        if response_text.startswith("```"):
-            response_text = response_text.split("```")[1]
-            if response_text.startswith("json"):
-                response_text = response_text[4:]
-        response_text = response_text.strip()
+            def send(schema):
+                # Call Gemini API (streaming); response_schema 约束输出格式
+                return model.generate_content([user_prompt, audio_file], stream=True,
+                                              generation_config=gemini_generation_config(schema) if schema else None)
+            
+            def stream_response():
+                response = request_with_schema(f"gemini:{model.model_name}", EVALUATION_SCHEMA, send)
+                for chunk in response:
+                    consume(chunk.text)
+                    meta = getattr(chunk, 'usage_metadata', None)
+                    if meta and getattr(meta, 'prompt_token_count', None):
+                        usage['prompt_tokens'] = meta.prompt_token_count
+                        usage['cached_tokens'] = getattr(meta, 'cached_content_token_count', None) or 0
         
-        result = json.loads(response_text)
+        def governed_stream():
+            # 经进程级限流器排队；429 冷却后重试时从头重新接收
+            nonlocal parser
+            pieces.clear()
+            parser = IncrementalJSONObject()
+            stream_response()
         
-        # Normalize status
-        if 'status' in result:
-            result['status'] = result['status'].lower()
+        # 容错解析：前后噪声 / 围栏 / 截断的 feedback 都能用；一个合法 status 都没有时才重新请求一次
+        result = None
+        for attempt in range(EVALUATION_PARSE_RETRIES + 1):
+            llm_governor.call("proxy" if use_proxy else "gemini", governor_session, governed_stream)
+            response_text = "".join(pieces)
+            result, complete = salvage_json_object(response_text)
+            status = str((result or {}).get('status') or '').lower()
+            if status in VALID_STATUSES:
+                result['status'] = status
+                parse_metrics.record("evaluate", "clean" if complete else "salvaged", retry=attempt > 0)
+                break
+            parse_metrics.record("evaluate", "failed", retry=attempt > 0)
+            result = None
+        timing['total'] = time.perf_counter() - start
+        if result is None:
+            raise ValueError(f"AI 响应不是有效的评估 JSON: {response_text[:200]!r}")
+        if not complete:
+            # 从不完整的响应里捞回的结果：照常显示，但不写入评估缓存
+            result['_salvaged'] = True
+            result.setdefault('user_said', '')
+            result.setdefault('feedback', '')
         
+        result['_timing'] = timing
+        result['_prompt'] = {
+            "prefix_tokens_est": estimate_tokens(coach_instruction),
+            "suffix_tokens_est": estimate_tokens(user_prompt),
+            "prompt_tokens": usage.get('prompt_tokens'),
+            "cached_tokens": usage.get('cached_tokens'),
+            "context_cache_error": usage.get('context_cache_error'),
+        }
         return result
         
     except Exception as e:
@@ -600,21 +523,32 @@ Output ONLY valid JSON object."""
             error_msg = str(e).encode('utf-8', errors='replace').decode('utf-8')
         except:
             error_msg = "Unknown error"
-        return {"status": "fail", "user_said": "ERROR", "feedback": f"AI 连接错误: {error_msg}"}
+        label = "AI 响应格式错误" if isinstance(e, ValueError) else "AI 连接错误"
+        return {"status": "fail", "user_said": "ERROR", "feedback": f"{label}: {error_msg}"}
+
+
+@st.fragment(run_every=1)
+def wait_for_search_index():
+    """搜索索引后台构建中：每秒检查一次，完成后整页重跑以显示搜索结果"""
+    if card_search.ready or card_search.build_error:
+        st.rerun()
+    st.caption("⏳ 索引构建中，完成后自动显示结果…")
 
 # 5. 界面布局 (UI)
 
 # --- 初始化 Session State ---
 if 'current_index' not in st.session_state:
     st.session_state.current_index = 0
-if 'book_data' not in st.session_state:
-    st.session_state.book_data = []
 if 'feedback' not in st.session_state:
     st.session_state.feedback = None
 if 'use_proxy' not in st.session_state:
     st.session_state.use_proxy = True  # 默认使用 laozhang 中转服务
 if 'selected_mode' not in st.session_state:
     st.session_state.selected_mode = list(MODE_INSTRUCTIONS.keys())[0]  # 默认第一个模式
+if 'eval_job_id' not in st.session_state:
+    st.session_state.eval_job_id = None  # 进行中的评估任务
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # 后台任务（音频预取等）按会话隔离
 
 # 🔧 修复：在主代码中初始化 selected_book（不依赖侧边栏是否打开）
 if library and len(library) > 0:
@@ -646,8 +580,11 @@ with st.sidebar:
         
         # 逻辑 3: 书卷选择器
         def on_book_change():
+            audio_prefetcher.cancel(st.session_state.session_id)
             st.session_state.current_index = 0
             st.session_state.feedback = None
+            st.session_state.eval_job_id = None
+            st.session_state.chapter_jump = None
             st.session_state.selected_book = st.session_state.book_selector
 
         # 计算当前选中项的索引
@@ -669,6 +606,81 @@ with st.sidebar:
         # 逻辑 4: 确保 book_data 始终有效
         book_data = library.get(st.session_state.selected_book, [])
         
+        # 章节跳转：SQLite 索引按 章:节 查询，跳到该章在本卷中的第一张卡片
+        # sync 要 stat 全部书卷文件：只在切换书卷或间隔 REPOSITORY_SYNC_INTERVAL 秒后执行
+        synced_book, synced_at = st.session_state.get('repository_synced', (None, 0.0))
+        if synced_book != st.session_state.selected_book or time.time() - synced_at > REPOSITORY_SYNC_INTERVAL:
+            try:
+                card_repository.sync()
+                st.session_state.repository_error = None
+            except Exception as e:
+                st.session_state.repository_error = str(e)
+            st.session_state.repository_synced = (st.session_state.selected_book, time.time())
+        try:
+            chapters = card_repository.chapters(st.session_state.selected_book)
+        except Exception as e:
+            st.session_state.repository_error = str(e)
+            chapters = []
+        if st.session_state.get('repository_error'):
+            st.warning(f"⚠️ 章节索引不可用：{st.session_state.repository_error}")
+        if chapters:
+            def on_chapter_jump():
+                chapter = st.session_state.chapter_jump
+                if chapter is None:
+                    return
+                hits = card_repository.in_range(st.session_state.selected_book, chapter)
+                if hits:
+                    st.session_state.current_index = min(position for _, position, _, _ in hits)
+                    st.session_state.feedback = None
+                    st.session_state.eval_job_id = None
+                    st.session_state.navigated = True
+            
+            st.selectbox(
+                "📖 跳转章节",
+                options=[None] + chapters,
+                format_func=lambda chapter: "—" if chapter is None else f"第 {chapter} 章",
+                key="chapter_jump",
+                on_change=on_chapter_jump
+            )
+        
+        # 全文搜索：倒排索引（书卷文件变化时增量更新），点击结果直接跳到该卡片
+        def jump_to_card(book_name, position):
+            if book_name != st.session_state.selected_book:
+                audio_prefetcher.cancel(st.session_state.session_id)
+            # 书卷选择器按 selected_book 计算默认项；清掉旧的控件值让它重新取默认
+            st.session_state.pop('book_selector', None)
+            st.session_state.selected_book = book_name
+            st.session_state.last_loaded_book = book_name  # 避免切换书卷时把索引重置为 0
+            st.session_state.current_index = position
+            st.session_state.chapter_jump = None
+            st.session_state.feedback = None
+            st.session_state.eval_job_id = None
+            st.session_state.navigated = True
+        
+        # 首次建索引在后台线程进行，构建期间搜索框下显示"索引构建中"，完成后自动刷新；
+        # 之后每 SEARCH_REFRESH_INTERVAL 秒在后台检查一次书卷变化，查询本身不再逐卷 stat / 加载
+        if not card_search.ready or time.time() - st.session_state.get('search_refreshed_at', 0.0) > SEARCH_REFRESH_INTERVAL:
+            card_search.start_background_refresh()
+            st.session_state.search_refreshed_at = time.time()
+        search_query = st.text_input("🔍 搜索卡片", key="card_search_query", placeholder="如 Abide / 立约")
+        if search_query.strip() and not card_search.ready:
+            if card_search.build_error:
+                st.warning(f"⚠️ 搜索索引构建失败：{card_search.build_error}")
+            else:
+                wait_for_search_index()
+        elif search_query.strip():
+            search_results = card_search.search(search_query, limit=10, refresh=False)
+            st.caption(f"找到 {len(search_results)} 张卡片" if search_results else "没有匹配的卡片")
+            for result_book, result_position, result_card, _ in search_results:
+                label = f"{result_book} · {result_card.ref} — {result_card.phrase_en.replace('**', '')}"
+                st.button(
+                    label[:60],
+                    key=f"search_{result_book}_{result_position}",
+                    on_click=jump_to_card,
+                    args=(result_book, result_position),
+                    use_container_width=True
+                )
+        
         # 逻辑 5: 模式选择
         mode_options = list(MODE_INSTRUCTIONS.keys())
         selected_mode = st.selectbox(
@@ -677,26 +689,46 @@ with st.sidebar:
             key="selected_mode" # 直接绑定到 session_state
         )
         
+        st.checkbox("🐞 调试模式", key="debug_mode", help="显示首字 / 首条反馈耗时等调试信息")
+        
         # 进度条
         if book_data:
             st.markdown("---")
             st.caption(f"进度: {st.session_state.current_index + 1} / {len(book_data)}")
             st.progress((st.session_state.current_index + 1) / len(book_data))
+
+        # 音频缓存命中统计
+        library_stats = library.stats()
+        st.caption(f"📚 已加载书卷: {library_stats['loaded']} / {library_stats['books']}")
+        if library_stats['artifact_error']:
+            st.caption(f"⚠️ 编译产物不可用，已回退 JSON: {library_stats['artifact_error']}")
+        audio_stats = tts_cache.stats()
+        st.caption(f"🎧 音频缓存: 命中 {audio_stats['hits']} · 未命中 {audio_stats['misses']}")
+        prefetch_stats = audio_prefetcher.stats()
+        st.caption(f"⚡ 预取命中: {prefetch_stats['served_from_prefetch']} / {prefetch_stats['navigations']} 次翻页")
+        conn_stats = client_registry.stats()
+        st.caption(f"🔌 连接复用: {conn_stats['reused_connections']} / {conn_stats['requests']} 次请求")
+        job_stats = evaluation_jobs.metrics()
+        st.caption(
+            f"📮 评估队列: 排队 {job_stats['queue_depth']} · 进行中 {job_stats['running']} · "
+            f"平均等待 {job_stats['avg_wait_seconds']:.1f}s · 平均耗时 {job_stats['avg_run_seconds']:.1f}s"
+        )
+        eval_cache_stats = evaluation_cache.stats()
+        st.caption(f"♻️ 评估缓存: 命中 {eval_cache_stats['hits']} · 合并 {eval_cache_stats['shared']} · 调用 {eval_cache_stats['misses']}")
+        st.caption(describe_metrics(parse_metrics.snapshot()))
+        governor_stats = llm_governor.stats()
+        if governor_stats:
+            st.caption(describe_governor_stats(governor_stats))
 # --- 主界面：训练区（移动端优化）---
 
 # --- 1. 数据同步保障 ---
-# 检查 book_data 是否为空，或者是否与当前选中的书卷不匹配
-if st.session_state.selected_book and (not st.session_state.get('book_data') or st.session_state.get('last_loaded_book') != st.session_state.selected_book):
-    # 强制重新从 library 加载
-    if st.session_state.selected_book in library:
-        st.session_state.book_data = library.get(st.session_state.selected_book, [])
-        st.session_state.last_loaded_book = st.session_state.selected_book
-        st.session_state.current_index = 0  # 确保索引重置
-    else:
-        st.session_state.book_data = []
+# 会话只保存书卷名 + 索引；卡片每次从共享只读库取引用（只做 stat 比对，不复制）
+if st.session_state.selected_book and st.session_state.get('last_loaded_book') != st.session_state.selected_book:
+    st.session_state.last_loaded_book = st.session_state.selected_book
+    st.session_state.current_index = 0  # 切换书卷时确保索引重置
 
 # --- 2. 获取当前题目卡片 (稳健版) ---
-book_data = st.session_state.book_data
+book_data = library.get(st.session_state.selected_book, ()) if st.session_state.selected_book else ()
 
 # 🔧 修复：如果 selected_book 为 None 或 book_data 为空，显示友好提示
 if not st.session_state.selected_book:
@@ -722,7 +754,7 @@ else:
 # 顶部导航栏（学院风导航）
 col_title, col_nav = st.columns([3, 1])
 with col_title:
-    ref_text = current_card.get('ref', 'No Ref')
+    ref_text = current_card.ref or 'No Ref'
     st.markdown(f"**{st.session_state.selected_book}** {ref_text}")
 with col_nav:
     nav_col1, nav_col2 = st.columns(2)
@@ -732,31 +764,44 @@ with col_nav:
             if st.button("❮", use_container_width=True, key="prev_btn"):
                 st.session_state.current_index -= 1
                 st.session_state.feedback = None
+                st.session_state.eval_job_id = None
+                st.session_state.navigated = True
                 st.rerun()
     with nav_col2:
         if st.session_state.current_index < len(book_data) - 1:
             if st.button("❯", use_container_width=True, key="next_btn"):
                 st.session_state.current_index += 1
                 st.session_state.feedback = None
+                st.session_state.eval_job_id = None
+                st.session_state.navigated = True
                 st.rerun()
 
 # 1. 题目卡片：悬浮"讲章卡片"风格（默认不暴露中文原文）
 st.markdown(
     f"""
     <div class="sermon-card">
-        <div class="sermon-card-ref">{st.session_state.selected_book} · {current_card.get('ref', 'No Ref')}</div>
+        <div class="sermon-card-ref">{st.session_state.selected_book} · {current_card.ref or 'No Ref'}</div>
     </div>
     """,
     unsafe_allow_html=True,
 )
 
+# 后台预取相邻卡片（❮/❯）的中文与 ESV 音频
+prefetch_jobs = []
+for neighbor_index in (st.session_state.current_index + 1, st.session_state.current_index - 1):
+    if 0 <= neighbor_index < len(book_data):
+        neighbor = book_data[neighbor_index]
+        prefetch_jobs.append((neighbor.phrase_cn, *CHINESE_VOICE))
+        prefetch_jobs.append((neighbor.phrase_en, *ESV_VOICE))
+audio_prefetcher.prefetch(st.session_state.session_id, prefetch_jobs)
+
 # 中文音频播放（优先训练"听译"）
 try:
-    safe_ref = re.sub(r'[^\x20-\x7E]', '_', current_card.get('ref', 'demo'))
-    chinese_audio_filename = f"chinese_{safe_ref}.mp3"
-    phrase_cn = current_card.get('phrase_cn', '')
+    phrase_cn = current_card.phrase_cn
+    if phrase_cn and st.session_state.pop('navigated', False):
+        audio_prefetcher.record_navigation(st.session_state.session_id, phrase_cn, *CHINESE_VOICE)
     if phrase_cn:
-        chinese_audio_file = generate_chinese_audio_sync(phrase_cn, chinese_audio_filename)
+        chinese_audio_file = generate_chinese_audio_sync(phrase_cn)
         if chinese_audio_file and os.path.exists(chinese_audio_file):
             st.audio(chinese_audio_file, format='audio/mp3')
             st.caption("🎧 中文原文音频")
@@ -764,7 +809,7 @@ except Exception as e:
     st.caption("⚠️ 音频生成中...")
 
 # 中文原文折叠显示，优先训练"听译"而非"看译"
-phrase_cn = current_card.get('phrase_cn', '暂无中文原文')
+phrase_cn = current_card.phrase_cn or '暂无中文原文'
 if phrase_cn:
     with st.expander("📜 查看中文原文", expanded=False):
         st.markdown(phrase_cn)
@@ -800,35 +845,36 @@ with tab2:
 st.markdown("---")
 if audio_data is not None:
     if st.button("🚀 提交评估", type="primary", use_container_width=True):
-        with st.spinner("🤖 AI 分析中..."):
-            result = evaluate_translation(audio_data, current_card, st.session_state.selected_mode)
-            st.session_state.feedback = result
-            st.rerun()
+        try:
+            job = evaluate_translation(audio_data, current_card, st.session_state.selected_mode)
+            st.session_state.eval_job_id = job.id
+            st.session_state.feedback = None
+        except JobLimitError:
+            st.warning("⏳ 上一次评估仍在进行中，请稍候")
 else:
     st.caption("💡 请先录音或上传音频")
 
-# 4. 反馈显示区（自定义学术风格）
-if st.session_state.feedback:
-    fb = st.session_state.feedback
-    status = fb.get('status', 'fail').lower()
-    user_said = fb.get('user_said', 'N/A')
-    
-    st.markdown("---")
-    
+# 反馈卡片（最终结果与流式中间结果共用）
+FEEDBACK_STATUS_META = {
+    "pass":  {"cls": "feedback-pass",    "title": "✅ 神学评估：通过"},
+    "warning": {"cls": "feedback-warning", "title": "🟡 神学评估：需留意"},
+    "fail": {"cls": "feedback-fail",    "title": "🔴 神学评估：需重点修正"},
+}
+
+def render_feedback(status, user_said, feedback_text, streaming=False):
     # 显示用户实际说的内容
     if user_said and user_said != 'N/A' and user_said.upper() != 'NO_AUDIO':
         with st.container(border=True):
             st.markdown(f"**🎤 您的翻译:** {user_said}")
     
     # 自定义反馈卡片（替代 st.success / st.warning / st.error）
-    status_meta = {
-        "pass":  {"cls": "feedback-pass",    "title": "✅ 神学评估：通过"},
-        "warning": {"cls": "feedback-warning", "title": "🟡 神学评估：需留意"},
-        "fail": {"cls": "feedback-fail",    "title": "🔴 神学评估：需重点修正"},
-    }
-    meta = status_meta.get(status, status_meta["fail"])
-    raw_fb = fb.get("feedback", "")
-    safe_fb = html.escape(str(raw_fb))
+    if streaming and status not in FEEDBACK_STATUS_META:
+        meta = {"cls": "", "title": "⏳ 神学评估：生成中..."}
+    else:
+        meta = FEEDBACK_STATUS_META.get(status, FEEDBACK_STATUS_META["fail"])
+    safe_fb = html.escape(str(feedback_text or ""))
+    if streaming:
+        safe_fb += " ▌"
     feedback_html = f"""
     <div class="feedback-box {meta['cls']}">
         <div class="feedback-title">{meta['title']}</div>
@@ -836,16 +882,69 @@ if st.session_state.feedback:
     </div>
     """
     st.markdown(feedback_html, unsafe_allow_html=True)
+
+# 轮询后台评估任务：流式显示中间结果，完成后写入 feedback 并整页刷新
+@st.fragment(run_every=0.5)
+def poll_evaluation():
+    job = evaluation_jobs.get(st.session_state.eval_job_id)
+    if job is None:
+        st.session_state.eval_job_id = None
+        st.rerun()
+    if job.context != {"book": st.session_state.selected_book, "index": st.session_state.current_index}:
+        st.session_state.eval_job_id = None  # 已切换卡片，丢弃旧任务结果
+        st.rerun()
+    if job.done:
+        if job.status == "done":
+            st.session_state.feedback = job.result
+        else:
+            st.session_state.feedback = {"status": "fail", "user_said": "ERROR", "feedback": f"AI 连接错误: {job.error}"}
+        st.session_state.eval_job_id = None
+        st.rerun()
+    position = evaluation_jobs.queue_position(job)
+    if job.status == "queued":
+        st.info(f"🤖 排队中（前方 {position} 个任务）... 可继续浏览其他卡片")
+    elif job.partial:
+        partial = job.partial
+        render_feedback(str(partial.get('status', '')).lower(), partial.get('user_said'),
+                        partial.get('feedback'), streaming=True)
+    else:
+        st.info(f"🤖 AI 分析中... 已用时 {job.elapsed:.0f}s")
+
+if st.session_state.eval_job_id:
+    poll_evaluation()
+
+# 4. 反馈显示区（自定义学术风格）
+if st.session_state.feedback:
+    fb = st.session_state.feedback
+    status = fb.get('status', 'fail').lower()
+    user_said = fb.get('user_said', 'N/A')
+    
+    st.markdown("---")
+    
+    render_feedback(status, user_said, fb.get("feedback", ""))
+    if fb.get('audio_prep'):
+        st.caption(f"📦 {fb['audio_prep']}")
+    timing = fb.get('_timing')
+    if st.session_state.get('debug_mode') and fb.get('_cached'):
+        st.caption("🐞 ♻️ 缓存命中：复用之前的评估结果，本次未请求模型")
+    if st.session_state.get('debug_mode') and timing:
+        def fmt(key):
+            return f"{timing[key]:.2f}s" if key in timing else "—"
+        st.caption(f"🐞 首字 {fmt('first_token')} · 首条反馈 {fmt('first_feedback')} · 总耗时 {fmt('total')}")
+    prompt_info = fb.get('_prompt')
+    if st.session_state.get('debug_mode') and prompt_info:
+        st.caption(f"🐞 提示词 前缀≈{prompt_info['prefix_tokens_est']} · 后缀≈{prompt_info['suffix_tokens_est']} tokens"
+                   f" · 实际 {prompt_info.get('prompt_tokens') or '—'} · 缓存命中 {prompt_info.get('cached_tokens') or 0}")
+        if prompt_info.get('context_cache_error'):
+            st.caption(f"🐞 Gemini 上下文缓存不可用（走普通调用）: {prompt_info['context_cache_error'][:160]}")
     
     # 5. 答案揭晓与解析（移动端优化：单列布局）
     with st.expander("🔍 查看解析", expanded=False):
         # 标准发音（顶部）
         try:
-            safe_ref = re.sub(r'[^\x20-\x7E]', '_', current_card.get('ref', 'demo'))
-            audio_filename = f"esv_demo_{safe_ref}.mp3"
-            phrase_en = current_card.get('phrase_en', '')
+            phrase_en = current_card.phrase_en
             if phrase_en:
-                generated_file = generate_audio_sync(phrase_en, audio_filename)
+                generated_file = generate_audio_sync(phrase_en)
                 if generated_file and os.path.exists(generated_file):
                     st.audio(generated_file)
                     st.caption("🎧 标准发音")
@@ -853,13 +952,13 @@ if st.session_state.feedback:
             pass
         
         # 目标答案
-        phrase_en = current_card.get('phrase_en', '暂无目标答案')
+        phrase_en = current_card.phrase_en or '暂无目标答案'
         if phrase_en:
             st.markdown("**🎯 目标答案:**")
             st.info(f"{phrase_en}")
         
         # 完整上下文
-        sentence_context = current_card.get('sentence_context', '')
+        sentence_context = current_card.sentence_context
         if sentence_context:
             st.markdown("**📖 完整上下文:**")
             st.caption(f"{sentence_context}")
@@ -867,21 +966,17 @@ if st.session_state.feedback:
         # 关键词和陷阱
         col_key, col_trap = st.columns(2)
         with col_key:
-            key_term = current_card.get('key_term', '')
+            key_term = current_card.key_term
             if key_term:
                 st.markdown("**🔑 关键词:**")
                 st.code(key_term, language=None)
         with col_trap:
-            trap = current_card.get('trap', [])
-            if trap:
+            if current_card.trap:
                 st.markdown("**🪤 陷阱:**")
-                if isinstance(trap, list):
-                    st.caption(", ".join(trap) if trap else "无")
-                else:
-                    st.caption(str(trap))
+                st.caption(", ".join(current_card.trap))
         
         # 解析说明
-        nuance_note = current_card.get('nuance_note', '')
+        nuance_note = current_card.nuance_note
         if nuance_note:
             st.markdown("**💡 解析:**")
             st.markdown(f"{nuance_note}")
@@ -4,7 +4,11 @@ import time
 import re
 from typing import List, Dict, Any
 from dotenv import load_dotenv
-from openai import OpenAI  # ✅ 换用 OpenAI 库来连接中转站
+from llm_clients import get_openai_client  # ✅ 共享连接池的 OpenAI 客户端（连接中转站）
+from scripture_ref import RefIndex, parse_refs, sort_cards
+from json_stream import salvage_json_array
+from llm_governor import llm_governor
+from structured_output import parse_metrics
 
 # 加载 .env
 load_dotenv()
@@ -26,10 +30,7 @@ if not API_KEY:
 print(f"🔌 Connecting to: {BASE_URL}")
 
 # ✅ 初始化 OpenAI 客户端 (但调用的是 Gemini 模型)
-client = OpenAI(
-    api_key=API_KEY,
-    base_url=BASE_URL
-)
+client = get_openai_client(API_KEY, BASE_URL)
 
 # 模型名称
 MODEL_NAME = "gemini-2.5-flash" 
@@ -41,7 +42,9 @@ def call_ai_json(prompt: str, temperature: float = 0.7) -> List[Dict]:
     发送请求并解析 JSON，自带 Markdown 清理功能
     """
     try:
-        response = client.chat.completions.create(
+        # 与 app / blitz 共用进程级限流器（同进程运行时共享额度）
+        response = llm_governor.call(
+            "proxy", "arsenal_factory", client.chat.completions.create,
             model=MODEL_NAME,
             messages=[
                 {"role": "system", "content": "You are a strict JSON generator. Output only valid JSON lists."},
@@ -58,11 +61,12 @@ def call_ai_json(prompt: str, temperature: float = 0.7) -> List[Dict]:
         content = re.sub(r'```', '', content)
         content = content.strip()
         
-        return json.loads(content)
-        
-    except json.JSONDecodeError:
-        print("      ⚠️ JSON Decode Error. AI output might be malformed.")
-        return []
+        # 🩹 容错：截断 / 夹杂说明文字时保留能完整解析的条目
+        items, complete = salvage_json_array(content)
+        parse_metrics.record("arsenal", "clean" if complete else ("salvaged" if items else "failed"))
+        if not complete:
+            print(f"      ⚠️ JSON malformed, salvaged {len(items)} item(s).")
+        return items
     except Exception as e:
         print(f"      ⚠️ API Error: {e}")
         return []
@@ -79,6 +83,7 @@ def generate_book_data(book_data: Dict[str, Any]) -> List[Dict[str, Any]]:
     
     final_items = []
     seen_refs = set()
+    ref_index = RefIndex()  # 规范化后的经文区间：重叠即视为重复
     
     # --- PART 1: 强动词特训 ---
     strong_verbs = book_data.get('strong_verb_focus', [])
@@ -107,6 +112,8 @@ def generate_book_data(book_data: Dict[str, Any]) -> List[Dict[str, Any]]:
                 ref_clean = item.get('ref', '').strip()
                 if ref_clean:
                     seen_refs.add(ref_clean)
+                    for parsed in parse_refs(ref_clean, book_name):
+                        ref_index.add(parsed)
                 final_items.append(item)
             print(f"   ✅ Strong Verbs added. Count: {len(final_items)}")
         else:
@@ -172,17 +179,19 @@ def generate_book_data(book_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         if batch_items:
             for item in batch_items:
                 this_ref = item.get('ref', '').strip()
-                is_dup = False
                 
-                # 模糊匹配
-                for seen in seen_refs:
-                    if (seen in this_ref) or (this_ref in seen and len(this_ref) > 3):
-                        is_dup = True
-                        break
+                # 规范化后按经文区间查重（"Gen 17:7" 与 "17:7-8" 重叠，"1:14, 16" 逐段比较）；无法解析的引用按原文比较
+                parsed = parse_refs(this_ref, book_name)
+                if parsed:
+                    is_dup = any(ref_index.has_overlap(ref) for ref in parsed)
+                else:
+                    is_dup = this_ref in seen_refs
                 
                 if not is_dup and "phrase_cn" in item:
                     valid_batch.append(item)
                     seen_refs.add(this_ref)
+                    for ref in parsed:
+                        ref_index.add(ref)
                 else:
                     duplicates += 1
             
@@ -198,7 +207,8 @@ def generate_book_data(book_data: Dict[str, Any]) -> List[Dict[str, Any]]:
             retry_count += 1
             time.sleep(1)
 
-    # 添加 ID
+    # 按经文顺序排列后添加 ID
+    final_items = sort_cards(final_items, book_name)
     for idx, item in enumerate(final_items):
         item['id'] = idx + 1
         
@@ -0,0 +1,190 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tts_cache import tts_cache
+
+# ==================== 相邻卡片音频预取 ====================
+# 渲染当前卡片时，后台线程提前生成 current_index ± 1 的中文 / ESV 音频；
+# 用户点 ❮/❯ 时音频已在磁盘缓存里，rerun 不再阻塞在 edge_tts 上。
+# 每个会话有一个代际号：切换书卷时代际号 +1，旧任务还没开始的直接取消，
+# 已经排队但代际号过期的任务在执行前自行放弃。
+# 会话关闭后 session_id 不会再出现：新会话登记时顺带清理空闲超过 IDLE_SESSION_TTL 且任务已结束的会话。
+
+IDLE_SESSION_TTL = 1800  # 30 分钟无操作视为会话已关闭
+
+
+class AudioPrefetcher:
+    """进程级预取器；按 session_id 隔离各会话的任务与统计"""
+
+    def __init__(self, cache=tts_cache, max_workers=2):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-prefetch")
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self.navigations = 0
+        self.served_from_prefetch = 0
+
+    def _session(self, session_id):
+        now = time.time()
+        state = self._sessions.get(session_id)
+        if state is None:
+            self._prune(now)
+            state = self._sessions[session_id] = {"generation": 0, "futures": [], "scheduled": set()}
+        state["touched_at"] = now
+        return state
+
+    def _prune(self, now):
+        cutoff = now - IDLE_SESSION_TTL
+        for session_id in [sid for sid, state in self._sessions.items()
+                           if state["touched_at"] < cutoff and all(f.done() for f in state["futures"])]:
+            del self._sessions[session_id]
+
+    def _run(self, session_id, generation, text, voice, rate):
+        with self._lock:
+            if self._session(session_id)["generation"] != generation:
+                return None  # 书卷已切换，放弃过期任务
+        try:
+            return self.cache.get(text, voice, rate)
+        except Exception:
+            return None  # 预取失败不影响前台，前台会自行重试生成
+
+    def prefetch(self, session_id, jobs):
+        """jobs: [(text, voice, rate)]；已缓存的条目不会提交"""
+        with self._lock:
+            state = self._session(session_id)
+            generation = state["generation"]
+            state["futures"] = [f for f in state["futures"] if not f.done()]
+            for text, voice, rate in jobs:
+                if not text:
+                    continue
+                path = self.cache.path_for(text, voice, rate)
+                if path in state["scheduled"] or self.cache.lookup(text, voice, rate):
+                    continue
+                state["scheduled"].add(path)
+                state["futures"].append(
+                    self._executor.submit(self._run, session_id, generation, text, voice, rate)
+                )
+
+    def cancel(self, session_id):
+        """切换书卷时调用：作废该会话所有未完成的预取"""
+        with self._lock:
+            state = self._session(session_id)
+            state["generation"] += 1
+            for future in state["futures"]:
+                future.cancel()
+            state["futures"] = []
+            state["scheduled"] = set()
+
+    def record_navigation(self, session_id, text, voice, rate):
+        """导航后渲染音频前调用：记录该音频是否已由预取准备好"""
+        path = self.cache.path_for(text, voice, rate)
+        ready = self.cache.lookup(text, voice, rate) is not None
+        with self._lock:
+            scheduled = path in self._session(session_id)["scheduled"]
+            self.navigations += 1
+            if ready and scheduled:
+                self.served_from_prefetch += 1
+        return ready and scheduled
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "navigations": self.navigations,
+                "served_from_prefetch": self.served_from_prefetch,
+                "hit_rate": (self.served_from_prefetch / self.navigations) if self.navigations else 0.0,
+            }
+
+
+audio_prefetcher = AudioPrefetcher()
+
+
+# ==================== 批次参考音频（常驻事件循环） ====================
+# blitz 判分后逐条调用 get_audio_bytes：每条各自 asyncio.run 一个新事件循环，
+# 串行阻塞 5 × edge_tts 往返。这里改为一个常驻事件循环线程：
+# - 批次一显示就提交整批 ESV 文本，asyncio.gather 并发生成（写入 tts_cache 磁盘缓存）
+# - 每条文本一个 concurrent.futures.Future，界面按完成顺序逐条渲染
+# - 同一音频正在生成时重复提交直接复用同一个 Future
+
+
+class BatchAudioRenderer:
+    """进程级常驻事件循环；所有会话共享，按缓存路径合并重复请求"""
+
+    def __init__(self, cache=tts_cache, max_concurrency=8):
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+        self._in_flight = {}  # 缓存路径 -> Future
+        self.batches = 0
+        self.rendered = 0
+        self.failed = 0
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="tts-batch-loop", daemon=True).start()
+                self._loop = loop
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            return self._loop
+
+    async def _render_one(self, text, voice, rate, path, future):
+        try:
+            async with self._semaphore:
+                result = await self.cache.aget(text, voice, rate)
+            future.set_result(result)
+            with self._lock:
+                self.rendered += 1
+        except Exception as e:
+            future.set_exception(e)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                if self._in_flight.get(path) is future:
+                    del self._in_flight[path]
+
+    async def _gather(self, jobs):
+        await asyncio.gather(*(self._render_one(*job) for job in jobs))
+
+    def render(self, texts, voice, rate):
+        """texts → {text: Future(mp3 路径)}；已缓存的条目返回已完成的 Future，不占用事件循环"""
+        futures = {}
+        jobs = []
+        for text in texts:
+            if not text or text in futures:
+                continue
+            cached = self.cache.lookup(text, voice, rate)
+            if cached:
+                future = Future()
+                future.set_result(cached)
+                futures[text] = future
+                continue
+            path = self.cache.path_for(text, voice, rate)
+            with self._lock:
+                future = self._in_flight.get(path)
+                if future is None:
+                    future = self._in_flight[path] = Future()
+                    jobs.append((text, voice, rate, path, future))
+            futures[text] = future
+        if jobs:
+            with self._lock:
+                self.batches += 1
+            asyncio.run_coroutine_threadsafe(self._gather(jobs), self._ensure_loop())
+        return futures
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "in_flight": len(self._in_flight),
+            }
+
+
+batch_audio = BatchAudioRenderer()
@@ -0,0 +1,313 @@
+import io
+import os
+import wave
+import shutil
+import subprocess
+
+import numpy as np
+
+# ==================== 上传前音频压缩 ====================
+# st.audio_input / 文件上传得到的原始 WAV/M4A 体积大，base64 后再膨胀 33%。
+# 上传前统一：解码 → 单声道 → 16 kHz → 裁掉首尾静音 → 16-bit PCM WAV。
+# 任何一步失败都回退到原始字节，评估流程不受影响。
+# 同一次解码顺带做本地语音活动检测 (VAD)：确定没有人声时直接判 fail，
+# 不再付费请求 Gemini 来回答 "NO_AUDIO"。
+
+TARGET_RATE = 16000
+FRAME_SECONDS = 0.02
+TRIM_PAD_SECONDS = 0.15
+SILENCE_FLOOR = 1e-3  # 低于此 RMS 一律视为静音（满幅 = 1.0）
+SILENCE_RELATIVE_DB = -35.0  # 相对峰值帧能量的门限
+UPLINK_KBPS = float(os.getenv("UPLINK_KBPS", "1000"))  # 估算上传耗时用的上行带宽
+
+# VAD：帧能量高于噪声底 (且高于绝对下限)、过零率低于阈值 (排除嘶嘶底噪) 视为人声
+SPEECH_RMS_FLOOR = 0.005
+NOISE_MULTIPLIER = 3.0
+MAX_SPEECH_ZCR = 0.45
+MIN_SPEECH_SECONDS = 0.3
+
+# 分段：短语之间至少停顿 MIN_PAUSE_SECONDS；短于 MIN_SEGMENT_SECONDS 的人声段视为噪声丢弃
+MIN_PAUSE_SECONDS = 0.35
+MIN_SEGMENT_SECONDS = 0.2
+SEGMENT_PAD_SECONDS = 0.1
+
+
+class AudioPrepResult:
+    """
+    压缩结果：data/mime_type 为实际上传的字节；fell_back 表示使用了原始音频
+    has_speech: True/False 为本地 VAD 结论；None 表示无法解码、交给模型判断
+    """
+
+    def __init__(self, data, mime_type, original_bytes, fell_back=False, error=None,
+                 duration_seconds=None, trimmed_seconds=0.0, voiced_seconds=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.original_bytes = original_bytes
+        self.fell_back = fell_back
+        self.error = error
+        self.duration_seconds = duration_seconds
+        self.trimmed_seconds = trimmed_seconds
+        self.voiced_seconds = voiced_seconds
+
+    @property
+    def has_speech(self):
+        if self.voiced_seconds is None:
+            return None
+        return self.voiced_seconds >= MIN_SPEECH_SECONDS
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+    @property
+    def upload_seconds_saved(self):
+        """按 base64 后体积与 UPLINK_KBPS 估算节省的上传时间"""
+        saved_b64 = self.bytes_saved * 4 / 3
+        return saved_b64 * 8 / (UPLINK_KBPS * 1000)
+
+    def summary(self):
+        if self.fell_back:
+            return f"原始音频上传（{self.original_bytes / 1024:.0f} KB）"
+        return (f"音频压缩 {self.original_bytes / 1024:.0f} KB → {len(self.data) / 1024:.0f} KB，"
+                f"预计上传节省 {self.upload_seconds_saved:.1f}s")
+
+
+def _decode_wav(audio_bytes):
+    """标准库 wave 解码 PCM WAV → (float32 [frames, channels], rate)"""
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wf:
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        rate = wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    return samples.reshape(-1, channels), rate
+
+
+def _decode_ffmpeg(audio_bytes):
+    """非 WAV（m4a/webm/mp3/ogg）交给 ffmpeg 解码为 16 kHz 单声道；未安装则抛错"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise ValueError("ffmpeg not available for non-WAV input")
+    proc = subprocess.run(
+        [ffmpeg, "-v", "error", "-i", "pipe:0", "-ac", "1", "-ar", str(TARGET_RATE), "-f", "s16le", "pipe:1"],
+        input=audio_bytes, capture_output=True, timeout=30, check=True,
+    )
+    samples = np.frombuffer(proc.stdout, dtype="<i2").astype(np.float32) / 32768.0
+    return samples.reshape(-1, 1), TARGET_RATE
+
+
+def decode_audio(audio_bytes):
+    """→ (单声道 float32 样本, 采样率)"""
+    if audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE":
+        samples, rate = _decode_wav(audio_bytes)
+    else:
+        samples, rate = _decode_ffmpeg(audio_bytes)
+    return samples.mean(axis=1), rate
+
+
+def resample(samples, rate, target_rate=TARGET_RATE):
+    """整数倍降采样用分块平均（自带低通）；其余比例用线性插值"""
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if rate > target_rate and rate % target_rate == 0:
+        factor = rate // target_rate
+        usable = len(samples) - len(samples) % factor
+        return samples[:usable].reshape(-1, factor).mean(axis=1)
+    duration = len(samples) / rate
+    target_len = max(1, int(round(duration * target_rate)))
+    positions = np.linspace(0, len(samples) - 1, target_len)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def frame_rms(samples, rate, frame_seconds=FRAME_SECONDS):
+    """按固定帧长计算 RMS（向量化）；返回 (rms[frames], frame_len)"""
+    frame_len = max(1, int(rate * frame_seconds))
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32), frame_len
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    return np.sqrt(np.mean(frames * frames, axis=1)), frame_len
+
+
+def voiced_mask(rms):
+    """能量门限：高于绝对下限，且不低于峰值帧能量 SILENCE_RELATIVE_DB"""
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool)
+    threshold = max(SILENCE_FLOOR, float(rms.max()) * 10 ** (SILENCE_RELATIVE_DB / 20))
+    return rms > threshold
+
+
+def zero_crossing_rate(samples, frame_len):
+    """每帧过零率（向量化）"""
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    signs = np.signbit(samples[:n_frames * frame_len].reshape(n_frames, frame_len))
+    return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+
+def speech_mask(samples, rate):
+    """RMS + 过零率判定每帧是否为人声；返回 (mask[frames], frame_len)"""
+    rms, frame_len = frame_rms(samples, rate)
+    if len(rms) == 0:
+        return np.zeros(0, dtype=bool), frame_len
+    noise = float(np.percentile(rms, 10))
+    threshold = max(SPEECH_RMS_FLOOR, min(noise * NOISE_MULTIPLIER, float(rms.max()) * 0.25))
+    zcr = zero_crossing_rate(samples, frame_len)
+    return (rms > threshold) & (zcr < MAX_SPEECH_ZCR), frame_len
+
+
+def voiced_seconds(samples, rate):
+    mask, frame_len = speech_mask(samples, rate)
+    return float(mask.sum()) * frame_len / rate
+
+
+def segment_at_pauses(samples, rate, expected=None, min_pause=MIN_PAUSE_SECONDS):
+    """
+    在停顿处切分录音 → [(起始样本, 结束样本)]
+    - speech_mask 得到逐帧人声；相邻人声段之间静音 ≥ min_pause 的位置是候选切点
+    - 候选切点多于 expected - 1 时只保留最长的 expected - 1 个停顿（短语内的换气不会被切开）
+    - 人声不足 MIN_SEGMENT_SECONDS 的段丢弃（咳嗽 / 按键声）
+    段数与 expected 不符由调用方决定是否回退整段评分
+    """
+    mask, frame_len = speech_mask(samples, rate)
+    if not mask.any():
+        return []
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    gaps = run_starts[1:] - run_ends[:-1]
+    split_after = np.flatnonzero(gaps * frame_len >= min_pause * rate)
+    if expected and len(split_after) > expected - 1:
+        longest = np.argsort(gaps[split_after], kind="stable")[::-1][:max(0, expected - 1)]
+        split_after = np.sort(split_after[longest])
+    group_starts = np.concatenate(([0], split_after + 1))
+    group_ends = np.concatenate((split_after, [len(run_starts) - 1]))
+    voiced = np.concatenate(([0], np.cumsum(run_ends - run_starts)))
+    pad = int(SEGMENT_PAD_SECONDS * rate)
+    segments = []
+    for first, last in zip(group_starts, group_ends):
+        if (voiced[last + 1] - voiced[first]) * frame_len < MIN_SEGMENT_SECONDS * rate:
+            continue
+        segments.append((max(0, int(run_starts[first]) * frame_len - pad),
+                         min(len(samples), int(run_ends[last]) * frame_len + pad)))
+    return segments
+
+
+def split_phrases(audio_bytes, expected=None):
+    """整段录音 → 每个短语一个 16 kHz WAV 片段；无法解码返回 []"""
+    try:
+        samples, rate = decode_audio(audio_bytes)
+        samples = resample(samples, rate)
+    except Exception:
+        return []
+    return [encode_wav(samples[start:end], TARGET_RATE)
+            for start, end in segment_at_pauses(samples, TARGET_RATE, expected)]
+
+
+def align_segments(segments, total, expected):
+    """
+    段数少于 expected 时推断哪些短语没说 → 长度为 expected 的列表，没说的位置为 None；无法可靠判断返回 None
+    学生按顺序朗读，跳过一条时该处的静音会比"一个短语 + 正常停顿"还长：
+    把缺失的短语依次放进剩余长度最大的间隔（含开头、结尾的静音）；长间隔不够分配时交给模型整批判断
+    """
+    if not segments:
+        return [None] * expected
+    if len(segments) >= expected:
+        return list(segments) if len(segments) == expected else None
+    phrase = float(np.median([end - start for start, end in segments]))
+    inner = [segments[i + 1][0] - segments[i][1] for i in range(len(segments) - 1)]
+    pause = float(np.median(inner)) if inner else MIN_PAUSE_SECONDS * TARGET_RATE
+    slot = phrase + pause
+    gaps = [segments[0][0]] + inner + [total - segments[-1][1]]
+    counts = [0] * len(gaps)
+    for _ in range(expected - len(segments)):
+        i = max(range(len(gaps)), key=lambda j: gaps[j] - counts[j] * slot)
+        if gaps[i] - counts[i] * slot < slot:
+            return None
+        counts[i] += 1
+    aligned = []
+    for segment, missing in zip(segments, counts):
+        aligned.extend([None] * missing)
+        aligned.append(segment)
+    aligned.extend([None] * counts[-1])
+    return aligned
+
+
+def phrase_clips(audio_bytes, expected):
+    """
+    逐条本地 VAD：整段录音 → (每个短语一个 WAV 片段或 None（该条没有人声）, 切出的段数)
+    无法解码或无法把段对应到短语时片段列表为 None，由调用方整批评分
+    """
+    try:
+        samples, rate = decode_audio(audio_bytes)
+        samples = resample(samples, rate)
+    except Exception:
+        return None, 0
+    segments = segment_at_pauses(samples, TARGET_RATE, expected)
+    aligned = align_segments(segments, len(samples), expected)
+    if aligned is None:
+        return None, len(segments)
+    return [None if segment is None else encode_wav(samples[segment[0]:segment[1]], TARGET_RATE)
+            for segment in aligned], len(segments)
+
+
+def trim_silence(samples, rate):
+    """裁掉首尾静音（各保留 TRIM_PAD_SECONDS）；整段静音时原样返回"""
+    rms, frame_len = frame_rms(samples, rate)
+    voiced = np.flatnonzero(voiced_mask(rms))
+    if len(voiced) == 0:
+        return samples
+    pad = int(TRIM_PAD_SECONDS * rate)
+    start = max(0, voiced[0] * frame_len - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame_len + pad)
+    return samples[start:end]
+
+
+def encode_wav(samples, rate):
+    """float32 单声道 → 16-bit PCM WAV 字节"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def compact_audio(audio_bytes, mime_type):
+    """压缩上传音频；解码失败或压缩后反而更大时回退原始字节"""
+    original_size = len(audio_bytes)
+    try:
+        samples, rate = decode_audio(audio_bytes)
+        duration = len(samples) / rate if rate else 0.0
+        samples = resample(samples, rate)
+        speech = voiced_seconds(samples, TARGET_RATE)
+        trimmed = trim_silence(samples, TARGET_RATE)
+        data = encode_wav(trimmed, TARGET_RATE)
+    except Exception as e:
+        return AudioPrepResult(audio_bytes, mime_type, original_size, fell_back=True, error=str(e))
+
+    if len(data) >= original_size:
+        return AudioPrepResult(audio_bytes, mime_type, original_size, fell_back=True,
+                               duration_seconds=duration, voiced_seconds=speech)
+    return AudioPrepResult(
+        data, "audio/wav", original_size,
+        duration_seconds=duration,
+        trimmed_seconds=max(0.0, duration - len(trimmed) / TARGET_RATE),
+        voiced_seconds=speech,
+    )
@@ -0,0 +1,88 @@
+import sys
+import json
+import pickle
+import argparse
+import tracemalloc
+from types import MappingProxyType
+
+from bible_library import DATA_DIR, LazyLibrary, freeze_cards, list_book_files
+
+# ==================== 基准测试：每会话内存占用 ====================
+# 用法：python -m bench.bible_library [--sessions 100]
+# 旧方案：st.cache_data 每次 rerun 反序列化整库，会话里留一份书卷副本 (book_data)
+#         + blitz 的 current_queue = data.copy()
+# 新方案：共享只读卡片，会话里只有书卷名 + 索引 + id 列表
+
+
+def _measure(label, n_sessions, make_session):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    sessions = [make_session(i) for i in range(n_sessions)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_session = (current - baseline) / n_sessions
+    print(f"   {label:<8} 常驻 {(current - baseline) / 1024:9.1f} KB · 每会话 {per_session / 1024:7.2f} KB"
+          f" · 峰值 {(peak - baseline) / 1024:9.1f} KB")
+    return sessions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟多个会话，对比每会话卡片数据的内存占用")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--sessions", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    shared = LazyLibrary(args.data_dir)
+    books = list(shared)
+    if not books:
+        print("❌ 没有书卷数据")
+        return 1
+    eager = {name: [dict(card) for card in shared[name]] for name in books}
+    blob = pickle.dumps(eager)
+    print(f"📚 {len(books)} 卷 · {sum(len(c) for c in eager.values())} 张卡片 · "
+          f"pickle {len(blob) / 1024:.0f} KB · 模拟 {args.sessions} 个会话")
+
+    def old_session(i):
+        library_copy = pickle.loads(blob)  # st.cache_data 返回的副本
+        cards = library_copy[books[i % len(books)]]
+        return {"book_data": cards, "current_index": 0, "current_queue": cards.copy()}
+
+    def new_session(i):
+        book_name = books[i % len(books)]
+        return {"selected_book": book_name, "current_index": 0,
+                "current_queue": [card.get("id") for card in shared[book_name]]}
+
+    _measure("旧方案", args.sessions, old_session)
+    _measure("新方案", args.sessions, new_session)
+    _measure_cards([path for _, path in list_book_files(args.data_dir)])
+    return 0
+
+
+def _measure_cards(paths):
+    """每张卡片的常驻内存：json.load 的 dict / 只读映射 / Card（常驻含字段字符串，容器不含）"""
+    texts = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            texts.append(file.read())
+    n_cards = sum(len(json.loads(text)) for text in texts)
+    print(f"🧩 每张卡片内存（{n_cards} 张）")
+    for label, build, overhead in [
+        ("dict", lambda cards: cards,
+         lambda card: sys.getsizeof(card) + sys.getsizeof(card.get("trap"))),
+        ("只读映射", lambda cards: tuple(MappingProxyType(dict(card)) for card in cards),
+         lambda card: sys.getsizeof(card) + sys.getsizeof(dict(card)) + sys.getsizeof(card.get("trap"))),
+        ("Card", freeze_cards,
+         lambda card: sys.getsizeof(card) + sys.getsizeof(card.trap)),
+    ]:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        kept = [build(json.loads(text)) for text in texts]
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        structure = sum(overhead(card) for cards in kept for card in cards) / n_cards
+        print(f"   {label:<8} 常驻 {(current - baseline) / n_cards:7.0f} B/张 · 其中容器 {structure:5.0f} B/张")
+        del kept
+
+
+if __name__ == "__main__":
+    sys.exit(main())
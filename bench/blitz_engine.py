@@ -0,0 +1,133 @@
+import sys
+import time
+import random
+import argparse
+import statistics
+
+from blitz_engine import BlitzQueue, BatchSizeController, DEFAULT_BATCH_SIZE
+
+# ==================== 基准测试：1 万张卡片的队列 ====================
+# 用法：python -m bench.blitz_engine [--cards 10000]；--adaptive 模拟自适应批次大小
+
+def _list_session(card_ids, grade, batch_size):
+    """旧方案（blitz_app.py 原实现）：切片取批次 + 列表推导式重建主队列 + 线性查找"""
+    current_queue = list(card_ids)
+    failed_queue = []
+    transitions = []
+    while current_queue or failed_queue:
+        start = time.perf_counter()
+        if not current_queue:
+            current_queue = failed_queue.copy()
+            failed_queue = []
+        current_batch = current_queue[:batch_size]
+        results = grade(current_batch)
+        processed_ids = [r.get('id') for r in results]
+        current_queue = [item_id for item_id in current_queue if item_id not in processed_ids]
+        for result in results:
+            if result.get('status') == 'fail' and result.get('id') in current_batch:
+                failed_queue.append(result.get('id'))
+        transitions.append(time.perf_counter() - start)
+    return transitions
+
+
+def _engine_session(card_ids, grade, batch_size):
+    queue = BlitzQueue("bench", card_ids)
+    transitions = []
+    while True:
+        start = time.perf_counter()
+        batch = queue.next_batch(batch_size)
+        if not batch:
+            break
+        queue.settle(grade(batch))
+        transitions.append(time.perf_counter() - start)
+    return transitions
+
+
+# 学生画像：(基础失败率, 记忆负担拐点, 超过拐点后每多一个短语增加的失败率)
+STUDENT_PROFILES = {
+    "熟练": (0.05, 9, 0.06),
+    "一般": (0.10, 6, 0.05),
+    "吃力": (0.30, 4, 0.08),
+}
+
+
+def simulate_batch(size, rng, student=STUDENT_PROFILES["一般"], slow_proxy=False):
+    """
+    模拟延迟模型 → (cycle_seconds, rtt_seconds, passed, failed)
+    学生：每个短语约 2.5 s 录音 + 每批 3 s 准备；批次超过拐点后记忆负担使失败率上升
+    代理：整批一次调用，RTT = 固定开销 + 每项耗时；slow_proxy 模拟代理变慢
+    """
+    speak = (3.0 + 2.5 * size) * rng.uniform(0.85, 1.15)
+    base, per_item = (6.0, 1.5) if slow_proxy else (1.5, 0.45)
+    rtt = (base + per_item * size) * rng.uniform(0.8, 1.3)
+    base_fail, knee, slope = student
+    fail_probability = min(0.95, base_fail + slope * max(0, size - knee))
+    failed = sum(1 for _ in range(size) if rng.random() < fail_probability)
+    return speak + rtt, rtt, size - failed, failed
+
+
+def simulate_controller(batches=400, seed=3):
+    """每种学生画像：固定 5 vs 自适应；前一半正常代理，后一半代理变慢"""
+    print(f"🎚️ 模拟 {batches} 批（后 {batches // 2} 批代理变慢），每批一次评分调用")
+    for profile, student in STUDENT_PROFILES.items():
+        print(f"   学生「{profile}」")
+        _simulate_profile(student, batches, seed)
+
+
+def _simulate_profile(student, batches, seed):
+    for label, controller in [("固定 5", None), ("自适应", BatchSizeController())]:
+        rng = random.Random(seed)
+        elapsed = mastered = calls = 0
+        trajectory = []
+        for n in range(batches):
+            size = controller.size if controller else DEFAULT_BATCH_SIZE
+            cycle, rtt, passed, failed = simulate_batch(size, rng, student, slow_proxy=n >= batches // 2)
+            elapsed += cycle
+            mastered += passed
+            calls += 1
+            if controller:
+                controller.observe(size, cycle, rtt, passed, failed)
+            if n % (batches // 8) == 0:
+                trajectory.append(size)
+        print(f"     {label:<6} 掌握 {mastered / elapsed * 60:5.2f} 个/分 · {mastered / calls:5.2f} 个/调用 · "
+              f"批次大小轨迹 {trajectory}")
+        if controller:
+            reasons = {}
+            for _, _, reason in controller.decisions:
+                reasons[reason] = reasons.get(reason, 0) + 1
+            print(f"            最近 {len(controller.decisions)} 次决策: {reasons}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比列表队列与 deque 队列引擎的换批耗时；--adaptive 模拟自适应批次大小")
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--fail-rate", type=float, default=0.3)
+    parser.add_argument("--adaptive", action="store_true", help="用模拟延迟模型对比固定 / 自适应批次大小")
+    args = parser.parse_args(argv)
+
+    if args.adaptive:
+        simulate_controller()
+        return 0
+
+    card_ids = list(range(1, args.cards + 1))
+    print(f"🧮 {args.cards} 张卡片 · 每批 {args.batch_size} · 失败率 {args.fail_rate:.0%}，练到全部掌握")
+    for label, session in [("列表（旧）", _list_session), ("deque 引擎", _engine_session)]:
+        rng = random.Random(7)
+
+        def grade(batch):
+            return [{"id": item_id, "status": "fail" if rng.random() < args.fail_rate else "pass"}
+                    for item_id in batch]
+
+        start = time.perf_counter()
+        transitions = session(card_ids, grade, args.batch_size)
+        total = time.perf_counter() - start
+        transitions.sort()
+        print(f"   {label:<10} {len(transitions):6d} 次换批 · 总计 {total * 1000:9.1f} ms · "
+              f"中位 {statistics.median(transitions) * 1e6:8.1f} µs · "
+              f"p99 {transitions[int(len(transitions) * 0.99)] * 1e6:8.1f} µs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+
+import numpy as np
+
+from audio_prep import TARGET_RATE, encode_wav, split_phrases
+from blitz_grading import GradingMetrics, grade_batch, grade_segmented
+
+# ==================== 基准测试：分段并行 vs 整批单次调用 ====================
+# 用法：python -m bench.blitz_grading [--trials 40] [--malformed-rate 0.04]
+# 用合成录音（5 个带换气停顿的"短语"）验证切分，再用模拟模型对比两条路径：
+# 延迟 = 固定开销 + 音频秒数 × 处理速度 + 输出项数 × 单项输出耗时；
+# 每项有 malformed_rate 概率在输出中途截断 —— 整批路径保留截断前的项、只补评缺失 id，分段路径只重试该项。
+
+def synthetic_recording(durations, rng, pause_range=(0.45, 0.8)):
+    """每个短语：谐波 + 音节包络，中间有 0.15 s 换气凹陷；短语之间静音 + 底噪"""
+    parts = [np.zeros(int(0.4 * TARGET_RATE), dtype=np.float32)]
+    for seconds in durations:
+        t = np.arange(int(seconds * TARGET_RATE)) / TARGET_RATE
+        envelope = np.sin(np.pi * t / seconds) ** 0.5 * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+        voice = sum(np.sin(2 * np.pi * f * t) / (k + 1) for k, f in enumerate((140, 280, 420, 700)))
+        clip = 0.3 * envelope * voice
+        middle = len(t) // 2
+        clip[middle:middle + int(0.15 * TARGET_RATE)] *= 0.02
+        parts.append(clip.astype(np.float32))
+        parts.append(np.zeros(int(rng.uniform(*pause_range) * TARGET_RATE), dtype=np.float32))
+    samples = np.concatenate(parts)
+    samples += rng.normal(0, 0.002, len(samples)).astype(np.float32)
+    return encode_wav(samples, TARGET_RATE)
+
+
+class _SimulatedModel:
+    def __init__(self, args, rng):
+        self.args = args
+        self.rng = rng
+        self._lock = threading.Lock()
+
+    def _malformed(self):
+        with self._lock:
+            return self.rng.random() < self.args.malformed_rate
+
+    def __call__(self, prompt, audio_bytes, mime_type, schema=None):
+        args = self.args
+        ids = [int(item_id) for item_id in re.findall(r"ID (\d+):", prompt)]
+        n_items = len(ids)
+        audio_seconds = max(0, len(audio_bytes) - 44) / (2 * TARGET_RATE)
+        time.sleep((args.base_latency + audio_seconds * args.audio_cost + n_items * args.item_cost) * args.time_scale)
+        items = [{"id": i, "status": "pass", "user_said": "...", "feedback": "..."} for i in ids]
+        # 第一个出错的项在输出中途被截断，之前的项完好
+        for index in range(n_items):
+            if self._malformed():
+                return json.dumps(items[:index])[:-1] + (", " if index else "") + '{"id": %d, "status": "pass", "user_said": "unterminated' % ids[index]
+        return json.dumps(items if n_items > 1 else items[0])
+
+
+class _Item:
+    def __init__(self, item_id):
+        self.id = item_id
+        self.phrase_cn = "中文"
+        self.phrase_en = "English"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分段并行评分 vs 整批单次调用（模拟模型）")
+    parser.add_argument("--trials", type=int, default=40)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--base-latency", type=float, default=1.2, help="每次调用固定开销（秒）")
+    parser.add_argument("--audio-cost", type=float, default=0.15, help="每秒音频的处理耗时（秒）")
+    parser.add_argument("--item-cost", type=float, default=0.6, help="每项输出耗时（秒）")
+    parser.add_argument("--malformed-rate", type=float, default=0.04, help="每项输出格式错误的概率")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="模拟耗时缩放（1 = 真实时长）")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(11)
+    np_rng = np.random.default_rng(11)
+    items = [_Item(i) for i in range(1, args.items + 1)]
+    model = _SimulatedModel(args, rng)
+    metrics = GradingMetrics()
+
+    split_ms = []
+    matched = 0
+    single = []
+    segmented = []
+    single_lost = segmented_lost = 0
+    for _ in range(args.trials):
+        recording = synthetic_recording(np_rng.uniform(0.7, 1.6, args.items), np_rng)
+
+        # 整批：格式错误时对缺失项重评（最多重试 BATCH_RETRIES 次）
+        start = time.perf_counter()
+        results, _calls, _text = grade_batch(model, items, recording, "audio/wav", metrics=metrics)
+        single_lost += args.items - len(results)
+        single.append((time.perf_counter() - start) / args.time_scale)
+
+        # 分段：本地切分 + 并发逐项评分
+        start = time.perf_counter()
+        clips = split_phrases(recording, args.items)
+        split_ms.append((time.perf_counter() - start) * 1000)
+        if len(clips) == args.items:
+            matched += 1
+            results = grade_segmented(model, items, clips, metrics=metrics)
+            segmented_lost += args.items - len(results)
+        segmented.append((time.perf_counter() - start - split_ms[-1] / 1000) / args.time_scale + split_ms[-1] / 1000)
+
+    total_items = args.trials * args.items
+    print(f"🧮 {args.trials} 批 × {args.items} 项 · 单项格式错误率 {args.malformed_rate:.0%} · 耗时按真实时长换算")
+    print(f"   切分: {matched}/{args.trials} 批段数正确 · 中位 {statistics.median(split_ms):.1f} ms")
+    for label, samples, lost in [("整批单次", single, single_lost), ("分段并行", segmented, segmented_lost)]:
+        samples = sorted(samples)
+        print(f"   {label}  中位 {statistics.median(samples):5.2f}s · p95 {samples[int(len(samples) * 0.95)]:5.2f}s"
+              f" · 重试后仍失败 {lost}/{total_items} 项 ({lost / total_items:.1%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from bible_library import DATA_DIR
+from card_repository import CardRepository
+from bench.library_compiler import make_synthetic_corpus
+
+# ==================== 基准测试：3 万卡片查询耗时 ====================
+# 用法：python -m bench.card_repository
+
+def _time_us(fn, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6, len(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在 66 卷 / 3 万卡片合成库上测试 SQLite 索引查询耗时")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="pplib_repo_")
+    try:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        os.makedirs(corpus_dir)
+        make_synthetic_corpus(args.data_dir, corpus_dir)
+        repo = CardRepository(os.path.join(work_dir, "cards.sqlite3"), corpus_dir)
+        start = time.perf_counter()
+        repo.sync()
+        print(f"📚 合成库导入 ({(time.perf_counter() - start) * 1000:.0f} ms): {repo.stats()}")
+        for label, fn in [
+            ("Book33 章 3–8", lambda: repo.in_range("Book33", 3, 8)),
+            ("Book33 5:1–5:10", lambda: repo.in_range("Book33", 5, 5, 1, 10)),
+            ("提到 covenant（全库）", lambda: repo.mentioning("Covenant")),
+            ("提到 covenant（单卷）", lambda: repo.mentioning("Covenant", book_name="Book33")),
+            ("sync（无变化）", lambda: [repo.sync()]),
+        ]:
+            median_us, rows = _time_us(fn)
+            print(f"   {label:<22} {median_us:8.1f} µs · {rows} 行")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
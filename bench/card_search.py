@@ -0,0 +1,46 @@
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from bible_library import DATA_DIR, LazyLibrary
+from card_search import CardSearchIndex
+from bench.library_compiler import make_synthetic_corpus
+
+# ==================== 基准测试 ====================
+# 用法：python -m bench.card_search [查询词 ...]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="卡片全文检索基准（当前书卷 + 66 卷 / 3 万卡片合成库）")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("queries", nargs="*", default=["Abide", "立约", "covenant", "dwelt among us", "Gen 17"])
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="pplib_search_")
+    try:
+        make_synthetic_corpus(args.data_dir, work_dir)
+        for label, data_dir in [("当前书卷", args.data_dir), ("合成库", work_dir)]:
+            index = CardSearchIndex(LazyLibrary(data_dir, None))
+            start = time.perf_counter()
+            index.refresh()
+            print(f"\n📚 {label}: 建索引 {(time.perf_counter() - start) * 1000:.0f} ms · {index.stats()}")
+            start = time.perf_counter()
+            index.refresh()
+            print(f"   无变化 refresh: {(time.perf_counter() - start) * 1000:.2f} ms")
+            for query in args.queries:
+                samples = []
+                for _ in range(50):
+                    start = time.perf_counter()
+                    results = index.search(query, refresh=False)
+                    samples.append(time.perf_counter() - start)
+                top = f"{results[0][0]} {results[0][2].get('ref')}" if results else "—"
+                print(f"   {query!r:<18} {statistics.median(samples) * 1000:6.2f} ms · {len(results)} 条 · 首条 {top}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
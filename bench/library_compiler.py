@@ -0,0 +1,96 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+from bible_library import DATA_DIR, LazyLibrary, list_book_files
+from library_compiler import compile_library
+from scripture_ref import BOOK_NAMES
+
+# ==================== 基准测试：冷启动 ====================
+# 用法：python -m bench.library_compiler [--repeat 5]
+
+def make_synthetic_corpus(source_dir, out_dir, n_books=66, n_cards=30000):
+    """用现有卡片循环填充 n_books 卷、共 n_cards 张卡片的合成库（ref 用正典书名，章节可被 parse_ref 解析）"""
+    templates = [card for name, _ in list_book_files(source_dir) for card in LazyLibrary(source_dir, None)[name]]
+    if not templates:
+        raise ValueError(f"no cards in {source_dir}")
+    per_book = n_cards // n_books
+    card_no = 0
+    for b in range(n_books):
+        count = per_book + (1 if b < n_cards % n_books else 0)
+        cards = []
+        for i in range(count):
+            card = dict(templates[card_no % len(templates)])
+            card["id"] = i + 1
+            card["ref"] = f"{BOOK_NAMES[b % len(BOOK_NAMES)]} {i // 30 + 1}:{i % 30 + 1}"
+            cards.append(card)
+            card_no += 1
+        with open(os.path.join(out_dir, f"Book{b + 1:02d}.json"), "w", encoding="utf-8") as file:
+            json.dump(cards, file, ensure_ascii=False, indent=2)
+
+
+def _eager_json(data_dir):
+    """旧方案：启动时解析全部书卷"""
+    library = {}
+    for book_name, path in list_book_files(data_dir):
+        with open(path, "r", encoding="utf-8") as file:
+            library[book_name] = json.load(file)
+    return library
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def bench(label, data_dir, repeat):
+    artifact_path = os.path.join(tempfile.mkdtemp(prefix="pplib_"), "library.bin")
+    header = compile_library(data_dir, artifact_path)
+    n_books = len(header["books"])
+    n_cards = sum(entry["count"] for entry in header["books"].values())
+    first = sorted(header["books"])[0]
+
+    def first_card(artifact):
+        library = LazyLibrary(data_dir, artifact)
+        return library[sorted(library)[0]][0]
+
+    def all_cards(artifact):
+        library = LazyLibrary(data_dir, artifact)
+        return [library[name] for name in library]
+
+    print(f"\n📚 {label}: {n_books} 卷 · {n_cards} 张卡片 · 产物 {os.path.getsize(artifact_path) / 1024:.0f} KB")
+    print(f"   旧方案 全量解析 JSON          {_time(lambda: _eager_json(data_dir), repeat):8.2f} ms")
+    print(f"   按需 JSON  → 首张卡片 ({first}) {_time(lambda: first_card(None), repeat):8.2f} ms")
+    print(f"   编译产物   → 首张卡片         {_time(lambda: first_card(artifact_path), repeat):8.2f} ms")
+    print(f"   按需 JSON  → 全部书卷         {_time(lambda: all_cards(None), repeat):8.2f} ms")
+    print(f"   编译产物   → 全部书卷         {_time(lambda: all_cards(artifact_path), repeat):8.2f} ms")
+    shutil.rmtree(os.path.dirname(artifact_path), ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比 JSON 与编译产物的冷启动耗时")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    bench("当前书卷", args.data_dir, args.repeat)
+    synthetic_dir = tempfile.mkdtemp(prefix="pplib_corpus_")
+    try:
+        make_synthetic_corpus(args.data_dir, synthetic_dir)
+        bench("合成库", synthetic_dir, args.repeat)
+    finally:
+        shutil.rmtree(synthetic_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from openai import OpenAI
+
+from llm_clients import ClientRegistry
+
+# ==================== 基准测试：本地模拟 OpenAI 兼容服务 ====================
+# 用法：python -m bench.llm_clients [--requests 200] [--latency 0.005]
+
+
+class _MockChatHandler(BaseHTTPRequestHandler):
+    """最小 /chat/completions 实现；HTTP/1.1 以支持 keep-alive"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.accepted += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.latency)
+        body = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": '{"status": "pass", "user_said": "mock", "feedback": "ok"}'},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(latency=0.005):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockChatHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.accepted = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _bench(label, server, n_requests, make_client):
+    with server.lock:
+        server.accepted = 0
+    start = time.perf_counter()
+    for _ in range(n_requests):
+        client, owned = make_client()
+        client.chat.completions.create(model="mock", messages=[{"role": "user", "content": "ping"}])
+        if owned:
+            client.close()
+    elapsed = time.perf_counter() - start
+    print(f"   {label:<18} {elapsed * 1000 / n_requests:7.2f} ms/req · 服务端建立连接 {server.accepted}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比每次新建客户端 vs 共享连接池")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="模拟服务端处理延迟（秒）")
+    args = parser.parse_args(argv)
+
+    server = start_mock_server(args.latency)
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    print(f"🔌 Mock server: {base_url} · {args.requests} 次请求")
+
+    _bench("每次新建客户端", server, args.requests,
+           lambda: (OpenAI(api_key="bench", base_url=base_url), True))
+    registry = ClientRegistry()
+    _bench("共享连接池", server, args.requests,
+           lambda: (registry.get("bench", base_url), False))
+    print(f"   📊 注册表统计: {registry.stats()}")
+    server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import sys
+import time
+import random
+import argparse
+import threading
+import statistics
+from collections import deque
+
+from llm_governor import LLMGovernor
+
+# ==================== 基准测试：模拟一个班级同时提交 ====================
+# 用法：python -m bench.llm_governor [--students 30] [--heavy 3]
+# 模拟中转站：每秒最多 capacity_rps 个请求、最多 max_concurrency 个并发，超出返回 429；
+# 请求耗时 latency ± 30%。学生会话：普通学生每人 requests 次评估（单请求），
+# 另有 heavy 个闪电战会话每次并发 8 个分段请求。
+# 不限流：客户端收到 429 后等 backoff 秒重试（直到成功）；限流：所有请求经 LLMGovernor。
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class _SimulatedProvider:
+    def __init__(self, capacity_rps, max_concurrency, latency, time_scale):
+        self.capacity_rps = capacity_rps
+        self.max_concurrency = max_concurrency
+        self.latency = latency
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._starts = deque()
+        self._in_flight = 0
+        self.ok = 0
+        self.rejected = 0
+
+    def __call__(self, rng):
+        now = time.monotonic()
+        with self._lock:
+            while self._starts and now - self._starts[0] > self.time_scale:
+                self._starts.popleft()
+            if len(self._starts) >= self.capacity_rps or self._in_flight >= self.max_concurrency:
+                self.rejected += 1
+                raise RateLimitError("429 Too Many Requests")
+            self._starts.append(now)
+            self._in_flight += 1
+        try:
+            time.sleep(self.latency * rng.uniform(0.7, 1.3) * self.time_scale)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.ok += 1
+
+
+def _run_class(args, governed):
+    # 模拟时间 1 秒 = time_scale 秒真实时间；限额按同样比例换算
+    scale = args.time_scale
+    provider = _SimulatedProvider(args.capacity_rps, args.max_concurrency, args.latency, scale)
+    governor = LLMGovernor({"sim": {"rpm": int(args.governor_rps * 60 / scale), "burst": args.governor_burst,
+                                    "concurrency": args.max_concurrency, "cooldown": args.backoff * scale}})
+    latencies = {"light": [], "heavy": []}
+    lock = threading.Lock()
+
+    def request(session_id, rng):
+        start = time.monotonic()
+        if governed:
+            governor.call("sim", session_id, provider, rng, retries=20)
+        else:
+            while True:
+                try:
+                    provider(rng)
+                    break
+                except RateLimitError:
+                    time.sleep(args.backoff * rng.uniform(0.5, 1.5) * scale)
+        return (time.monotonic() - start) / scale
+
+    def student(session_id, kind, seed):
+        rng = random.Random(seed)
+        time.sleep(rng.uniform(0, args.spread) * scale)
+        for _ in range(args.requests):
+            if kind == "heavy":
+                results = []
+                threads = [threading.Thread(target=lambda: results.append(request(session_id, random.Random(rng.random()))))
+                           for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                batch_seconds = max(results)
+            else:
+                batch_seconds = request(session_id, rng)
+            with lock:
+                latencies[kind].append(batch_seconds)
+            time.sleep(rng.uniform(1, 3) * args.think * scale)
+
+    sessions = [(f"s{i}", "heavy" if i < args.heavy else "light") for i in range(args.students)]
+    threads = [threading.Thread(target=student, args=(sid, kind, i)) for i, (sid, kind) in enumerate(sessions)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = (time.monotonic() - start) / scale
+    return provider, elapsed, latencies, governor.stats().get("sim")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="全班同时提交：不限流 vs LLMGovernor（模拟中转站）")
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--heavy", type=int, default=3, help="其中闪电战分段评分会话数（每次 8 个并发请求）")
+    parser.add_argument("--requests", type=int, default=6, help="每个会话的提交次数")
+    parser.add_argument("--capacity-rps", type=int, default=10, help="中转站每秒请求上限")
+    parser.add_argument("--max-concurrency", type=int, default=12, help="中转站并发上限")
+    parser.add_argument("--governor-rps", type=float, default=9.0, help="限流器每秒放行数（略低于上限）")
+    parser.add_argument("--governor-burst", type=int, default=1, help="令牌桶容量；rps + burst 超过上限时仍会触发 429")
+    parser.add_argument("--latency", type=float, default=1.5, help="单次请求耗时（秒）")
+    parser.add_argument("--backoff", type=float, default=1.0, help="不限流时 429 后的重试间隔（秒）")
+    parser.add_argument("--spread", type=float, default=5.0, help="学生开始提交的时间分布（秒）")
+    parser.add_argument("--think", type=float, default=2.0, help="两次提交之间的间隔基数（秒）")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="模拟耗时缩放（1 = 真实时长）")
+    args = parser.parse_args(argv)
+
+    total = (args.students - args.heavy) * args.requests + args.heavy * args.requests * 8
+    print(f"🧮 {args.students} 个会话（{args.heavy} 个闪电战分段）· 共 {total} 次调用 · "
+          f"中转站上限 {args.capacity_rps} req/s、并发 {args.max_concurrency} · 耗时按真实时长换算")
+    for governed in (False, True):
+        provider, elapsed, latencies, gate_stats = _run_class(args, governed)
+        light = sorted(latencies["light"])
+        heavy = sorted(latencies["heavy"])
+        label = "LLMGovernor" if governed else "不限流"
+        print(f"   {label:<12} 总耗时 {elapsed:5.1f}s · 吞吐 {provider.ok / elapsed:4.1f} req/s · "
+              f"429 {provider.rejected} 次 ({provider.rejected / (provider.ok + provider.rejected):.0%})")
+        print(f"                评估 中位 {statistics.median(light):4.1f}s p95 {light[int(len(light) * 0.95)]:4.1f}s · "
+              f"闪电战批次 中位 {statistics.median(heavy):4.1f}s p95 {heavy[int(len(heavy) * 0.95)]:4.1f}s")
+        if gate_stats:
+            print(f"                排队等待 平均 {gate_stats['avg_wait_seconds'] / args.time_scale:4.1f}s · "
+                  f"p95 {gate_stats['p95_wait_seconds'] / args.time_scale:4.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import sys
+import time
+import random
+import argparse
+
+import bible_library
+from scripture_ref import RefIndex, parse_ref, parse_refs, _BOOKS
+
+# ==================== 基准测试 ====================
+# 用法：python -m bench.scripture_ref [--generated 100000] [--dedupe 3000]
+
+def _generate_refs(n, seed=7):
+    rng = random.Random(seed)
+    styles = [
+        lambda b, c, v: f"{b} {c}:{v}",
+        lambda b, c, v: f"{b} {c}:{v}-{v + rng.randint(1, 5)}",
+        lambda b, c, v: f"{b}. {c}:{v}",
+        lambda b, c, v: f"{b} {c}",
+        lambda b, c, v: f"{b} {c}:{v}-{c + 1}:{rng.randint(1, 20)}",
+        lambda b, c, v: f"{b} {c}:{v}, {v + 2}",
+    ]
+    names = [name for name, aliases in _BOOKS for name in [name] + aliases.split()[:2]]
+    return [rng.choice(styles)(rng.choice(names), rng.randint(1, 150), rng.randint(1, 176)) for _ in range(n)]
+
+
+def _substring_dedupe(refs):
+    """arsenal_factory 原有的子串包含查重（O(n²)）"""
+    seen = []
+    for ref in refs:
+        if not any((s in ref) or (ref in s and len(ref) > 3) for s in seen):
+            seen.append(ref)
+    return len(seen)
+
+
+def _index_dedupe(refs):
+    index = RefIndex()
+    for text in refs:
+        ref = parse_ref(text)
+        if ref is not None and not index.has_overlap(ref):
+            index.add(ref)
+    return len(index)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="经文引用解析 / 区间索引基准")
+    parser.add_argument("--data-dir", default=None, help="书卷目录（默认 bible_library.DATA_DIR）")
+    parser.add_argument("--generated", type=int, default=100000)
+    parser.add_argument("--dedupe", type=int, default=3000, help="子串查重对比的引用数（O(n²)）")
+    args = parser.parse_args(argv)
+
+    library = bible_library.LazyLibrary(args.data_dir or bible_library.DATA_DIR, None)
+    corpus = [(card.get("ref", ""), name) for name in library for card in library[name]]
+    parse_refs.cache_clear()
+    parsed, elapsed = _timed(lambda: [parse_ref(text, name) for text, name in corpus])
+    failures = [text for (text, _), ref in zip(corpus, parsed) if ref is None]
+    print(f"📖 语料 {len(corpus)} 条: {elapsed * 1e6 / max(1, len(corpus)):.2f} µs/条 · 无法解析 {len(failures)} {failures[:5]}")
+
+    generated = _generate_refs(args.generated)
+    parse_refs.cache_clear()
+    parsed, elapsed = _timed(lambda: [parse_ref(text) for text in generated])
+    print(f"🧪 生成 {len(generated)} 条: {elapsed * 1e6 / len(generated):.2f} µs/条（冷缓存）"
+          f" · 无法解析 {sum(ref is None for ref in parsed)}")
+
+    index, elapsed = _timed(lambda: RefIndex.build((ref, i) for i, ref in enumerate(parsed) if ref is not None))
+    print(f"🗂️ 建索引 {len(index)} 条: {elapsed * 1000:.1f} ms")
+    probes = [ref for ref in parsed[:10000] if ref is not None]
+    hits, elapsed = _timed(lambda: sum(len(index.overlapping(ref)) for ref in probes))
+    print(f"🔎 区间查询 {len(probes)} 次: {elapsed * 1e6 / len(probes):.2f} µs/次 · 平均命中 {hits / len(probes):.1f}")
+
+    sample = generated[:args.dedupe]
+    kept_old, old_elapsed = _timed(_substring_dedupe, sample)
+    kept_new, new_elapsed = _timed(_index_dedupe, sample)
+    print(f"♻️ 查重 {len(sample)} 条: 子串包含 {old_elapsed * 1000:.1f} ms（保留 {kept_old}）"
+          f" · 区间索引 {new_elapsed * 1000:.1f} ms（保留 {kept_new}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
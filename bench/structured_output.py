@@ -0,0 +1,100 @@
+import sys
+import json
+import time
+import random
+import argparse
+
+from json_stream import salvage_json_array, salvage_json_object
+from structured_output import VALID_STATUSES, ParseMetrics
+
+# ==================== 基准测试：严格解析 vs 容错解析 ====================
+# 用法：python -m bench.structured_output [--batches 2000] [--defect-rate 0.03]
+# 模拟模型输出整批 JSON：每项有 defect_rate 概率触发一种常见缺陷（截断 / 前后夹杂说明文字 / 单项损坏）。
+# 严格解析：任何缺陷都整批重评；容错解析：保留捞回的项，只重新请求缺失 id。
+# 比较两种策略的调用次数、重评的短语数与重试后仍缺失的短语数。
+
+def _render_batch(ids, rng, defect_rate):
+    items = [{"id": i, "status": rng.choice(VALID_STATUSES), "user_said": f"phrase {i}",
+              "feedback": "这里用 'Make' 稍显软弱，Gen 17 强调 {Establish}。"} for i in ids]
+    text = json.dumps(items, ensure_ascii=False)
+    if rng.random() >= defect_rate * len(ids):
+        return text
+    defect = rng.choice(("truncated", "chatter", "broken_item"))
+    if defect == "truncated":
+        return text[:rng.randint(len(text) // 3, len(text) - 2)]
+    if defect == "chatter":
+        return f"Here are the results:\n```json\n{text}\n```\nLet me know if you need more detail."
+    parts = [json.dumps(item, ensure_ascii=False) for item in items]
+    broken = rng.randrange(len(parts))
+    parts[broken] = parts[broken].replace('"status": ', '"status" ', 1)
+    return "[" + ", ".join(parts) + "]"
+
+
+def _strict_parse(text):
+    value = json.loads(text.strip())
+    if not isinstance(value, list):
+        raise ValueError("not a JSON array")
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="整批 JSON：严格解析（整批重评） vs 容错解析（只补评缺失 id）")
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--defect-rate", type=float, default=0.03, help="每项触发输出缺陷的概率")
+    parser.add_argument("--retries", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    samples = {
+        "fenced": '```json\n{"status": "PASS", "user_said": "abide", "feedback": "ok"}\n```',
+        "chatter": 'Sure! {"status": "warning", "user_said": "remain", "feedback": "稍弱"} Hope this helps.',
+        "truncated": '{"status": "fail", "user_said": "meat", "feedback": "不要用 \'Meat\'。保罗神学中',
+    }
+    for label, text in samples.items():
+        value, complete = salvage_json_object(text)
+        print(f"   对象 {label:<10} complete={complete!s:<5} → {value}")
+
+    results = {}
+    for strategy in ("strict", "tolerant"):
+        rng = random.Random(7)
+        metrics = ParseMetrics()
+        calls = regraded = lost = 0
+        start = time.perf_counter()
+        for _ in range(args.batches):
+            pending = list(range(1, args.items + 1))
+            for attempt in range(args.retries + 1):
+                text = _render_batch(pending, rng, args.defect_rate)
+                calls += 1
+                if attempt:
+                    regraded += len(pending)
+                if strategy == "strict":
+                    try:
+                        _strict_parse(text)
+                        metrics.record("batch", "clean", retry=attempt > 0, rerequested=len(pending))
+                        pending = []
+                    except ValueError:
+                        metrics.record("batch", "failed", retry=attempt > 0, rerequested=len(pending))
+                else:
+                    items, complete = salvage_json_array(text)
+                    got = {item.get("id") for item in items if item.get("status") in VALID_STATUSES}
+                    outcome = "clean" if complete and got >= set(pending) else ("salvaged" if got else "failed")
+                    metrics.record("batch", outcome, retry=attempt > 0, rerequested=len(pending))
+                    pending = [i for i in pending if i not in got]
+                if not pending:
+                    break
+            lost += len(pending)
+        elapsed = time.perf_counter() - start
+        results[strategy] = (calls, regraded, lost, metrics.snapshot(), elapsed)
+
+    total = args.batches * args.items
+    print(f"\n🧮 {args.batches} 批 × {args.items} 项 · 单项缺陷率 {args.defect_rate:.0%} · 最多重试 {args.retries} 次")
+    for strategy, (calls, regraded, lost, snap, elapsed) in results.items():
+        label = "严格（整批重评）" if strategy == "strict" else "容错（只补缺失 id）"
+        print(f"   {label:<14} 调用 {calls} 次 · 重评 {regraded} 项 · 仍缺失 {lost}/{total} 项 · "
+              f"解析失败率 {snap['parse_failure_rate']:.1%} · 捞回率 {snap['salvage_rate']:.1%} · "
+              f"重试率 {snap['retry_rate']:.1%} · 解析耗时 {elapsed * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
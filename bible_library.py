@@ -0,0 +1,369 @@
+import os
+import re
+import sys
+import mmap
+import json
+import struct
+import marshal
+import hashlib
+import threading
+from types import MappingProxyType
+from collections.abc import Mapping
+
+# ==================== 经卷数据加载 ====================
+# app.py / blitz_app.py / 预渲染脚本共用同一套目录与过滤规则
+
+DATA_DIR = "assets/bible_data"
+
+# library_compiler.py 生成的编译产物（见下方 CompiledArtifact）
+ARTIFACT_PATH = "assets/bible_library.bin"
+ARTIFACT_MAGIC = b"PPLIB\x00\x00\x00"
+ARTIFACT_VERSION = 3
+
+
+def list_book_files(data_dir=DATA_DIR):
+    """返回 [(书卷名, 文件路径)]；跳过 blueprint（工厂脚本用）和备份目录"""
+    if not os.path.exists(data_dir):
+        return []
+    return [
+        (f.replace(".json", ""), os.path.join(data_dir, f))
+        for f in os.listdir(data_dir)
+        if f.endswith(".json") and not f.startswith("blueprint") and not f.startswith("_backup")
+    ]
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# ==================== 卡片模型 ====================
+# 书卷 JSON 由不同批次的工厂脚本生成，字段名并不统一（reference / cn / focus_verb_cn / key_verb …），
+# trap 有时是列表、有时是 "A / B / C" 字符串。加载时一次性归一化为 Card，
+# 界面与提示词只读固定字段，不再各自写 .get() 兜底。
+
+CARD_FIELDS = ("id", "ref", "phrase_cn", "phrase_en", "key_term", "trap", "sentence_context", "nuance_note")
+
+# 别名 → 标准字段；标准字段本身优先于别名
+CARD_ALIASES = {
+    "reference": "ref",
+    "verse_ref": "ref",
+    "chinese_phrase": "phrase_cn",
+    "cn": "phrase_cn",
+    "chinese": "phrase_cn",
+    "focus_verb_cn": "phrase_cn",
+    "english_phrase": "phrase_en",
+    "en": "phrase_en",
+    "english": "phrase_en",
+    "focus_verb_en": "phrase_en",
+    "key_verb": "key_term",
+    "key_focus_term": "key_term",
+    "term": "key_term",
+    "traps": "trap",
+    "context": "sentence_context",
+    "note": "nuance_note",
+    "nuance": "nuance_note",
+}
+
+_TRAP_SEPARATORS = re.compile(r"\s*[,;/|，；、]\s*")
+_NO_EXTRA = MappingProxyType({})
+
+
+def normalize_trap(value):
+    """trap → 去空白、去重的字符串元组；字符串按 , ; / | 、 拆分"""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        items = _TRAP_SEPARATORS.split(value)
+    elif isinstance(value, (list, tuple)):
+        items = [str(item) for item in value if item is not None]
+    else:
+        items = [str(value)]
+    return tuple(dict.fromkeys(item.strip() for item in items if item and item.strip()))
+
+
+class Card:
+    """
+    只读卡片：__slots__ 固定字段 + extra（未识别字段，通常为空且共享同一个空映射）
+    仍保留 get / [] / keys，兼容按字典访问的旧代码（别名同样可用）
+    """
+
+    __slots__ = CARD_FIELDS + ("extra",)
+
+    def __init__(self, id=None, ref="", phrase_cn="", phrase_en="", key_term="", trap=(),
+                 sentence_context="", nuance_note="", extra=None):
+        for name, value in (("id", id), ("ref", ref), ("phrase_cn", phrase_cn), ("phrase_en", phrase_en),
+                            ("key_term", key_term), ("trap", normalize_trap(trap)),
+                            ("sentence_context", sentence_context), ("nuance_note", nuance_note),
+                            ("extra", MappingProxyType(dict(extra)) if extra else _NO_EXTRA)):
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        """一次遍历完成别名解析与 trap 归一化"""
+        if isinstance(data, Card):
+            return data
+        values = {}
+        aliased = {}
+        extra = {}
+        for key, value in data.items():
+            if key in CARD_FIELDS:
+                values[key] = value
+            elif key in CARD_ALIASES:
+                aliased.setdefault(CARD_ALIASES[key], value)
+            else:
+                extra[key] = value
+        for name, value in aliased.items():
+            if values.get(name) in (None, ""):
+                values[name] = value
+        for name in ("ref", "phrase_cn", "phrase_en", "key_term", "sentence_context", "nuance_note"):
+            value = values.get(name)
+            values[name] = "" if value is None else str(value).strip()
+        return cls(extra=extra, **values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("Card is read-only")
+
+    def __reduce__(self):
+        return (Card, tuple(getattr(self, name) for name in CARD_FIELDS) + (dict(self.extra),))
+
+    # ---------- 兼容字典访问 ----------
+
+    def get(self, key, default=None):
+        name = key if key in CARD_FIELDS else CARD_ALIASES.get(key)
+        if name is None:
+            return self.extra.get(key, default)
+        value = getattr(self, name)
+        return default if value is None or value == "" or value == () else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _NO_EXTRA)
+        if value is _NO_EXTRA:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _NO_EXTRA) is not _NO_EXTRA
+
+    def keys(self):
+        return [name for name in CARD_FIELDS if self.get(name, _NO_EXTRA) is not _NO_EXTRA] + list(self.extra)
+
+    def to_dict(self):
+        """可 JSON 序列化的普通字典（trap 为列表）"""
+        data = {key: self[key] for key in self.keys()}
+        if "trap" in data:
+            data["trap"] = list(data["trap"])
+        return data
+
+    def __repr__(self):
+        return f"Card(id={self.id!r}, ref={self.ref!r}, key_term={self.key_term!r})"
+
+
+def freeze_cards(cards):
+    """卡片列表 → Card 元组，供所有会话共享"""
+    return tuple(Card.from_dict(card) for card in cards)
+
+
+# ==================== 编译产物（快速冷启动） ====================
+# 布局：MAGIC(8) | 头部长度 uint32 LE | 头部 JSON | 各书卷 marshal 数据
+# 头部只含书卷表 {offset, length, sha256, source [mtime_ns, size, sha256], count} 与 content_hash，保持很小。
+# 打开时只 mmap + 解析头部；书卷按需切片解码并校验 sha256。
+# marshal 格式随 Python 版本变化：版本不符整个产物视为不可用。
+# 源 JSON 是否过期：mtime/size 与头部一致直接视为未变（不读源文件）；大小不同视为过期；
+# 只有 mtime 变了（checkout / 复制）时才读源文件比对 sha256。过期的书卷回退读取 JSON。
+
+ARTIFACT_PYTHON = f"{sys.version_info[0]}.{sys.version_info[1]}"
+
+
+class CompiledArtifact:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            self.signature = _file_signature(path)
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+            raise ValueError("not a compiled library artifact")
+        (header_len,) = struct.unpack_from("<I", self._mm, len(ARTIFACT_MAGIC))
+        header_start = len(ARTIFACT_MAGIC) + 4
+        header = json.loads(self._mm[header_start:header_start + header_len])
+        if header.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"artifact version {header.get('version')} != {ARTIFACT_VERSION}")
+        if header.get("python") != ARTIFACT_PYTHON:
+            raise ValueError(f"artifact built for Python {header.get('python')}, running {ARTIFACT_PYTHON}")
+        self.payload_offset = header_start + header_len
+        self.content_hash = header["content_hash"]
+        self.books = header["books"]
+
+    def check_source(self, book_name, path, signature):
+        """
+        → (该卷是否可用, 读到的源文件字节或 None)
+        只有 mtime 不同而大小相同时才读源文件算哈希；读到的字节返回给调用方，过期时直接解析，不再读第二次
+        """
+        entry = self.books.get(book_name)
+        if entry is None:
+            return False, None
+        mtime_ns, size, digest = entry["source"]
+        if size != signature[1]:
+            return False, None
+        if mtime_ns == signature[0]:
+            return True, None
+        with open(path, "rb") as file:
+            data = file.read()
+        return hashlib.sha256(data).hexdigest() == digest, data
+
+    def _read_section(self, entry, label):
+        start = self.payload_offset + entry["offset"]
+        raw = self._mm[start:start + entry["length"]]
+        if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+            raise ValueError(f"artifact checksum mismatch for {label}")
+        return marshal.loads(raw)
+
+    def read_book(self, book_name):
+        return self._read_section(self.books[book_name], book_name)
+
+    def close(self):
+        self._mm.close()
+
+
+def open_artifact(path=ARTIFACT_PATH):
+    """打开编译产物 → (产物或 None, 错误信息或 None)；不存在不算错误，损坏时调用方回退 JSON"""
+    if not path or not os.path.exists(path):
+        return None, None
+    try:
+        return CompiledArtifact(path), None
+    except (OSError, ValueError, KeyError) as e:
+        return None, f"{path}: {e}"
+
+
+class LazyLibrary(Mapping):
+    """
+    按需加载的书卷库：{书卷名: (card, ...)}
+    - 只列目录，不解析 JSON；某卷第一次被访问时才读取
+    - 每次访问比对文件 mtime/size，变化后自动重新加载
+    - 卡片只读，模块级实例跨 rerun、跨会话共享同一份数据；
+      会话里只保存书卷名 + 索引 / 卡片 id，用 card_by_id / resolve 取回卡片
+    - 有未过期的编译产物时从 mmap 解码，省去逐个打开 JSON 文件
+    """
+
+    def __init__(self, data_dir=DATA_DIR, artifact_path=ARTIFACT_PATH):
+        self.data_dir = data_dir
+        self.artifact_path = artifact_path
+        self._artifact = None
+        self._artifact_signature = None
+        self._paths = {}
+        self._dir_signature = None
+        self._books = {}  # 书卷名 -> (文件签名, cards, {card id: card})
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reloads = 0
+        self.artifact_loads = 0
+        self.artifact_error = None  # 最近一次产物不可用 / 校验失败的原因（侧边栏显示）
+
+    def _current_artifact(self):
+        """产物文件被重新编译（签名变化）时重新打开"""
+        if not self.artifact_path:
+            return None
+        try:
+            signature = _file_signature(self.artifact_path)
+        except OSError:
+            self._artifact = None
+            return None
+        if signature != self._artifact_signature:
+            self._artifact, self.artifact_error = open_artifact(self.artifact_path)
+            self._artifact_signature = signature
+        return self._artifact
+
+    def _book_paths(self):
+        """书卷名 → 路径；目录 mtime 未变时复用上次的列表"""
+        try:
+            signature = os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return {}
+        if signature != self._dir_signature:
+            self._paths = dict(list_book_files(self.data_dir))
+            self._dir_signature = signature
+        return self._paths
+
+    def __getitem__(self, book_name):
+        return self._entry(book_name)[1]
+
+    def _entry(self, book_name):
+        with self._lock:
+            path = self._book_paths().get(book_name)
+            if path is None:
+                raise KeyError(book_name)
+            try:
+                signature = _file_signature(path)
+            except OSError:
+                self._books.pop(book_name, None)
+                raise KeyError(book_name)
+            entry = self._books.get(book_name)
+            if entry is not None and entry[0] == signature:
+                return entry
+            cards = None
+            data = None
+            artifact = self._current_artifact()
+            if artifact is not None:
+                fresh, data = artifact.check_source(book_name, path, signature)
+                if fresh:
+                    try:
+                        cards = freeze_cards(artifact.read_book(book_name))
+                        self.artifact_loads += 1
+                    except ValueError as e:
+                        self.artifact_error = str(e)
+            if cards is None:
+                if data is None:
+                    with open(path, "rb") as file:
+                        data = file.read()
+                cards = freeze_cards(json.loads(data))
+            if entry is None:
+                self.loads += 1
+            else:
+                self.reloads += 1
+            entry = (signature, cards, {card.get("id"): card for card in cards})
+            self._books[book_name] = entry
+            return entry
+
+    def card_by_id(self, book_name, card_id):
+        """按 id 取卡片；书卷或 id 不存在（如 JSON 已修改）返回 None"""
+        try:
+            return self._entry(book_name)[2].get(card_id)
+        except KeyError:
+            return None
+
+    def resolve(self, book_name, card_ids):
+        """id 列表 → 卡片列表（跳过已不存在的 id）"""
+        try:
+            by_id = self._entry(book_name)[2]
+        except KeyError:
+            return []
+        return [by_id[card_id] for card_id in card_ids if card_id in by_id]
+
+    def __contains__(self, book_name):
+        with self._lock:
+            return book_name in self._book_paths()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._book_paths()))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._book_paths())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "books": len(self._book_paths()),
+                "loaded": len(self._books),
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "artifact_loads": self.artifact_loads,
+                "artifact_error": self.artifact_error,
+            }
+
+
+library = LazyLibrary()
@@ -1,14 +1,23 @@
 import streamlit as st
 import json
 import os
-from pathlib import Path
+import re
+import time
+import uuid
 import google.generativeai as genai
-from io import BytesIO
 import base64
-import openai
-import edge_tts
-import asyncio
-import io
+from llm_clients import get_openai_client, PROXY_BASE_URL
+from audio_prep import compact_audio, phrase_clips
+from audio_prefetch import batch_audio
+from concurrent.futures import as_completed, TimeoutError as FuturesTimeoutError
+from bible_library import library
+from blitz_engine import BlitzQueue, BatchSizeController, normalize_id
+from blitz_grading import SEGMENTED_GRADING, grade_batch, grade_segmented, grading_metrics
+from llm_governor import llm_governor, describe_stats as describe_governor_stats
+from structured_output import (describe_metrics, gemini_generation_config, openai_response_format,
+                               parse_metrics, request_with_schema)
+from card_repository import card_repository
+from tts_cache import ESV_VOICE
 
 # ==================== System Instruction ====================
 COACH_INSTRUCTION = """
@@ -64,12 +73,10 @@ st.set_page_config(
 )
 
 # ==================== Session State Management ====================
-if "current_queue" not in st.session_state:
-    st.session_state.current_queue = []
-if "failed_queue" not in st.session_state:
-    st.session_state.failed_queue = []
-if "current_batch" not in st.session_state:
-    st.session_state.current_batch = []
+if "blitz" not in st.session_state:
+    st.session_state.blitz = BlitzQueue()  # pending / failed / current batch (card ids)
+if "batch_controller" not in st.session_state:
+    st.session_state.batch_controller = BatchSizeController()  # adaptive batch size (3–12)
 if "results" not in st.session_state:
     st.session_state.results = []
 if "api_key" not in st.session_state:
@@ -78,52 +85,99 @@ if "selected_book" not in st.session_state:
     st.session_state.selected_book = None
 if "use_proxy" not in st.session_state:
     st.session_state.use_proxy = True  # 默认使用 laozhang 中转服务
-if "total_items" not in st.session_state:
-    st.session_state.total_items = 0  # 总项目数
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # fair queuing in the process-wide LLM governor
 
 # ==================== Helper Functions ====================
-@st.cache_data(show_spinner=False)
-def get_audio_bytes(text, voice='en-US-ChristopherNeural', rate='-10%'):
+def make_grader_call():
     """
-    Cached function to avoid repeated API calls/bandwidth usage.
-    Generates audio and returns raw bytes in memory (no file I/O).
+    call(prompt, audio_bytes, mime_type, schema=None) -> response text, via laozhang.ai proxy or direct Google API
+    Every call queues in the process-wide LLM governor (shared with app.py), fairly per session
     """
-    async def _gen():
+    session_id = st.session_state.session_id
+    if st.session_state.use_proxy:
+        # OpenAI SDK format for laozhang.ai (shared pooled client)
+        client = get_openai_client(st.session_state.api_key, PROXY_BASE_URL)
+        
+        def call(prompt, audio_bytes, mime_type, schema=None):
+            # Latest flash model: gemini-2.5-flash, system instruction as system message
+            def send(schema):
+                # JSON Schema via response_format when the proxy accepts it
+                extra = {"response_format": openai_response_format(schema, "blitz_grading")} if schema else {}
+                return client.chat.completions.create(
+                    model="gemini-2.5-flash",
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": COACH_INSTRUCTION
+                        },
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {
+                                    "type": "input_audio",
+                                    "input_audio": {
+                                        "data": base64.b64encode(audio_bytes).decode('utf-8'),
+                                        "format": mime_type.split('/')[-1]
+                                    }
+                                }
+                            ]
+                        }
+                    ],
+                    **extra
+                )
+            response = llm_governor.call("proxy", session_id, request_with_schema,
+                                         "proxy:gemini-2.5-flash", schema, send)
+            return response.choices[0].message.content
+        return call
+    
+    # Direct Google API: try gemini-2.0-flash-exp first, fallback to 1.5-pro, then 2.5-flash
+    try:
+        model = genai.GenerativeModel('gemini-2.0-flash-exp', system_instruction=COACH_INSTRUCTION)
+    except:
         try:
-            # Clean text: keep only ASCII printable characters
-            import re
-            if not text:
-                raise ValueError("Text is empty")
-            
-            # Keep only ASCII characters (letters, numbers, spaces, punctuation)
-            clean_text = re.sub(r'[^\x20-\x7E]', '', str(text))
-            
-            if not clean_text.strip():
-                raise ValueError("Text contains no valid characters after cleaning")
-            
-            communicate = edge_tts.Communicate(clean_text, voice, rate=rate)
-            # Write to memory buffer instead of file
-            mp3_fp = io.BytesIO()
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    mp3_fp.write(chunk["data"])
-            mp3_fp.seek(0)  # Reset pointer to start
-            return mp3_fp.getvalue()
-        except Exception as e:
-            # Re-raise with clean error message
-            try:
-                import re
-                error_str = str(e)
-                clean_error = re.sub(r'[^\x20-\x7E]', '', error_str)
-                if not clean_error:
-                    clean_error = "Unknown error"
-                error_msg = clean_error
-            except:
-                error_msg = "Unknown error"
-            raise Exception(f"Audio generation failed: {error_msg}")
+            model = genai.GenerativeModel('gemini-1.5-pro', system_instruction=COACH_INSTRUCTION)
+        except:
+            # Fallback without system instruction
+            model = genai.GenerativeModel('gemini-2.5-flash')
     
-    # Run async function in sync wrapper
-    return asyncio.run(_gen())
+    def call(prompt, audio_bytes, mime_type, schema=None):
+        def send(schema):
+            return model.generate_content([prompt, {"mime_type": mime_type, "data": audio_bytes}],
+                                          generation_config=gemini_generation_config(schema) if schema else None)
+        return llm_governor.call("gemini", session_id, request_with_schema,
+                                 f"gemini:{model.model_name}", schema, send).text
+    return call
+
+def render_reference_audio(audio_slots, reference_audio, timeout=60):
+    """Fill [(placeholder, text)] with ESV clips in completion order (clips were started when the batch was shown)"""
+    slots_by_future = {}
+    for slot, text in audio_slots:
+        future = reference_audio.get(text)
+        if future is None:
+            slot.info("暂无标准音频")
+            continue
+        slots_by_future.setdefault(future, []).append(slot)
+        if not future.done():
+            slot.caption("🎧 音频生成中...")
+    try:
+        for future in as_completed(slots_by_future, timeout=timeout):
+            for slot in slots_by_future[future]:
+                try:
+                    audio_bytes = future.result()
+                    with slot.container():
+                        st.audio(audio_bytes, format='audio/mp3')
+                        st.caption("标准 ESV 发音")
+                except Exception as e:
+                    # Keep only printable ASCII in the error text
+                    error_msg = re.sub(r'[^\x20-\x7E]', '', str(e)) or "音频生成失败"
+                    slot.warning(f"音频生成失败: {error_msg}")
+    except FuturesTimeoutError:
+        for future, slots in slots_by_future.items():
+            if not future.done():
+                for slot in slots:
+                    slot.warning("音频生成超时，请稍后重试")
 
 def get_audio_mime_type(audio_data):
     """Get MIME type for audio data (handles both audio_input and file_uploader)"""
@@ -143,73 +197,86 @@ def get_audio_mime_type(audio_data):
     else:
         return "audio/webm"
 
-def load_json_data(file_path):
-    """Load JSON data from file"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"加载数据文件失败: {str(e)}")
-        return []
-
 def get_available_books():
-    """Get list of available JSON files in assets/bible_data/"""
-    data_dir = Path("assets/bible_data")
-    if not data_dir.exists():
-        return []
-    return [f.stem for f in data_dir.glob("*.json")]
+    """Get list of available books in assets/bible_data/ (shared lazy library, no JSON parsing)"""
+    return list(library)
 
 def reset_game():
     """Reset all game state"""
-    st.session_state.current_queue = []
-    st.session_state.failed_queue = []
-    st.session_state.current_batch = []
+    st.session_state.blitz = BlitzQueue()
     st.session_state.results = []
     st.session_state.selected_book = None
-    st.session_state.total_items = 0
-
-def load_book_data(book_name):
-    """Load data for selected book"""
-    file_path = Path(f"assets/bible_data/{book_name}.json")
-    if file_path.exists():
-        data = load_json_data(file_path)
-        # Reset queues and load new data
-        st.session_state.current_queue = data.copy()
-        st.session_state.failed_queue = []
-        st.session_state.current_batch = []
+
+def scoped_card_ids(book_name, chapters=None, term=None):
+    """Card ids limited to a chapter range and/or key_term / trap term (SQLite index), in book order"""
+    card_repository.sync()
+    positions = None
+    if chapters:
+        positions = {position for _, position, _, _ in card_repository.in_range(book_name, chapters[0], chapters[1])}
+    if term:
+        matches = {position for _, position, _, _ in card_repository.mentioning(term, book_name=book_name)}
+        positions = matches if positions is None else positions & matches
+    data = library[book_name]
+    if positions is None:
+        return [item.id for item in data]
+    return [data[position].id for position in sorted(positions) if position < len(data)]
+
+def load_book_data(book_name, chapters=None, term=None):
+    """Load data for selected book (optionally limited to chapters=(start, end) and/or a term)"""
+    if book_name in library:
+        try:
+            card_ids = scoped_card_ids(book_name, chapters, term)
+        except Exception as e:
+            st.error(f"加载数据文件失败: {str(e)}")
+            card_ids = []
+        # Reset queues and load new data (queues hold card ids; cards stay in the shared store)
+        st.session_state.blitz = BlitzQueue(book_name, card_ids)
         st.session_state.results = []
-        st.session_state.total_items = len(data)  # 保存总数
         return True
     return False
 
-def get_next_batch(batch_size=5):
+EMPTY_TRANSCRIPTIONS = ['NO_AUDIO', 'NOT SAID', 'MISSING', 'UNCLEAR', '未录音', '']
+
+def silent_item_result(item_id, feedback='未录音或未说出'):
+    """单个短语的"未录音"判定结果"""
+    return {"id": item_id, "status": "fail", "user_said": "未录音", "feedback": feedback}
+
+def enforce_silent_items(ai_results):
+    """逐项检查：转录为空 / NO_AUDIO 的短语一律判 fail（无论 AI 给了什么状态）"""
+    for result in ai_results:
+        user_said = str(result.get('user_said') or '').strip()
+        if user_said.upper() in EMPTY_TRANSCRIPTIONS:
+            result.update(silent_item_result(result.get('id'), result.get('feedback') or '未录音或未说出'))
+    return ai_results
+
+def get_next_batch(batch_size=None):
     """
-    Batching Logic:
-    - Take the first 5 items from current_queue
-    - If current_queue is empty, refill from failed_queue
-    - Loop until mastery (failed_queue also empty)
+    Batching Logic (BlitzQueue, O(batch) per transition):
+    - Take the next N ids from the pending deque (N from the adaptive batch-size controller)
+    - If pending is empty, refill from the failed queue
+    - Loop until mastery (failed queue also empty)
     """
-    # If current_queue is empty, refill from failed_queue
-    if len(st.session_state.current_queue) == 0:
-        if len(st.session_state.failed_queue) > 0:
-            st.session_state.current_queue = st.session_state.failed_queue.copy()
-            st.session_state.failed_queue = []
-            st.info("🔄 主队列已空，从失败队列重新加载...")
-        else:
-            st.success("🎉 恭喜！您已掌握所有短语！")
-            return []
-    
-    # Get next batch of 5 items
-    batch = st.session_state.current_queue[:batch_size]
-    st.session_state.current_batch = batch
-    return batch
+    queue = st.session_state.blitz
+    refills = queue.refills
+    if not queue.next_batch(batch_size or st.session_state.batch_controller.size):
+        st.success("🎉 恭喜！您已掌握所有短语！")
+        return []
+    st.session_state.batch_shown_at = time.perf_counter()
+    if queue.refills != refills:
+        st.info("🔄 主队列已空，从失败队列重新加载...")
+    return get_current_batch()
+
+def get_current_batch():
+    """Resolve current batch ids to the shared read-only cards"""
+    return library.resolve(st.session_state.selected_book, st.session_state.blitz.batch)
 
 def process_results(ai_results):
     """
     Process AI grading results and update queues:
-    - pass: Remove from current_queue (perfect match)
-    - warning: Remove from current_queue (passable but note the nuance)
-    - fail: Move to failed_queue (needs retry)
+    - pass: Remove from the queue (perfect match)
+    - warning: Remove from the queue (passable but note the nuance)
+    - fail: Move to the failed queue (needs retry)
+    - batch ids without a result go back to the front of the queue
     """
     if not ai_results:
         return
@@ -219,25 +286,7 @@ def process_results(ai_results):
         status = result.get('status', '').lower()
         result['status'] = status
     
-    # Remove processed items from current_queue
-    processed_ids = [r.get('id') for r in ai_results]
-    st.session_state.current_queue = [
-        item for item in st.session_state.current_queue 
-        if item['id'] not in processed_ids
-    ]
-    
-    # Move failed items to failed_queue (only 'fail' status, not 'warning')
-    for result in ai_results:
-        status = result.get('status', '').lower()
-        if status == 'fail':
-            # Find the original item
-            original_item = next(
-                (item for item in st.session_state.current_batch 
-                 if item['id'] == result.get('id')), 
-                None
-            )
-            if original_item:
-                st.session_state.failed_queue.append(original_item)
+    st.session_state.blitz.settle(ai_results)
 
 # ==================== Sidebar ====================
 with st.sidebar:
@@ -286,6 +335,25 @@ with st.sidebar:
             if load_book_data(selected_book):
                 st.session_state.selected_book = selected_book
                 st.success(f"✅ 已加载 {selected_book}")
+        
+        # Optional training scope: chapter range and/or key_term / trap term
+        if st.session_state.selected_book:
+            with st.expander("🎯 训练范围（可选）"):
+                try:
+                    chapters = card_repository.chapters(st.session_state.selected_book)
+                except Exception:
+                    chapters = []
+                chapter_range = None
+                if len(chapters) > 1:
+                    chapter_range = st.select_slider(
+                        "章节范围",
+                        options=chapters,
+                        value=(chapters[0], chapters[-1])
+                    )
+                scope_term = st.text_input("关键词（key_term / trap）", placeholder="如 Covenant")
+                if st.button("应用范围", use_container_width=True):
+                    if load_book_data(st.session_state.selected_book, chapter_range, scope_term.strip() or None):
+                        st.success(f"✅ 已筛选 {st.session_state.blitz.total} 个短语")
     else:
         st.warning("⚠️ 未找到数据文件，请确保 assets/bible_data/ 目录存在")
     
@@ -301,15 +369,12 @@ with st.sidebar:
     st.subheader("📊 统计信息")
     
     # Calculate statistics
-    total = st.session_state.total_items
-    remaining = len(st.session_state.current_queue)
-    failed = len(st.session_state.failed_queue)
-    current_batch_size = len(st.session_state.current_batch)
-    
-    # Calculate completed (total - remaining - failed - current_batch)
-    # But we need to account for items that passed and were removed
-    # Completed = total - (remaining + failed + current_batch)
-    completed = max(0, total - remaining - failed - current_batch_size) if total > 0 else 0
+    queue_stats = st.session_state.blitz.stats()
+    total = queue_stats['total']
+    remaining = queue_stats['remaining']
+    failed = queue_stats['failed']
+    current_batch_size = queue_stats['batch']
+    completed = queue_stats['completed']
     
     if total > 0:
         st.metric("📚 总数", total)
@@ -324,6 +389,25 @@ with st.sidebar:
             st.progress(progress, text=f"进度: {completed}/{total} ({progress*100:.1f}%)")
     else:
         st.info("请先选择经卷开始训练")
+    pipeline_slot = st.empty()  # batch-gap timing, filled in once the batch is shown
+    controller_stats = st.session_state.batch_controller.stats()
+    last_decision = controller_stats['last_decision']
+    st.caption(f"🎚️ 批次大小: {controller_stats['size']}（自适应 3–12）"
+               + (f" · 上次 {last_decision[0]}→{last_decision[1]}：{last_decision[2]}" if last_decision else ""))
+    grading = grading_metrics.snapshot()
+    if grading['segmented_batches'] or grading['avg_batch_seconds'] is not None:
+        st.caption(
+            f"✂️ 分段评分 {grading['segmented_batches']} 批 · 回退整批 {grading['fallback_batches']} · "
+            f"单项失败率 {grading['item_failure_rate']:.0%} · 整批失败率 {grading['batch_failure_rate']:.0%}"
+            + (f" · 分段平均 {grading['avg_segmented_seconds']:.1f}s" if grading['avg_segmented_seconds'] is not None else "")
+            + (f" · 整批平均 {grading['avg_batch_seconds']:.1f}s" if grading['avg_batch_seconds'] is not None else "")
+        )
+    parsing = parse_metrics.snapshot()
+    if parsing['responses']:
+        st.caption(describe_metrics(parsing))
+    governor_stats = llm_governor.stats()
+    if governor_stats:
+        st.caption(describe_governor_stats(governor_stats))
 
 # ==================== Main Interface ====================
 st.title("⚡ Theology Translation Blitz")
@@ -340,14 +424,30 @@ if not st.session_state.selected_book:
     st.info("📖 请在侧边栏选择经卷以开始训练")
     st.stop()
 
-# Get current batch (5 items)
-if not st.session_state.current_batch:
-    batch = get_next_batch(5)
+# Get current batch (size chosen by the adaptive controller)
+if not st.session_state.blitz.batch:
+    batch = get_next_batch()
 else:
-    batch = st.session_state.current_batch
+    batch = get_current_batch()
 
 if not batch:
     st.stop()
+batch_by_id = {item.id: item for item in batch}
+# Start all ESV reference clips now (concurrently, shared loop) so they are ready by the time grading returns
+reference_audio = batch_audio.render([item.phrase_en for item in batch], *ESV_VOICE)
+gap_started = st.session_state.pop('batch_gap_started', None)
+if gap_started is not None:
+    st.session_state.blitz.record_gap(time.perf_counter() - gap_started,
+                                      sum(1 for future in reference_audio.values() if future.done() and not future.exception()),
+                                      len(reference_audio))
+pipeline_stats = st.session_state.blitz.stats()
+if pipeline_stats['last_gap_seconds'] is not None:
+    pipeline_slot.caption(
+        f"⏱️ 批次间隔: 上次 {pipeline_stats['last_gap_seconds'] * 1000:.0f} ms · "
+        f"平均 {pipeline_stats['avg_gap_seconds'] * 1000:.0f} ms · "
+        f"音频就绪 {pipeline_stats['audio_ready']}/{pipeline_stats['audio_total']} · "
+        f"预取命中 {pipeline_stats['prepared_hits']} · 对账 {pipeline_stats['reconciled']}"
+    )
 
 # Display the batch
 st.subheader(f"📝 当前批次 ({len(batch)} 个短语)")
@@ -355,7 +455,7 @@ st.markdown("**请按顺序用英文翻译以下中文短语：**")
 
 # Display Chinese phrases in large, clean font
 for i, item in enumerate(batch, 1):
-    st.markdown(f"### {i}. {item['cn']}")
+    st.markdown(f"### {i}. {item.phrase_cn}")
 
 st.markdown("---")
 
@@ -368,7 +468,7 @@ tab1, tab2 = st.tabs(["🎙️ 录音", "📁 上传文件"])
 audio_data = None
 
 with tab1:
-    audio_data = st.audio_input("点击开始录音（请依次翻译所有5个短语）", label_visibility="visible")
+    audio_data = st.audio_input("点击开始录音（请依次翻译所有短语）", label_visibility="visible")
 
 with tab2:
     uploaded_file = st.file_uploader(
@@ -396,155 +496,83 @@ with tab2:
 if audio_data is not None:
     if st.button("🚀 提交评分", type="primary", use_container_width=True):
         with st.spinner("🤖 AI 正在评分..."):
+            # Pipeline: predict batch N+1 and start its reference audio while batch N is being graded
+            grading_started = time.perf_counter()
+            grading_calls = 0
+            predicted_size = st.session_state.batch_controller.size
+            next_cards = library.resolve(st.session_state.selected_book,
+                                         st.session_state.blitz.prepare_next(predicted_size))
+            batch_audio.render([item.phrase_en for item in next_cards], *ESV_VOICE)
             try:
-                # Read audio bytes
-                audio_bytes = audio_data.read()
-                
-                # Prepare expected targets list
-                expected_targets = [f"ID {item['id']}: {item['en']}" for item in batch]
-                targets_text = "\n".join(expected_targets)
+                # Read audio bytes, then compact (mono / 16 kHz / trimmed) before upload
+                prep = compact_audio(audio_data.read(), get_audio_mime_type(audio_data))
+                audio_bytes = prep.data
+                audio_mime_type = prep.mime_type
+                st.caption(f"📦 {prep.summary()}")
                 
-                # Simplified prompt - system instruction already contains the rules
-                # Create a numbered list for clarity
-                items_list = "\n".join([f"{i+1}. ID {item['id']}: Chinese '{item['cn']}' → Expected ESV: '{item['en']}'" for i, item in enumerate(batch)])
-                
-                # Simple user prompt - system instruction handles the evaluation logic
-                user_prompt = f"""Here is the audio recording. The user will translate 5 Chinese phrases to English in sequential order.
-
-The 5 items in order:
-{items_list}
-
-Listen to the audio and for each item:
-1. Transcribe EXACTLY what you hear (or "NO_AUDIO" if you hear nothing)
-2. Evaluate using the theological coach rules from system instruction
-3. Return JSON with status (pass/warning/fail), user_said, and feedback
-
-Output JSON format:
-[
-  {{"id": 1, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}},
-  {{"id": 2, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}},
-  {{"id": 3, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}},
-  {{"id": 4, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}},
-  {{"id": 5, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}}
-]
-
-⚠️ If audio is SILENT/EMPTY: ALL items must have user_said: "NO_AUDIO" and status: "fail"
-⚠️ user_said MUST be what you actually HEAR, not the expected answer
-
-Output ONLY valid JSON array."""
-
                 # Initialize response_text
                 response_text = None
+                ai_results = None
                 
-                # Use laozhang.ai proxy or direct Google API
-                if st.session_state.use_proxy:
-                    # Use OpenAI SDK format for laozhang.ai
-                    client = openai.OpenAI(
-                        api_key=st.session_state.api_key,
-                        base_url="https://api.laozhang.ai/v1"
-                    )
-                    
-                    # Convert audio to base64
-                    audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-                    audio_mime_type = get_audio_mime_type(audio_data)
-                    
-                    # Use latest flash model: gemini-2.5-flash
-                    model_name = "gemini-2.5-flash"
-                    
-                    # Call via OpenAI-compatible API with system instruction
-                    response = client.chat.completions.create(
-                        model=model_name,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": COACH_INSTRUCTION
-                            },
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": user_prompt},
-                                    {
-                                        "type": "input_audio",
-                                        "input_audio": {
-                                            "data": audio_base64,
-                                            "format": audio_mime_type.split('/')[-1]
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    )
-                    
-                    # Extract response text
-                    response_text = response.choices[0].message.content
-                    
+                # Local VAD found no speech: fail every item without calling the API
+                if prep.has_speech is False:
+                    ai_results = [silent_item_result(item.id, '未检测到语音（本地静音检测）') for item in batch]
+                    response_text = json.dumps(ai_results, ensure_ascii=False)
                 else:
-                    # Use direct Google API with latest flash model and system instruction
-                    # Try gemini-2.0-flash-exp first, fallback to 1.5-pro, then 2.5-flash
-                    model_name = None
-                    try:
-                        model = genai.GenerativeModel('gemini-2.0-flash-exp', system_instruction=COACH_INSTRUCTION)
-                        model_name = 'gemini-2.0-flash-exp'
-                    except:
-                        try:
-                            model = genai.GenerativeModel('gemini-1.5-pro', system_instruction=COACH_INSTRUCTION)
-                            model_name = 'gemini-1.5-pro'
-                        except:
-                            # Fallback without system instruction
-                            model = genai.GenerativeModel('gemini-2.5-flash')
-                            model_name = 'gemini-2.5-flash'
-                    
-                    # Prepare audio file
-                    audio_mime_type = get_audio_mime_type(audio_data)
-                    audio_file = {
-                        "mime_type": audio_mime_type,
-                        "data": audio_bytes
-                    }
-                    
-                    # Call Gemini API with simplified prompt (system instruction already set)
-                    response = model.generate_content(
-                        [user_prompt, audio_file]
-                    )
-                    response_text = response.text
+                    grader_call = make_grader_call()
+                    # Split the recording at pauses and map segments to phrases (None = no voice for that phrase)
+                    clips, segment_count = phrase_clips(audio_bytes, len(batch)) if SEGMENTED_GRADING else (None, 0)
+                    if clips is not None:
+                        # Per-item local VAD: phrases with no voiced segment fail without an API call
+                        spoken = [(position, item, clip) for position, (item, clip) in enumerate(zip(batch, clips), 1)
+                                  if clip is not None]
+                        graded = {}
+                        if spoken:
+                            positions, spoken_items, spoken_clips = zip(*spoken)
+                            graded = {result['id']: result for result in
+                                      grade_segmented(grader_call, spoken_items, spoken_clips, positions=positions)}
+                        ai_results = [graded[item.id] if item.id in graded else
+                                      silent_item_result(item.id, '未检测到语音（本地静音检测）')
+                                      for item, clip in zip(batch, clips) if clip is None or item.id in graded]
+                        grading_calls = len(spoken)
+                        lost = len(spoken) - len(graded)
+                        st.caption(f"✂️ 本地切分 {segment_count} 段，逐条并行评分"
+                                   + (f"（{len(batch) - len(spoken)} 条无人声，本地判为未录音）"
+                                      if len(spoken) < len(batch) else "")
+                                   + (f"（{lost} 条评分失败，将在下一批重考）" if lost else ""))
+                        response_text = json.dumps(ai_results, ensure_ascii=False)
+                    else:
+                        # Segments can't be mapped to the batch: grade the whole recording in one request
+                        if SEGMENTED_GRADING:
+                            grading_metrics.record_fallback()
+                            st.caption(f"✂️ 切分出 {segment_count} 段（应为 {len(batch)} 段），整批评分")
+                        # Truncated / polluted JSON keeps the items it can parse; only missing ids are re-requested
+                        ai_results, grading_calls, response_text = grade_batch(
+                            grader_call, batch, audio_bytes, audio_mime_type)
+                        if grading_calls > 1:
+                            st.caption(f"🧩 首次响应缺项，已只对缺失的短语补评（共 {grading_calls} 次请求）"
+                                       + (f"；仍有 {len(batch) - len(ai_results)} 条将在下一批重考"
+                                          if len(ai_results) < len(batch) else ""))
                 
                 # Parse JSON response
                 try:
-                    # Extract JSON from response (already extracted if using proxy)
-                    if not isinstance(response_text, str):
-                        response_text = str(response_text)
-                    response_text = response_text.strip()
-                    # Remove markdown code blocks if present
-                    if response_text.startswith("```"):
-                        response_text = response_text.split("```")[1]
-                        if response_text.startswith("json"):
-                            response_text = response_text[4:]
-                    response_text = response_text.strip()
+                    if not ai_results and grading_calls:
+                        raise ValueError("AI 响应中没有可解析的评分结果")
                     
-                    # Parse JSON
-                    ai_results = json.loads(response_text)
+                    # Empty / NO_AUDIO transcriptions always fail, per item
+                    enforce_silent_items(ai_results)
                     
-                    # Validate and fix results - detect if AI is copying expected answers
+                    # Validate results - detect if AI is copying expected answers
                     for result in ai_results:
-                        item = next((i for i in batch if i['id'] == result.get('id')), None)
+                        item = batch_by_id.get(normalize_id(result.get('id'), batch_by_id))
                         if item:
-                            user_said = result.get('user_said', '').strip()
-                            expected = item['en'].strip()
-                            
-                            # If user_said exactly matches expected AND status is PASS, 
-                            # this might be AI copying (unless user actually said it correctly)
-                            # We can't verify this, but we'll flag it for display
+                            user_said = str(result.get('user_said') or '').strip()
+                            expected = item.phrase_en.strip()
                             
                             # Normalize status to lowercase
                             status = result.get('status', '').lower()
                             result['status'] = status
                             
-                            # If user_said is "NO_AUDIO" or similar, ensure status is fail
-                            if user_said.upper() in ['NO_AUDIO', 'NOT SAID', 'MISSING', 'UNclear', '']:
-                                result['status'] = 'fail'
-                                result['user_said'] = '未录音'
-                                if not result.get('feedback'):
-                                    result['feedback'] = '未录音或未说出'
-                            
                             # Flag suspicious cases where user_said matches expected exactly
                             # (could be correct, but could also be AI copying)
                             if user_said.lower() == expected.lower() and status in ['pass', 'warning']:
@@ -555,6 +583,23 @@ Output ONLY valid JSON array."""
                     # Process results and update queues
                     process_results(ai_results)
                     
+                    # Feed the adaptive batch-size controller (skipped when local VAD answered without an API call)
+                    if grading_calls:
+                        statuses = [r.get('status') for r in ai_results if normalize_id(r.get('id'), batch_by_id) is not None]
+                        st.session_state.batch_controller.observe(
+                            len(batch),
+                            time.perf_counter() - st.session_state.get('batch_shown_at', grading_started),
+                            time.perf_counter() - grading_started,
+                            passed=sum(1 for status in statuses if status in ('pass', 'warning')),
+                            failed=sum(1 for status in statuses if status == 'fail'),
+                            calls=grading_calls,
+                        )
+                        # observe() may have resized batch N+1; re-predict so its reference audio matches
+                        if st.session_state.batch_controller.size != predicted_size:
+                            next_cards = library.resolve(st.session_state.selected_book,
+                                                         st.session_state.blitz.prepare_next(st.session_state.batch_controller.size))
+                            batch_audio.render([item.phrase_en for item in next_cards], *ESV_VOICE)
+                    
                     # Display results
                     st.markdown("---")
                     st.subheader("📊 评分结果")
@@ -563,7 +608,7 @@ Output ONLY valid JSON array."""
                     results_data = []
                     for result in ai_results:
                         # Find corresponding item
-                        item = next((i for i in batch if i['id'] == result.get('id')), None)
+                        item = batch_by_id.get(normalize_id(result.get('id'), batch_by_id))
                         if item:
                             # Normalize status for display
                             status_display = result.get('status', 'N/A')
@@ -571,8 +616,8 @@ Output ONLY valid JSON array."""
                                 status_display = status_display.upper()
                             results_data.append({
                                 "ID": result.get('id'),
-                                "中文": item['cn'],
-                                "期望": item['en'],
+                                "中文": item.phrase_cn,
+                                "期望": item.phrase_en,
                                 "您的翻译": result.get('user_said', 'N/A'),
                                 "状态": status_display,
                                 "反馈": result.get('feedback', 'N/A')
@@ -582,9 +627,10 @@ Output ONLY valid JSON array."""
                     import pandas as pd
                     
                     # Display each result with audio player
+                    audio_slots = []
                     for idx, result in enumerate(ai_results):
                         # Find corresponding item
-                        item = next((i for i in batch if i['id'] == result.get('id')), None)
+                        item = batch_by_id.get(normalize_id(result.get('id'), batch_by_id))
                         if not item:
                             continue
                         
@@ -596,26 +642,22 @@ Output ONLY valid JSON array."""
                                 # Status badge (handle pass/warning/fail)
                                 status = result.get('status', 'N/A').lower()
                                 if status == 'pass':
-                                    st.success(f"✅ ID {result.get('id')}: {item['cn']} → {item['en']}")
+                                    st.success(f"✅ ID {result.get('id')}: {item.phrase_cn} → {item.phrase_en}")
                                 elif status == 'warning':
-                                    st.warning(f"⚠️ ID {result.get('id')}: {item['cn']} → {item['en']}")
+                                    st.warning(f"⚠️ ID {result.get('id')}: {item.phrase_cn} → {item.phrase_en}")
                                 else:  # fail
-                                    st.error(f"❌ ID {result.get('id')}: {item['cn']} → {item['en']}")
+                                    st.error(f"❌ ID {result.get('id')}: {item.phrase_cn} → {item.phrase_en}")
                                 
                                 # Display user's actual translation with validation
                                 user_said = result.get('user_said', 'N/A')
-                                expected = item['en']
+                                expected = item.phrase_en
                                 
                                 st.write(f"**您的翻译**: {user_said}")
                                 st.write(f"**期望答案**: {expected}")
                                 
-                                # Check for NO_AUDIO or empty audio cases
-                                if user_said.upper() in ['NO_AUDIO', '未录音', 'NOT SAID', 'MISSING', ''] or not user_said or user_said.strip() == '':
-                                    st.error("❌ 未检测到录音内容 - 如果这是空录音，AI应该返回'NO_AUDIO'")
-                                    # Force fail status if audio was empty
-                                    status_lower = result.get('status', '').lower()
-                                    if status_lower in ['pass', 'warning']:
-                                        st.error("⚠️ 错误：空录音被标记为pass/warning，这是AI的bug")
+                                # Empty items were already forced to fail by enforce_silent_items
+                                if user_said == '未录音':
+                                    st.error("❌ 未检测到录音内容")
                                 
                                 # Warn if suspicious (exact match might indicate AI copying)
                                 elif result.get('_suspicious') or user_said.lower().strip() == expected.lower().strip():
@@ -624,29 +666,13 @@ Output ONLY valid JSON array."""
                                 st.write(f"**反馈**: {result.get('feedback', 'N/A')}")
                             
                             with col2:
-                                # Generate and display audio for ESV target (using memory stream)
-                                try:
-                                    audio_bytes = get_audio_bytes(item['en'])
-                                    if audio_bytes:
-                                        st.audio(audio_bytes, format='audio/mp3')
-                                        st.caption("标准 ESV 发音")
-                                    else:
-                                        st.info("音频生成中...")
-                                except Exception as e:
-                                    # Safely encode error message - remove all non-ASCII
-                                    try:
-                                        import re
-                                        error_str = str(e)
-                                        # Remove all non-ASCII characters including emojis
-                                        error_msg = re.sub(r'[^\x20-\x7E]', '', error_str)
-                                        if not error_msg:
-                                            error_msg = "音频生成失败"
-                                    except:
-                                        error_msg = "音频生成失败"
-                                    st.warning(f"音频生成失败: {error_msg}")
+                                # ESV reference audio is filled in below as each clip completes
+                                audio_slots.append((st.empty(), item.phrase_en))
                             
                             st.markdown("---")
                     
+                    render_reference_audio(audio_slots, reference_audio)
+                    
                     # Also show summary table (only if we have data)
                     if results_data and len(results_data) > 0:
                         df = pd.DataFrame(results_data)
@@ -686,7 +712,7 @@ Output ONLY valid JSON array."""
                     with col3:
                         st.metric("❌ 失败", fail_count)
                     
-                except json.JSONDecodeError as e:
+                except ValueError as e:
                     # Safely encode error message
                     error_msg = str(e).encode('utf-8', errors='replace').decode('utf-8')
                     st.error(f"JSON 解析错误: {error_msg}")
@@ -724,7 +750,8 @@ Output ONLY valid JSON array."""
 if st.session_state.results:
     st.markdown("---")
     if st.button("➡️ 下一批次", type="primary", use_container_width=True):
-        st.session_state.current_batch = []
+        st.session_state.batch_gap_started = time.perf_counter()
+        st.session_state.blitz.clear_batch()
         st.session_state.results = []
         st.rerun()
 
@@ -0,0 +1,240 @@
+from itertools import chain, islice
+from collections import deque
+
+# ==================== 闪电战队列引擎 ====================
+# blitz_app.py 原来的队列是三个列表：取批次用切片，判分后用列表推导式重建整个主队列
+# （processed_ids 也是列表），每条结果再线性查找批次 —— 每次换批 O(队列 × 批次)。
+# 这里改为：
+# - pending / failed 为卡片 id 的 deque，failed_ids 集合去重
+# - 当前批次为 id 列表 + id 集合，判分只处理批次内的 id
+# - id → 卡片仍由共享只读库解析（LazyLibrary.resolve），会话里只存 id
+# 每次换批 O(批次)，与队列长度无关。
+#
+# 流水线：批次 N 判分（AI 调用）期间 prepare_next() 预测批次 N+1，界面据此提前生成参考音频；
+# 判分结果出来后 next_batch() 按实际队列取批，并与预测对账（失败回队列 / 未返回结果的 id 会改变下一批）。
+
+
+def normalize_id(item_id, known):
+    """AI 返回的 id 可能是字符串（"3"）；在 known 中找不到时尝试转成 int"""
+    if item_id in known:
+        return item_id
+    if isinstance(item_id, str) and item_id.strip().isdigit():
+        number = int(item_id.strip())
+        if number in known:
+            return number
+    return None
+
+
+class BlitzQueue:
+    """
+    单个会话的训练队列：
+    - pass / warning：掌握，移出队列
+    - fail：进入重试队列，主队列空后按失败顺序重新出题
+    - 批次中没有结果的 id：放回主队列队首，下一批优先出
+    """
+
+    def __init__(self, book_name=None, card_ids=()):
+        self.book_name = book_name
+        self.pending = deque(card_ids)
+        self.failed = deque()
+        self.failed_ids = set()
+        self.batch = []
+        self.batch_ids = set()
+        self.graded = False
+        self.total = len(self.pending)
+        self.mastered = 0
+        self.refills = 0
+        self.prepared = None  # 判分期间预测的下一批 id
+        self.prepared_hits = 0
+        self.reconciled = 0
+        self.gaps = []  # 最近若干次 (换批耗时秒, 参考音频已就绪数, 批次大小)
+
+    def next_batch(self, batch_size=5):
+        """取下一批 id；已判分的批次先清空，未判分的批次原样返回（rerun 不会换题）"""
+        if self.batch and not self.graded:
+            return self.batch
+        self.batch = []
+        self.batch_ids = set()
+        self.graded = False
+        if not self.pending and self.failed:
+            self.pending, self.failed = self.failed, deque()
+            self.failed_ids = set()
+            self.refills += 1
+        pending = self.pending
+        for _ in range(min(batch_size, len(pending))):
+            self.batch.append(pending.popleft())
+        self.batch_ids = set(self.batch)
+        if self.prepared is not None:
+            hits = len(self.batch_ids.intersection(self.prepared))
+            self.prepared_hits += hits
+            self.reconciled += len(self.batch) - hits
+            self.prepared = None
+        return self.batch
+
+    def peek_next(self, batch_size=5):
+        """
+        判分前预测下一批：主队列还有 id 时就是主队列的下 batch_size 个；
+        主队列已空时按"当前批次全部失败"估计（失败队列 + 当前批次），这些 id 的音频本来就已生成
+        """
+        if self.pending:
+            return list(islice(self.pending, batch_size))
+        retry = (item_id for item_id in self.batch if item_id not in self.failed_ids)
+        return list(islice(chain(self.failed, retry), batch_size))
+
+    def prepare_next(self, batch_size=5):
+        """记录预测的下一批（next_batch 时对账），返回 id 列表"""
+        self.prepared = self.peek_next(batch_size)
+        return self.prepared
+
+    def record_gap(self, seconds, ready, size):
+        """记录一次"下一批次"到新批次显示的耗时，以及此时参考音频已就绪的条数"""
+        self.gaps = (self.gaps + [(seconds, ready, size)])[-50:]
+
+    def clear_batch(self):
+        """放弃当前批次（如"下一批次"按钮）；未判分的 id 放回主队列队首"""
+        if not self.graded:
+            self.pending.extendleft(reversed(self.batch))
+        self.batch = []
+        self.batch_ids = set()
+        self.graded = False
+
+    def settle(self, results):
+        """
+        按判分结果更新队列；返回 {id: status}（仅批次内的 id）
+        results: [{"id": ..., "status": "pass" | "warning" | "fail"}]
+        """
+        if self.graded:
+            return {}
+        outcomes = {}
+        for result in results:
+            item_id = normalize_id(result.get('id'), self.batch_ids)
+            if item_id is None or item_id in outcomes:
+                continue
+            outcomes[item_id] = str(result.get('status') or '').lower()
+        unresolved = []
+        for item_id in self.batch:
+            status = outcomes.get(item_id)
+            if status is None:
+                unresolved.append(item_id)
+            elif status == 'fail':
+                if item_id not in self.failed_ids:
+                    self.failed.append(item_id)
+                    self.failed_ids.add(item_id)
+            else:
+                self.mastered += 1
+        self.pending.extendleft(reversed(unresolved))
+        self.graded = True
+        return outcomes
+
+    def stats(self):
+        in_batch = 0 if self.graded else len(self.batch)
+        return {
+            "total": self.total,
+            "completed": self.mastered,
+            "remaining": len(self.pending),
+            "failed": len(self.failed),
+            "batch": in_batch,
+            "refills": self.refills,
+            "prepared_hits": self.prepared_hits,
+            "reconciled": self.reconciled,
+            "last_gap_seconds": self.gaps[-1][0] if self.gaps else None,
+            "avg_gap_seconds": (sum(g[0] for g in self.gaps) / len(self.gaps)) if self.gaps else None,
+            "audio_ready": sum(g[1] for g in self.gaps),
+            "audio_total": sum(g[2] for g in self.gaps),
+        }
+
+
+# ==================== 自适应批次大小 ====================
+# 批次大小原先固定为 5。合适的大小取决于代理延迟和学生正确率：
+# - 批次越大，每次 API 调用评分的短语越多，固定开销被摊薄
+# - 但批次太大学生记不住、失败率上升，重考反而拖慢进度
+# 目标：最大化每分钟掌握的短语数（吞吐相近时偏向大批次 = 每次调用评分更多短语）。
+# 做法：按批次大小记录吞吐的 EWMA，单步爬山；失败率过高或评分过慢时直接缩小。
+
+MIN_BATCH_SIZE = 3
+MAX_BATCH_SIZE = 12
+DEFAULT_BATCH_SIZE = 5
+
+
+class BatchSizeController:
+    """
+    每个会话一个；每批判分后调用 observe()，size 即下一批的大小
+    cycle_seconds：批次显示 → 判分返回（含学生录音时间）；rtt_seconds：评分请求往返
+    决策记录在 decisions（侧边栏读取）；log 为可选的逐条输出回调（如 print）
+    """
+
+    def __init__(self, initial=DEFAULT_BATCH_SIZE, min_size=MIN_BATCH_SIZE, max_size=MAX_BATCH_SIZE,
+                 alpha=0.4, fail_high=0.5, fail_hold=0.3, slow_rtt=20.0, tolerance=0.05, log=None):
+        self.size = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.alpha = alpha
+        self.fail_high = fail_high  # 失败率高于此值：缩小 2
+        self.fail_hold = fail_hold  # 失败率高于此值：不再加大
+        self.slow_rtt = slow_rtt  # 评分往返超过此秒数：缩小 1
+        self.tolerance = tolerance  # 吞吐差在此比例内视为持平，偏向大批次
+        self.log = log
+        self.direction = 1
+        self.last_size = None  # 上一批的大小（爬山比较用）
+        self.rate_by_size = {}  # 批次大小 -> 每分钟掌握短语数 (EWMA)
+        self.fail_ratio = None
+        self.rtt = None
+        self.phrases = 0
+        self.calls = 0
+        self.decisions = []  # 最近若干次 (旧大小, 新大小, 原因)
+
+    def _ewma(self, old, value):
+        return value if old is None else old + self.alpha * (value - old)
+
+    def observe(self, size, cycle_seconds, rtt_seconds, passed, failed, calls=1):
+        """记录一批的遥测并决定下一批大小；返回新的 size"""
+        graded = passed + failed
+        if graded == 0 or cycle_seconds <= 0:
+            return self.size
+        self.phrases += graded
+        self.calls += calls
+        self.fail_ratio = self._ewma(self.fail_ratio, failed / graded)
+        self.rtt = self._ewma(self.rtt, rtt_seconds)
+        rate = self.rate_by_size[size] = self._ewma(self.rate_by_size.get(size), passed / cycle_seconds * 60)
+
+        old = self.size
+        if self.fail_ratio > self.fail_high:
+            new, reason = size - 2, "失败率高，缩小批次"
+            self.direction = -1
+        elif self.rtt > self.slow_rtt:
+            new, reason = size - 1, "评分往返过慢，缩小批次"
+            self.direction = -1
+        else:
+            previous = self.rate_by_size.get(self.last_size) if self.last_size not in (None, size) else None
+            if previous is None:
+                reason = "试探"
+            else:
+                moved = 1 if size > self.last_size else -1
+                if rate < previous * (1 - self.tolerance):
+                    self.direction, reason = -moved, "吞吐下降，反向"
+                elif moved < 0 and rate < previous * (1 + self.tolerance):
+                    self.direction, reason = 1, "吞吐持平，偏向大批次"
+                else:
+                    self.direction, reason = moved, "吞吐提升，继续"
+            if not self.min_size <= size + self.direction <= self.max_size:
+                self.direction = -self.direction  # 到达边界：往回试探
+            new = size + self.direction
+            if new > size and self.fail_ratio > self.fail_hold:
+                new, reason = size, "失败率偏高，暂不加大"
+        new = max(self.min_size, min(self.max_size, new))
+        self.last_size = size
+        self.size = new
+        self.decisions = (self.decisions + [(old, new, reason)])[-50:]
+        if self.log:
+            self.log(f"🎚️ 批次大小 {old} → {new}（{reason}）· 吞吐 {rate:.1f} 个/分 · "
+                     f"RTT {self.rtt:.1f}s · 失败率 {self.fail_ratio:.0%}")
+        return new
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "fail_ratio": self.fail_ratio,
+            "rtt_seconds": self.rtt,
+            "phrases_per_call": (self.phrases / self.calls) if self.calls else None,
+            "last_decision": self.decisions[-1] if self.decisions else None,
+        }
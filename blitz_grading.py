@@ -0,0 +1,231 @@
+import os
+import time
+import threading
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from blitz_engine import normalize_id
+from json_stream import salvage_json_array, salvage_json_object
+from structured_output import BLITZ_BATCH_SCHEMA, BLITZ_ITEM_SCHEMA, VALID_STATUSES, parse_metrics
+
+# ==================== 闪电战分段并行评分 ====================
+# 原流程：5 个短语录成一段，一次请求要求模型返回 5 个元素的 JSON 数组；
+# 只要有一项格式不对，整批都得重新评分。
+# 分段流程：audio_prep.phrase_clips 在停顿处把录音切开并对应到各短语（没有人声的短语由调用方本地判失败），
+# 每个片段配一个小提示词并发评分；单项失败只重试该项。
+# 切出的段无法对应到短语（连读、噪声）时回退到整批请求。
+#
+# 整批请求的结果按 id 容错解析：截断 / 夹杂说明文字时保留能解析的项，只对缺失的 id 追加一次请求。
+#
+# call(prompt, audio_bytes, mime_type, schema=None) -> 模型返回的文本；由 blitz_app 按代理 / 直连构造，
+# schema 为 structured_output 里的 JSON Schema（后端支持时随请求发送）
+
+SEGMENTED_GRADING = os.getenv("BLITZ_SEGMENTED_GRADING", "1") != "0"
+ITEM_WORKERS = int(os.getenv("BLITZ_ITEM_WORKERS", "8"))
+ITEM_RETRIES = 1
+BATCH_RETRIES = 1  # 整批结果缺项时，只对缺失的 id 追加请求的次数
+
+_executor = ThreadPoolExecutor(max_workers=ITEM_WORKERS, thread_name_prefix="blitz-item")
+
+
+def build_item_prompt(item, position):
+    """单个短语的小提示词；评分规则在系统指令里"""
+    return f"""Here is the audio recording of ONE phrase (item {position} of the batch).
+The user translated this Chinese phrase to English:
+- ID {item.id}: Chinese '{item.phrase_cn}' → Expected ESV: '{item.phrase_en}'
+
+1. Transcribe EXACTLY what you hear (or "NO_AUDIO" if you hear nothing)
+2. Evaluate using the theological coach rules from system instruction
+
+Output ONLY a valid JSON object:
+{{"id": {item.id}, "status": "pass/warning/fail", "user_said": "exact transcription or 'NO_AUDIO'", "feedback": "coaching feedback"}}"""
+
+
+def parse_item_response(text, item_id, metrics=parse_metrics, retry=False):
+    """单项结果 → dict（容忍前后噪声与截断的 feedback）；找不到合法对象或 status 无效时抛 ValueError"""
+    result, complete = salvage_json_object(text)
+    status = str((result or {}).get("status") or "").lower()
+    if status not in VALID_STATUSES:
+        metrics.record("blitz_item", "failed", retry=retry, rerequested=1)
+        raise ValueError("no JSON object in response" if result is None else f"invalid status: {status!r}")
+    metrics.record("blitz_item", "clean" if complete else "salvaged", retry=retry, rerequested=1)
+    result["status"] = status
+    result["id"] = item_id
+    return result
+
+
+def parse_batch_response(text, items):
+    """
+    整批结果 → ([结果, ...], complete)；只保留 id 属于本批、status 合法的项（同一 id 取第一条）
+    截断 / 被污染的数组照样返回能解析出的项，缺失的 id 由调用方补评
+    """
+    by_id = {item.id: item for item in items}
+    salvaged, complete = salvage_json_array(text)
+    results = {}
+    for result in salvaged:
+        item_id = normalize_id(result.get("id"), by_id)
+        status = str(result.get("status") or "").lower()
+        if item_id is None or item_id in results or status not in VALID_STATUSES:
+            complete = False
+            continue
+        result["id"] = item_id
+        result["status"] = status
+        results[item_id] = result
+    return [results[item.id] for item in items if item.id in results], complete and len(results) == len(items)
+
+
+def build_batch_prompt(items, positions=None, total=None):
+    """
+    整批提示词；补评时 items 只含缺失项，positions 为它们在录音中的序号（1 起），total 为整段录音的短语数
+    """
+    positions = positions or list(range(1, len(items) + 1))
+    total = total or len(items)
+    items_list = "\n".join(f"{position}. ID {item.id}: Chinese '{item.phrase_cn}' → Expected ESV: '{item.phrase_en}'"
+                           for position, item in zip(positions, items))
+    output_lines = ",\n".join(
+        f'    {{"id": {item.id}, "status": "pass/warning/fail", "user_said": "exact transcription or \'NO_AUDIO\'", "feedback": "coaching feedback"}}'
+        for item in items
+    )
+    if len(items) == total:
+        intro = f"""Here is the audio recording. The user will translate {total} Chinese phrases to English in sequential order.
+
+The {total} items in order:"""
+    else:
+        intro = f"""Here is the audio recording. The user translated {total} Chinese phrases to English in sequential order.
+Grade ONLY the {len(items)} item(s) below (their position in the recording is given by the number):"""
+    return f"""{intro}
+{items_list}
+
+Listen to the audio and for each item:
+1. Transcribe EXACTLY what you hear (or "NO_AUDIO" if you hear nothing)
+2. Evaluate using the theological coach rules from system instruction
+3. Return JSON with status (pass/warning/fail), user_said, and feedback
+
+Output JSON format:
+{{"results": [
+{output_lines}
+]}}
+
+⚠️ If audio is SILENT/EMPTY: ALL items must have user_said: "NO_AUDIO" and status: "fail"
+⚠️ user_said MUST be what you actually HEAR, not the expected answer
+
+Output ONLY the valid JSON object."""
+
+
+class GradingMetrics:
+    """分段 / 整批两条路径的耗时与失败率（进程级，跨会话累积）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segmented_batches = 0
+        self.fallback_batches = 0
+        self.item_calls = 0
+        self.item_failures = 0  # 单次调用返回格式错误 / 异常（会重试）
+        self.items_lost = 0  # 重试后仍失败、留待下一批重考的短语
+        self.batch_calls = 0
+        self.batch_failures = 0
+        self.segmented_seconds = []
+        self.batch_seconds = []
+
+    def record_items(self, seconds, calls, failures, lost):
+        with self._lock:
+            self.segmented_batches += 1
+            self.item_calls += calls
+            self.item_failures += failures
+            self.items_lost += lost
+            self.segmented_seconds = (self.segmented_seconds + [seconds])[-50:]
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallback_batches += 1
+
+    def record_batch(self, seconds, ok):
+        with self._lock:
+            self.batch_calls += 1
+            if not ok:
+                self.batch_failures += 1
+            self.batch_seconds = (self.batch_seconds + [seconds])[-50:]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "segmented_batches": self.segmented_batches,
+                "fallback_batches": self.fallback_batches,
+                "item_failure_rate": (self.item_failures / self.item_calls) if self.item_calls else 0.0,
+                "batch_failure_rate": (self.batch_failures / self.batch_calls) if self.batch_calls else 0.0,
+                "avg_segmented_seconds": statistics.mean(self.segmented_seconds) if self.segmented_seconds else None,
+                "avg_batch_seconds": statistics.mean(self.batch_seconds) if self.batch_seconds else None,
+            }
+
+
+grading_metrics = GradingMetrics()
+
+
+def _grade_one(call, item, position, clip, retries):
+    """返回 (结果或 None, 调用次数, 失败次数)"""
+    prompt = build_item_prompt(item, position)
+    failures = 0
+    for attempt in range(retries + 1):
+        try:
+            text = call(prompt, clip, "audio/wav", schema=BLITZ_ITEM_SCHEMA)
+            return parse_item_response(text, item.id, retry=attempt > 0), attempt + 1, failures
+        except Exception:
+            failures += 1
+    return None, retries + 1, failures
+
+
+def grade_segmented(call, items, clips, retries=ITEM_RETRIES, metrics=grading_metrics, positions=None):
+    """
+    每个短语片段并发评分，结果按批次顺序返回
+    positions：各短语在整批中的序号（本地已判为未录音的短语不送评时传入），默认 1..n
+    重试后仍失败的短语不出现在结果里（BlitzQueue.settle 会把它放回队首，下一批重考）
+    """
+    start = time.perf_counter()
+    positions = positions or range(1, len(items) + 1)
+    futures = [_executor.submit(_grade_one, call, item, position, clip, retries)
+               for position, item, clip in zip(positions, items, clips)]
+    results = []
+    calls = failures = lost = 0
+    for future in futures:
+        result, item_calls, item_failures = future.result()
+        calls += item_calls
+        failures += item_failures
+        if result is None:
+            lost += 1
+        else:
+            results.append(result)
+    metrics.record_items(time.perf_counter() - start, calls, failures, lost)
+    return results
+
+
+def grade_batch(call, items, audio_bytes, mime_type, retries=BATCH_RETRIES, metrics=grading_metrics):
+    """
+    整段录音一次评分 → (结果, 调用次数, 最后一次响应文本)
+    响应缺项（截断 / 单项损坏）时只对缺失的 id 追加请求（同一段录音）；
+    仍缺失的短语不出现在结果里，由 BlitzQueue.settle 放回队首
+    """
+    start = time.perf_counter()
+    positions = {item.id: position for position, item in enumerate(items, 1)}
+    results = {}
+    pending = list(items)
+    calls = 0
+    text = None
+    for attempt in range(retries + 1):
+        prompt = build_batch_prompt(pending, [positions[item.id] for item in pending], len(items))
+        try:
+            text = call(prompt, audio_bytes, mime_type, schema=BLITZ_BATCH_SCHEMA)
+        except Exception:
+            # 首次请求失败交给调用方回退；补评失败就保留已捞回的结果
+            if not attempt:
+                raise
+            break
+        calls += 1
+        found, complete = parse_batch_response(text, pending)
+        parse_metrics.record("blitz_batch", "clean" if complete else ("salvaged" if found else "failed"),
+                             retry=attempt > 0, rerequested=len(pending))
+        results.update((result["id"], result) for result in found)
+        pending = [item for item in pending if item.id not in results]
+        if not pending:
+            break
+    metrics.record_batch(time.perf_counter() - start, ok=not pending)
+    return [results[item.id] for item in items if item.id in results], calls, text
@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+from bible_library import DATA_DIR, Card, freeze_cards, list_book_files, _file_signature
+from scripture_ref import parse_ref
+
+# ==================== SQLite 卡片仓库 ====================
+# JSON 按书卷分文件，回答"key_term / trap 提到 Covenant 的全部卡片"、
+# "Romans 3–8 的全部卡片"只能全量扫描。这里把卡片导入 SQLite（WAL 模式），
+# 为 书卷 + 章:节、key_term / trap 词项建立索引，查询只走索引。
+# - sync() 按文件 mtime/size 增量导入：只重建变化过的书卷
+# - 查询返回 (书卷, 位置, id, ref)，卡片本身仍从共享只读库 bible_library.library 取
+# - 导入经 bible_library.freeze_cards：字段别名（key_focus_term / key_verb → key_term）与
+#   trap 字符串拆分和共享库一致
+# - 每个线程一个连接；WAL 下读写互不阻塞
+
+DB_PATH = os.getenv("CARD_DB_PATH", os.path.join(tempfile.gettempdir(), "pulpit_power_cards.sqlite3"))
+SCHEMA_VERSION = 5
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    book TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    book TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    card_id INTEGER,
+    ref TEXT,
+    chapter INTEGER,
+    verse INTEGER,
+    end_chapter INTEGER,
+    end_verse INTEGER,
+    key_term TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (book, position)
+) WITHOUT ROWID;
+-- 覆盖索引：范围查询不必回表
+CREATE INDEX IF NOT EXISTS idx_cards_location ON cards (book, chapter, verse, position, card_id, ref);
+CREATE INDEX IF NOT EXISTS idx_cards_id ON cards (book, card_id);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    field TEXT NOT NULL,
+    book TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    card_id INTEGER,
+    ref TEXT,
+    PRIMARY KEY (term, field, book, position)
+) WITHOUT ROWID;
+"""
+
+
+def parse_location(ref, book_name=None):
+    """"Romans 3:23-24" → (3, 23, 3, 24)；整章引用起点记为第 0 节；列表写法取第一段；无法解析返回 None"""
+    parsed = parse_ref(ref or "", book_name)
+    if parsed is None:
+        return None
+    return parsed.chapter, parsed.verse, parsed.end_chapter, parsed.end_verse
+
+
+def normalize_terms(text):
+    """小写分词：整个短语 + 各个单词（"Cut a covenant" → cut a covenant / cut / a / covenant）"""
+    text = (text or "").strip().lower()
+    if not text:
+        return set()
+    words = _TERM_PATTERN.findall(text)
+    return {" ".join(words)} | set(words) if words else set()
+
+
+class CardRepository:
+    def __init__(self, db_path=DB_PATH, data_dir=DATA_DIR):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._dir_signature = None
+        self.imported_books = 0
+        self.queries = 0
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                with conn:
+                    conn.executescript("DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS cards; DROP TABLE IF EXISTS terms;")
+                    conn.executescript(_SCHEMA)
+                    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._local.conn = conn
+        return conn
+
+    # ---------- 导入 ----------
+
+    def import_book(self, book_name, cards, signature=(0, 0)):
+        """整卷替换（单个事务）；cards 可以是 JSON 字典或 Card"""
+        cards = [card if isinstance(card, Card) else Card.from_dict(card) for card in cards]
+        card_rows = []
+        term_rows = []
+        for position, card in enumerate(cards):
+            location = parse_location(card.ref, book_name) or (None, None, None, None)
+            card_rows.append((book_name, position, card.id, card.ref, *location,
+                              card.key_term, json.dumps(card.to_dict(), ensure_ascii=False)))
+            for term in normalize_terms(card.key_term):
+                term_rows.append((term, "key_term", book_name, position, card.id, card.ref))
+            for trap in card.trap:
+                for term in normalize_terms(trap):
+                    term_rows.append((term, "trap", book_name, position, card.id, card.ref))
+
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM cards WHERE book = ?", (book_name,))
+            conn.execute("DELETE FROM terms WHERE book = ?", (book_name,))
+            conn.executemany("INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", card_rows)
+            conn.executemany("INSERT OR IGNORE INTO terms VALUES (?, ?, ?, ?, ?, ?)", term_rows)
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)", (book_name, *signature))
+        self.imported_books += 1
+
+    def sync(self, force=False):
+        """从 JSON 增量导入：新增 / 修改的书卷重建，已删除的书卷移除；返回导入的卷数"""
+        try:
+            dir_signature = os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            dir_signature = None
+        book_files = dict(list_book_files(self.data_dir))
+        signatures = {name: _file_signature(path) for name, path in book_files.items()}
+        with self._sync_lock:
+            if not force and dir_signature == self._dir_signature and self._is_current(signatures):
+                return 0
+            conn = self._connect()
+            known = {book: (mtime_ns, size) for book, mtime_ns, size in conn.execute("SELECT * FROM sources")}
+            imported = 0
+            for book_name, path in book_files.items():
+                if force or known.get(book_name) != signatures[book_name]:
+                    with open(path, "r", encoding="utf-8") as file:
+                        self.import_book(book_name, freeze_cards(json.load(file)), signatures[book_name])
+                    imported += 1
+            for book_name in set(known) - set(book_files):
+                with conn:
+                    for table in ("cards", "terms", "sources"):
+                        conn.execute(f"DELETE FROM {table} WHERE book = ?", (book_name,))
+            self._dir_signature = dir_signature
+            self._signatures = signatures
+            return imported
+
+    def _is_current(self, signatures):
+        return getattr(self, "_signatures", None) == signatures
+
+    # ---------- 查询 ----------
+
+    def _query(self, sql, params):
+        self.queries += 1
+        return self._connect().execute(sql, params).fetchall()
+
+    def book_cards(self, book_name):
+        """整卷卡片（按原顺序，Card）"""
+        rows = self._query("SELECT data FROM cards WHERE book = ? ORDER BY position", (book_name,))
+        return [Card.from_dict(json.loads(data)) for (data,) in rows]
+
+    def chapters(self, book_name):
+        rows = self._query("SELECT DISTINCT chapter FROM cards WHERE book = ? AND chapter IS NOT NULL "
+                           "ORDER BY chapter", (book_name,))
+        return [chapter for (chapter,) in rows]
+
+    def in_range(self, book_name, start_chapter, end_chapter=None, start_verse=None, end_verse=None):
+        """书卷内 章:节 范围 → [(书卷, 位置, id, ref)]；"Romans 3–8" = in_range("Romans", 3, 8)"""
+        end_chapter = start_chapter if end_chapter is None else end_chapter
+        return self._query(
+            "SELECT book, position, card_id, ref FROM cards "
+            "WHERE book = ? AND (chapter, verse) >= (?, ?) AND (chapter, verse) <= (?, ?) "
+            "ORDER BY chapter, verse, position",
+            (book_name, start_chapter, start_verse or 0, end_chapter, end_verse or 10 ** 6),
+        )
+
+    def mentioning(self, term, fields=("key_term", "trap"), book_name=None):
+        """key_term / trap 中出现该词（或整个短语）的卡片 → [(书卷, 位置, id, ref)]"""
+        normalized = " ".join(_TERM_PATTERN.findall((term or "").lower()))
+        if not normalized:
+            return []
+        placeholders = ", ".join("?" for _ in fields)
+        sql = f"SELECT book, position, card_id, ref FROM terms WHERE term = ? AND field IN ({placeholders})"
+        params = [normalized, *fields]
+        if book_name:
+            sql += " AND book = ?"
+            params.append(book_name)
+        # 同一卡片可能在 key_term 和 trap 中都出现：去重后按 (书卷, 位置) 排序
+        return sorted(set(self._query(sql, params)))
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "books": conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0],
+            "cards": conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0],
+            "terms": conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0],
+            "imported_books": self.imported_books,
+            "queries": self.queries,
+        }
+
+
+card_repository = CardRepository()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="导入书卷 JSON 到 SQLite")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args(argv)
+
+    repo = CardRepository(args.db, args.data_dir)
+    start = time.perf_counter()
+    imported = repo.sync()
+    print(f"✅ 导入 {imported} 卷 ({(time.perf_counter() - start) * 1000:.0f} ms) → {args.db}")
+    print(f"   📊 {repo.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
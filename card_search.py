@@ -0,0 +1,182 @@
+import re
+import threading
+from functools import lru_cache
+from collections import defaultdict
+
+from bible_library import library
+
+# ==================== 卡片全文检索 ====================
+# 内存倒排索引：词项 → {书卷: {位置: 得分}}
+# - 中文按 CJK 单字 + 二元组切分（"立约" 命中 "与你立约"），英文小写 + 轻量词干（abide / abides / abiding）
+# - 索引按书卷维护：书卷 JSON 变化（LazyLibrary 返回新的卡片元组）时只重建该卷
+# - 查询为多词项求交，按字段权重排序
+# - 3 万卡片首次建索引要数秒：界面启动时用 start_background_refresh 在后台线程构建，ready 之前显示"索引构建中"
+
+SEARCH_FIELDS = {
+    "key_term": 3.0,
+    "phrase_en": 2.0,
+    "phrase_cn": 2.0,
+    "trap": 2.0,
+    "ref": 1.5,
+    "nuance_note": 1.0,
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """轻量英文词干：去复数 / -ing / -ed / -ly 与词尾 e，保证同一词的变形落到同一词干"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ing", "edly", "ed", "ly"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            if len(word) >= 4 and word[-1] == word[-2] and word[-1] not in "lsz":
+                word = word[:-1]
+            break
+    if word.endswith("e") and len(word) > 3:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text, for_query=False):
+    """
+    英文：小写 + 词干；中文：每个字 + 相邻二元组
+    查询时中文只用二元组（单字查询仍用单字），避免单字把结果放得过宽
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(str(text or "").lower()):
+        if run[0] >= "一":
+            if for_query and len(run) > 1:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            else:
+                tokens.extend(run)
+                if not for_query:
+                    tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(stem(run))
+    return tokens
+
+
+class CardSearchIndex:
+    def __init__(self, source=library):
+        self.source = source
+        self._postings = defaultdict(dict)  # 词项 -> {书卷: {位置: 得分}}
+        self._book_tokens = {}  # 书卷 -> 该卷用到的词项（增量删除用）
+        self._book_cards = {}  # 书卷 -> 建索引时的卡片元组（变化检测）
+        self._lock = threading.Lock()
+        self._build_thread = None
+        self.ready = False  # 第一次完整 refresh 完成后为 True
+        self.build_error = None
+        self.books_indexed = 0
+
+    def _index_book(self, book_name, cards):
+        self._remove_book(book_name)
+        book_postings = {}  # 词项 -> {位置: 得分}
+        fields = list(SEARCH_FIELDS.items())
+        for position, card in enumerate(cards):
+            scores = {}
+            for field, weight in fields:
+                value = card.get(field)
+                if not value:
+                    continue
+                if isinstance(value, (list, tuple)):
+                    value = " ".join(str(v) for v in value)
+                for token in set(tokenize(value)):
+                    scores[token] = scores.get(token, 0.0) + weight
+            for token, score in scores.items():
+                positions = book_postings.get(token)
+                if positions is None:
+                    positions = book_postings[token] = {}
+                positions[position] = score
+        for token, positions in book_postings.items():
+            self._postings[token][book_name] = positions
+        self._book_tokens[book_name] = set(book_postings)
+        self._book_cards[book_name] = cards
+        self.books_indexed += 1
+
+    def _remove_book(self, book_name):
+        for token in self._book_tokens.pop(book_name, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(book_name, None)
+            if not postings:
+                del self._postings[token]
+        self._book_cards.pop(book_name, None)
+
+    def refresh(self):
+        """只重建新增 / 修改过的书卷，移除已删除的书卷；返回重建的卷数"""
+        with self._lock:
+            rebuilt = 0
+            current = set()
+            for book_name in self.source:
+                cards = self.source.get(book_name)
+                if cards is None:
+                    continue
+                current.add(book_name)
+                if self._book_cards.get(book_name) is not cards:
+                    self._index_book(book_name, cards)
+                    rebuilt += 1
+            for book_name in set(self._book_cards) - current:
+                self._remove_book(book_name)
+            self.ready = True
+            return rebuilt
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+            self.build_error = None
+        except Exception as e:
+            self.build_error = str(e)
+
+    def start_background_refresh(self):
+        """在后台线程执行 refresh；已有构建线程在运行时不重复启动"""
+        with self._lock:
+            if self._build_thread is not None and self._build_thread.is_alive():
+                return
+            self._build_thread = threading.Thread(target=self._background_refresh, name="card-search-build", daemon=True)
+            self._build_thread.start()
+
+    def search(self, query, limit=20, refresh=True):
+        """多词项求交、按得分排序 → [(书卷, 位置, card, 得分)]"""
+        if refresh:
+            self.refresh()
+        tokens = list(dict.fromkeys(tokenize(query, for_query=True)))
+        if not tokens:
+            return []
+        with self._lock:
+            postings = [self._postings.get(token) for token in tokens]
+            if not all(postings):
+                return []
+            scores = {}
+            for book_name in set(postings[0]).intersection(*postings[1:]):
+                per_token = sorted((p[book_name] for p in postings), key=len)
+                book_scores = dict(per_token[0])
+                for other in per_token[1:]:
+                    book_scores = {pos: score + other[pos] for pos, score in book_scores.items() if pos in other}
+                for position, score in book_scores.items():
+                    scores[(book_name, position)] = score
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [(book, position, self._book_cards[book][position], score)
+                    for (book, position), score in ranked]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "books": len(self._book_cards),
+                "tokens": len(self._postings),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "books_indexed": self.books_indexed,
+                "ready": self.ready,
+            }
+
+
+card_search = CardSearchIndex()
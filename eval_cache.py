@@ -0,0 +1,101 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ==================== 评估结果缓存 ====================
+# 学生常重复点击提交或用同一段录音重跑；相同 (音频, 卡片, 模式, 提示词版本)
+# 直接复用上一次的评估结果，不再上传音频、不再付费调用 Gemini。
+# - LRU + TTL 淘汰；模块级实例跨 rerun、跨会话共享
+# - single-flight：并发的相同提交只发一次请求，其余等待同一结果
+
+
+def evaluation_key(audio_bytes, book, card, mode, prompt_version):
+    """sha256(音频) + 书卷/卡片 id/ref + 模式 + 提示词版本 → 缓存键"""
+    audio_digest = hashlib.sha256(audio_bytes).hexdigest()
+    parts = [audio_digest, str(book), str(card.get('id', '')), str(card.get('ref', '')), mode, prompt_version]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class EvaluationCache:
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0  # 等待其他请求的在途结果
+        self.evictions = 0
+
+    def _get_fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put(self, key, result):
+        self._entries[key] = (time.time(), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute, should_cache=None):
+        """
+        命中直接返回；同 key 已在途则等待其结果；否则调用 compute()
+        should_cache(result) 为 False 时（如连接错误）结果不入缓存
+        返回结果副本，调用方修改不会污染缓存
+        """
+        with self._lock:
+            result = self._get_fresh(key)
+            if result is not None:
+                self.hits += 1
+                return dict(result)
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return dict(future.result())
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            if should_cache is None or should_cache(result):
+                self._put(key, result)
+        future.set_result(result)
+        return dict(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "evictions": self.evictions,
+            }
+
+
+evaluation_cache = EvaluationCache()
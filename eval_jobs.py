@@ -0,0 +1,135 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ==================== 评估任务队列 ====================
+# 点击"提交评估"后立即返回任务句柄，AI 调用在后台线程池中执行，
+# 界面通过轮询读取结果；这样等待 Gemini 时会话仍可翻页 / 预取。
+# - 全局并发上限：线程池大小（EVAL_MAX_WORKERS，默认 8）
+# - 单会话上限：同一会话同时进行中的任务数（EVAL_PER_SESSION_LIMIT，默认 1）
+
+MAX_WORKERS = int(os.getenv("EVAL_MAX_WORKERS", "8"))
+PER_SESSION_LIMIT = int(os.getenv("EVAL_PER_SESSION_LIMIT", "1"))
+FINISHED_JOB_TTL = 600  # 已完成任务保留 10 分钟，供轮询读取
+
+
+class JobLimitError(RuntimeError):
+    """该会话进行中的任务已达上限"""
+
+
+class EvaluationJob:
+    """单个评估任务的状态句柄（由工作线程更新，界面只读）"""
+
+    def __init__(self, session_id, context=None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.context = context or {}  # 调用方附带的信息（如书卷/卡片索引）
+        self.status = "queued"  # queued → running → done / error
+        self.result = None
+        self.error = None
+        self.partial = None  # 流式输出时的中间快照（如 status / user_said / 部分 feedback）
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "error")
+
+    def update_partial(self, snapshot):
+        self.partial = snapshot
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+
+class EvaluationJobQueue:
+    def __init__(self, max_workers=MAX_WORKERS, per_session_limit=PER_SESSION_LIMIT):
+        self.max_workers = max_workers
+        self.per_session_limit = per_session_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="eval-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wait_seconds = []
+        self._run_seconds = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _prune(self):
+        """锁内调用：提交、轮询、统计和任务结束时都会顺带清理，不再提交的会话留下的结果也会过期"""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.status = "running"
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            job.error = e
+            job.status = "error"
+        job.finished_at = time.time()
+        with self._lock:
+            self._wait_seconds = (self._wait_seconds + [job.started_at - job.submitted_at])[-200:]
+            self._run_seconds = (self._run_seconds + [job.finished_at - job.started_at])[-200:]
+            if job.status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._prune()
+
+    def submit(self, session_id, fn, *args, context=None, progress=False, **kwargs):
+        """
+        提交任务并立即返回 EvaluationJob；超出单会话上限时抛出 JobLimitError
+        progress=True 时以 on_partial=job.update_partial 调用 fn，供界面轮询中间结果
+        """
+        with self._lock:
+            self._prune()
+            active = sum(1 for j in self._jobs.values() if j.session_id == session_id and not j.done)
+            if active >= self.per_session_limit:
+                self.rejected += 1
+                raise JobLimitError(f"session has {active} active evaluation job(s)")
+            job = EvaluationJob(session_id, context)
+            self._jobs[job.id] = job
+        if progress:
+            kwargs["on_partial"] = job.update_partial
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        """排在该任务之前、尚未开始的任务数"""
+        with self._lock:
+            return sum(1 for j in self._jobs.values()
+                       if j.status == "queued" and j.submitted_at < job.submitted_at)
+
+    def metrics(self):
+        with self._lock:
+            self._prune()
+            queued = sum(1 for j in self._jobs.values() if j.status == "queued")
+            running = sum(1 for j in self._jobs.values() if j.status == "running")
+            waits = sorted(self._wait_seconds)
+            runs = sorted(self._run_seconds)
+            return {
+                "queue_depth": queued,
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_seconds": (sum(waits) / len(waits)) if waits else 0.0,
+                "p95_wait_seconds": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "avg_run_seconds": (sum(runs) / len(runs)) if runs else 0.0,
+            }
+
+
+evaluation_jobs = EvaluationJobQueue()
@@ -0,0 +1,238 @@
+import json
+
+# ==================== 增量 JSON 解析 ====================
+# 流式输出时模型逐块返回 {"status": ..., "user_said": ..., "feedback": ...}。
+# IncrementalJSONObject 每收到一块就继续向后扫描（不回头重扫），
+# 已完成的字段立即可用，正在输出的字符串字段以"部分值"形式暴露，
+# 界面据此先显示 status / user_said，再逐步填充 feedback。
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class IncrementalJSONObject:
+    """扁平 JSON 对象的增量解析器；容忍前置 ```json 围栏等噪声"""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._state = "seek_object"
+        self._key = []
+        self._value = []
+        self._depth = 0
+        self._in_nested_string = False
+        self._nested_escape = False
+        self.fields = {}
+        self.partial_key = None
+
+    def feed(self, text):
+        """追加一块文本并推进解析；返回当前快照"""
+        self._buf += text
+        self._advance()
+        return self.snapshot()
+
+    def snapshot(self):
+        """已完成字段 + 正在输出的字符串字段（部分值）"""
+        snap = dict(self.fields)
+        if self.partial_key is not None and self.partial_key not in snap:
+            snap[self.partial_key] = "".join(self._value)
+        return snap
+
+    @property
+    def complete(self):
+        return self._state == "done"
+
+    def _read_escape(self, buf, i):
+        """解析 buf[i] 处的反斜杠转义；数据不足返回 (None, i)"""
+        if i + 1 >= len(buf):
+            return None, i
+        code = buf[i + 1]
+        if code == 'u':
+            if i + 6 > len(buf):
+                return None, i
+            try:
+                return chr(int(buf[i + 2:i + 6], 16)), i + 6
+            except ValueError:
+                return buf[i:i + 6], i + 6
+        return _ESCAPES.get(code, code), i + 2
+
+    def _advance(self):
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n and self._state != "done":
+            ch = buf[i]
+            state = self._state
+
+            if state == "seek_object":
+                if ch == '{':
+                    self._state = "before_key"
+                i += 1
+            elif state == "before_key":
+                if ch == '"':
+                    self._key = []
+                    self._state = "in_key"
+                elif ch == '}':
+                    self._state = "done"
+                i += 1
+            elif state == "in_key":
+                if ch == '\\':
+                    decoded, nxt = self._read_escape(buf, i)
+                    if decoded is None:
+                        break
+                    self._key.append(decoded)
+                    i = nxt
+                    continue
+                if ch == '"':
+                    self._state = "after_key"
+                else:
+                    self._key.append(ch)
+                i += 1
+            elif state == "after_key":
+                if ch == ':':
+                    self._state = "before_value"
+                i += 1
+            elif state == "before_value":
+                if ch.isspace():
+                    i += 1
+                    continue
+                self._value = []
+                if ch == '"':
+                    self.partial_key = "".join(self._key)
+                    self._state = "in_string"
+                    i += 1
+                else:
+                    self._depth = 0
+                    self._in_nested_string = False
+                    self._nested_escape = False
+                    self._state = "in_other"
+            elif state == "in_string":
+                if ch == '\\':
+                    decoded, nxt = self._read_escape(buf, i)
+                    if decoded is None:
+                        break
+                    self._value.append(decoded)
+                    i = nxt
+                    continue
+                if ch == '"':
+                    self.fields["".join(self._key)] = "".join(self._value)
+                    self.partial_key = None
+                    self._state = "after_value"
+                else:
+                    self._value.append(ch)
+                i += 1
+            elif state == "in_other":
+                # 数字 / true / null / 嵌套对象：原样收集，结束后尝试解析
+                if self._in_nested_string:
+                    if self._nested_escape:
+                        self._nested_escape = False
+                    elif ch == '\\':
+                        self._nested_escape = True
+                    elif ch == '"':
+                        self._in_nested_string = False
+                elif ch == '"':
+                    self._in_nested_string = True
+                elif ch in '[{':
+                    self._depth += 1
+                elif ch in ']}' and self._depth > 0:
+                    self._depth -= 1
+                elif self._depth == 0 and ch in ',}':
+                    self._finish_other()
+                    self._state = "before_key" if ch == ',' else "done"
+                    i += 1
+                    continue
+                self._value.append(ch)
+                i += 1
+            elif state == "after_value":
+                if ch == ',':
+                    self._state = "before_key"
+                elif ch == '}':
+                    self._state = "done"
+                i += 1
+        self._pos = i
+
+    def _finish_other(self):
+        raw = "".join(self._value).strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self.fields["".join(self._key)] = value
+
+
+# ==================== 容错解析 ====================
+# 非流式 / 流式结束后的整段文本：模型偶尔在 JSON 前后加说明文字、```json 围栏，
+# 或输出被截断。这里不再"整段 json.loads 失败即整体作废"，而是尽量捞出合法部分：
+# - 对象：先找完整对象；截断时用增量解析器取已完成字段（+ 正在输出的字符串字段）
+# - 数组：先整体解析；失败时逐个 raw_decode 数组里的对象，跳过损坏的元素
+# 返回 (结果, complete)；complete=False 表示结果是从不完整 / 被污染的文本里捞出来的。
+
+_decoder = json.JSONDecoder()
+
+
+def _strip_fence(text):
+    text = str(text or "").strip()
+    if text.startswith("```"):
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    return text.strip()
+
+
+def salvage_json_object(text, required=("status",)):
+    """单个对象 → (dict, complete)；没有包含 required 字段的对象时返回 (None, False)"""
+    text = str(text or "")
+    try:
+        value = json.loads(_strip_fence(text))
+        if isinstance(value, dict) and all(key in value for key in required):
+            return value, True
+    except ValueError:
+        pass
+    start = text.find("{")
+    while start >= 0:
+        try:
+            value, _end = _decoder.raw_decode(text, start)
+            if isinstance(value, dict) and all(key in value for key in required):
+                return value, False
+        except ValueError:
+            pass
+        start = text.find("{", start + 1)
+    # 截断的对象：取已完成字段，正在输出的字符串字段保留部分值
+    start = text.find("{")
+    if start >= 0:
+        fields = IncrementalJSONObject().feed(text[start:])
+        if all(key in fields for key in required):
+            return fields, False
+    return None, False
+
+
+def _unwrap_items(value):
+    """[{...}, ...] 或 {"results": [{...}, ...]} → 对象列表"""
+    if isinstance(value, list):
+        return [item for item in value if isinstance(item, dict)]
+    if isinstance(value, dict):
+        for inner in value.values():
+            if isinstance(inner, list):
+                return [item for item in inner if isinstance(item, dict)]
+        return [value]
+    return []
+
+
+def salvage_json_array(text):
+    """对象数组 → ([dict, ...], complete)；截断 / 夹杂噪声时返回能完整解析的元素"""
+    text = str(text or "")
+    try:
+        return _unwrap_items(json.loads(_strip_fence(text))), True
+    except ValueError:
+        pass
+    items = []
+    start = text.find("{")
+    while start >= 0:
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            # 外层包装对象或损坏的元素：跳到下一个 "{"
+            start = text.find("{", start + 1)
+            continue
+        items.extend(_unwrap_items(value))
+        start = text.find("{", end)
+    return items, False
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import struct
+import marshal
+import hashlib
+import argparse
+import tempfile
+
+from bible_library import (
+    DATA_DIR, ARTIFACT_PATH, ARTIFACT_MAGIC, ARTIFACT_VERSION, ARTIFACT_PYTHON,
+    list_book_files, _file_signature,
+)
+
+# ==================== 书卷库编译 ====================
+# 把 assets/bible_data/*.json（跳过 blueprint* / _backup*）编译成单个二进制产物，
+# 由 bible_library.CompiledArtifact 以 mmap 方式读取。
+#
+# 用法：
+#   python library_compiler.py                     # 编译到 assets/bible_library.bin
+#   python -m bench.library_compiler               # 冷启动基准：当前书卷 + 66 卷 / 3 万卡片合成库
+#
+# 修改任意书卷 JSON 后，该卷会因大小 / 内容哈希不符自动回退读 JSON，重新编译即可恢复。
+# 只改了 mtime（checkout / 复制）的书卷按内容哈希确认后继续使用产物。
+
+
+def _section(blob, offset):
+    return {"offset": offset, "length": len(blob), "sha256": hashlib.sha256(blob).hexdigest()}
+
+
+def compile_library(data_dir=DATA_DIR, out_path=ARTIFACT_PATH):
+    """编译并原子替换产物；返回头部信息"""
+    books = {}
+    chunks = []
+    offset = 0
+    for book_name, path in sorted(list_book_files(data_dir)):
+        mtime_ns, size = _file_signature(path)
+        with open(path, "rb") as file:
+            data = file.read()
+        cards = json.loads(data)
+        blob = marshal.dumps(cards)
+        source = [mtime_ns, size, hashlib.sha256(data).hexdigest()]
+        books[book_name] = dict(_section(blob, offset), source=source, count=len(cards))
+        chunks.append(blob)
+        offset += len(blob)
+
+    content_hash = hashlib.sha256()
+    for blob in chunks:
+        content_hash.update(blob)
+    header = {
+        "version": ARTIFACT_VERSION,
+        "python": ARTIFACT_PYTHON,
+        "content_hash": content_hash.hexdigest(),
+        "created_at": time.time(),
+        "books": books,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    out_dir = os.path.dirname(out_path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(ARTIFACT_MAGIC)
+            out.write(struct.pack("<I", len(header_bytes)))
+            out.write(header_bytes)
+            for blob in chunks:
+                out.write(blob)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return header
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="编译书卷库为单个 mmap 产物")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out", default=ARTIFACT_PATH)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    header = compile_library(args.data_dir, args.out)
+    n_cards = sum(entry["count"] for entry in header["books"].values())
+    print(f"✅ 已编译 {len(header['books'])} 卷 · {n_cards} 张卡片 → {args.out}"
+          f" ({os.path.getsize(args.out) / 1024:.0f} KB, {(time.perf_counter() - start) * 1000:.0f} ms)")
+    print(f"   content_hash: {header['content_hash'][:16]}…")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
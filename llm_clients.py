@@ -0,0 +1,108 @@
+import weakref
+import threading
+
+import httpx
+from openai import OpenAI
+
+# ==================== 进程级 LLM 客户端注册表 ====================
+# app.py / blitz_app.py / arsenal_factory.py 共用：同一 (api_key, base_url)
+# 只创建一个 OpenAI 客户端，底层 httpx 连接池保持 keep-alive，
+# 避免每次提交都重新握手 TLS 到中转站。
+
+PROXY_BASE_URL = "https://api.laozhang.ai/v1"
+
+# 音频评估可能较慢：读超时放宽，连接超时保持较短以便快速失败
+DEFAULT_TIMEOUT = httpx.Timeout(90.0, connect=10.0, pool=10.0)
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120.0)
+# SDK 内置重试会在限流器看不到的地方重发 429：关掉，由 llm_governor 统一冷却 / 重试
+MAX_RETRIES = 0
+
+
+class ConnectionStats:
+    """统计请求数与新建连接数；复用数 = 请求数 - 新建连接数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self._seen = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def observe(self, connections):
+        with self._lock:
+            self.requests += 1
+            for conn in connections:
+                if conn not in self._seen:
+                    self._seen.add(conn)
+                    self.new_connections += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reused_connections": max(0, self.requests - self.new_connections),
+            }
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """在每次请求后检查连接池，记录是否新建了连接"""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        response = super().handle_request(request)
+        pool = getattr(self, "_pool", None)
+        self.stats.observe(list(getattr(pool, "connections", [])))
+        return response
+
+
+def build_http_client(stats, timeout=DEFAULT_TIMEOUT, limits=POOL_LIMITS):
+    return httpx.Client(
+        transport=CountingTransport(stats, limits=limits, retries=1),
+        timeout=timeout,
+    )
+
+
+class ClientRegistry:
+    """(api_key, base_url) → 复用的 OpenAI 客户端"""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.connection_stats = ConnectionStats()
+        self.clients_created = 0
+        self.client_reuses = 0
+
+    def get(self, api_key, base_url=PROXY_BASE_URL):
+        key = (api_key, base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.client_reuses += 1
+                return client
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=DEFAULT_TIMEOUT,
+                max_retries=MAX_RETRIES,
+                http_client=build_http_client(self.connection_stats),
+            )
+            self._clients[key] = client
+            self.clients_created += 1
+            return client
+
+    def stats(self):
+        with self._lock:
+            stats = {"clients_created": self.clients_created, "client_reuses": self.client_reuses}
+        stats.update(self.connection_stats.snapshot())
+        return stats
+
+
+client_registry = ClientRegistry()
+
+
+def get_openai_client(api_key, base_url=PROXY_BASE_URL):
+    """获取共享客户端（进程内同一 key/base_url 只建一次）"""
+    return client_registry.get(api_key, base_url)
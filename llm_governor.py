@@ -0,0 +1,256 @@
+import os
+import time
+import threading
+import statistics
+from collections import deque
+
+# ==================== 进程级 LLM 限流 / 并发调度 ====================
+# 一个班级同时提交时，app.py 的评估、blitz_app.py 的整批 / 分段评分、arsenal_factory 的批量生成
+# 各自直接调用 chat.completions.create / generate_content，中转站随即成片返回 429。
+# 这里每个后端（proxy = laozhang 中转站，gemini = 直连 Google）一个闸门：
+# - 令牌桶：限制每分钟发起的请求数（允许 burst 个突发）
+# - 并发上限：同时进行中的请求数（流式评估在整个流读完后才释放）
+# - 公平排队：等待者按会话分组、各会话轮流放行，分段评分一次排 8 个请求的会话不会挤掉其他学生
+# - 收到 429 时该后端暂停 cooldown 秒并清空令牌，call() 在冷却后自动重试
+#   （llm_clients 关闭了 OpenAI SDK 的内置重试，否则 429 会在这里看不到的地方被重发）
+# 限额按后端从环境变量读取：LLM_PROXY_RPM / LLM_PROXY_BURST / LLM_PROXY_CONCURRENCY，GEMINI 同理。
+
+DEFAULT_LIMITS = {
+    "proxy": {"rpm": 240, "burst": 8, "concurrency": 16},
+    "gemini": {"rpm": 120, "burst": 4, "concurrency": 8},
+}
+ACQUIRE_TIMEOUT = float(os.getenv("LLM_ACQUIRE_TIMEOUT", "120"))
+RATE_LIMIT_COOLDOWN = float(os.getenv("LLM_RATE_LIMIT_COOLDOWN", "2.0"))
+RATE_LIMIT_RETRIES = 2
+
+
+class GovernorTimeout(RuntimeError):
+    """排队超过 ACQUIRE_TIMEOUT 仍未轮到"""
+
+
+class RetryNow(Exception):
+    """
+    fn 需要再发一次上游请求（如后端拒绝 JSON Schema，改发普通请求）：
+    call() 释放名额、重新排队拿新令牌后立即重试，保证每个上游请求都计入限额
+    """
+
+
+def load_limits(backend):
+    """LLM_<BACKEND>_RPM / _BURST / _CONCURRENCY 覆盖默认值"""
+    limits = dict(DEFAULT_LIMITS.get(backend, DEFAULT_LIMITS["proxy"]))
+    for key in limits:
+        value = os.getenv(f"LLM_{backend.upper()}_{key.upper()}")
+        if value:
+            limits[key] = int(value)
+    return limits
+
+
+def is_rate_limited(exc):
+    """OpenAI RateLimitError / HTTP 429 / Google ResourceExhausted"""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    return type(exc).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests")
+
+
+def is_transient(exc):
+    """5xx / 连接中断 / 超时：不冷却，稍等后重试（原来由 OpenAI SDK 内置重试处理）"""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status >= 500
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError", "ServiceUnavailable", "DeadlineExceeded")
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class _Waiter:
+    __slots__ = ("session_id", "granted")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.granted = False
+
+
+class BackendGate:
+    """单个后端的令牌桶 + 并发上限 + 按会话轮转的等待队列"""
+
+    def __init__(self, name, rpm, burst, concurrency, cooldown=RATE_LIMIT_COOLDOWN):
+        self.name = name
+        self.cooldown = cooldown
+        self.rate = rpm / 60.0
+        self.burst = max(1, burst)
+        self.concurrency = max(1, concurrency)
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._queues = {}  # 会话 -> deque[_Waiter]
+        self._rotation = deque()  # 有等待者的会话，轮流放行
+        self._waits = deque(maxlen=500)
+        self.granted = 0
+        self.rate_limited = 0
+        self.transient_retries = 0
+        self.timeouts = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        """在锁内调用：只要令牌和并发都够，就按会话轮转放行队首等待者"""
+        now = time.monotonic()
+        self._refill(now)
+        granted = False
+        while (self._rotation and self._in_flight < self.concurrency
+               and self._tokens >= 1 and now >= self._blocked_until):
+            session_id = self._rotation.popleft()
+            queue = self._queues[session_id]
+            queue.popleft().granted = True
+            if queue:
+                self._rotation.append(session_id)
+            else:
+                del self._queues[session_id]
+            self._tokens -= 1
+            self._in_flight += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _next_event_in(self):
+        """距离下一个令牌 / 冷却结束的秒数；并发已满时等 release 通知"""
+        if self._in_flight >= self.concurrency:
+            return None
+        now = time.monotonic()
+        token_wait = max(0.0, (1 - self._tokens) / self.rate) if self.rate > 0 else 1.0
+        return max(token_wait, self._blocked_until - now, 0.001)
+
+    def acquire(self, session_id, timeout=ACQUIRE_TIMEOUT):
+        start = time.monotonic()
+        deadline = start + timeout
+        waiter = _Waiter(session_id)
+        with self._cond:
+            queue = self._queues.get(session_id)
+            if queue is None:
+                queue = self._queues[session_id] = deque()
+                self._rotation.append(session_id)
+            queue.append(waiter)
+            while True:
+                self._dispatch()
+                if waiter.granted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._queues[session_id]
+                        self._rotation.remove(session_id)
+                    self.timeouts += 1
+                    raise GovernorTimeout(f"{self.name}: waited {timeout:.0f}s for an LLM slot")
+                wait = self._next_event_in()
+                self._cond.wait(remaining if wait is None else min(wait, remaining))
+            self.granted += 1
+            self._waits.append(time.monotonic() - start)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._dispatch()
+            self._cond.notify_all()
+
+    def penalize(self, seconds):
+        """收到 429：冷却期内不再放行，并清空令牌（冷却后按速率重新积累）"""
+        with self._cond:
+            self.rate_limited += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def record_transient(self):
+        """5xx / 连接错误后的重试（不冷却）"""
+        with self._cond:
+            self.transient_retries += 1
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits)
+            return {
+                "rpm": round(self.rate * 60),
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "waiting_sessions": len(self._queues),
+                "granted": self.granted,
+                "rate_limited": self.rate_limited,
+                "transient_retries": self.transient_retries,
+                "timeouts": self.timeouts,
+                "avg_wait_seconds": statistics.mean(waits) if waits else 0.0,
+                "p95_wait_seconds": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            }
+
+
+class LLMGovernor:
+    """后端名 → BackendGate（首次使用时按环境变量创建）"""
+
+    def __init__(self, limits=None):
+        self._limits = limits or {}
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    def gate(self, backend):
+        with self._lock:
+            gate = self._gates.get(backend)
+            if gate is None:
+                gate = self._gates[backend] = BackendGate(backend, **(self._limits.get(backend) or load_limits(backend)))
+            return gate
+
+    def call(self, backend, session_id, fn, *args, retries=RATE_LIMIT_RETRIES, **kwargs):
+        """
+        排队拿到名额后执行 fn(*args, **kwargs)（整个调用期间占用一个并发名额）
+        429 时让该后端冷却并重新排队重试，5xx / 连接错误稍等后重试；流式调用要在 fn 里把流读完
+        """
+        gate = self.gate(backend)
+        for attempt in range(retries + 1):
+            gate.acquire(session_id or "anonymous")
+            try:
+                return fn(*args, **kwargs)
+            except RetryNow as e:
+                if attempt == retries:
+                    raise e.__cause__ or e
+                delay = 0.0
+            except Exception as e:
+                if attempt == retries or not (is_rate_limited(e) or is_transient(e)):
+                    raise
+                delay = 0.0
+                if is_rate_limited(e):
+                    cooldown = _retry_after(e) or gate.cooldown * min(2 ** attempt, 8)
+                    gate.penalize(cooldown)
+                else:
+                    gate.record_transient()
+                    delay = 0.5 * (attempt + 1)
+            finally:
+                gate.release()
+            # 释放名额后再等待，不占用并发
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            gates = dict(self._gates)
+        return {backend: gate.stats() for backend, gate in gates.items()}
+
+
+llm_governor = LLMGovernor()
+
+
+def describe_stats(stats):
+    """侧边栏一行摘要"""
+    return " · ".join(
+        f"🚦 {backend}: 进行中 {s['in_flight']}/{s['concurrency']} · 排队 {s['queue_depth']} · "
+        f"平均等待 {s['avg_wait_seconds']:.1f}s (p95 {s['p95_wait_seconds']:.1f}s) · 429 {s['rate_limited']}"
+        + (f" · 重试 {s['transient_retries']}" if s['transient_retries'] else "")
+        for backend, s in stats.items()
+    )
@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+
+import bible_library
+from tts_cache import TTSCache, CACHE_DIR, CHINESE_VOICE, ESV_VOICE, clean_tts_text
+
+# ==================== 离线批量预渲染 TTS ====================
+# 遍历 load_library 会加载的每张卡片，把 phrase_cn (中文) 与 phrase_en (ESV)
+# 预先渲染进共享音频缓存，部署时即可带着"热"音频上线。
+#
+# 用法：
+#   python prerender_audio.py                      # 全部书卷
+#   python prerender_audio.py --books John Romans  # 指定书卷
+#   python prerender_audio.py --fake-tts           # 本地替身 TTS（测试用，不联网）
+#
+# 断点续传：已在缓存中的条目直接跳过，中断后重跑即可从剩余部分继续。
+
+
+async def fake_synthesize(text, voice, rate):
+    """本地替身 TTS：固定延迟 + 确定性字节分块输出，不访问网络"""
+    digest = hashlib.sha256(f"{voice}|{rate}|{text}".encode("utf-8")).digest()
+    yield b"ID3"
+    for _ in range(8):
+        await asyncio.sleep(0.0025)
+        yield digest
+
+
+def collect_jobs(library, cache):
+    """展开为去重后的 (text, voice, rate) 任务；返回 (待渲染, 已缓存数)"""
+    jobs = []
+    seen = set()
+    cached = 0
+    for book_name, cards in library.items():
+        for card in cards:
+            for field, (voice, rate) in (("phrase_cn", CHINESE_VOICE), ("phrase_en", ESV_VOICE)):
+                text = clean_tts_text(card.get(field, ""))
+                if not text:
+                    continue
+                path = cache.path_for(text, voice, rate)
+                if path in seen:
+                    continue
+                seen.add(path)
+                if cache.lookup(text, voice, rate):
+                    cached += 1
+                else:
+                    jobs.append((book_name, card.get("ref", "?"), text, voice, rate))
+    return jobs, cached
+
+
+async def render_all(jobs, cache, concurrency):
+    """有界并发渲染；返回 (成功数, 失败列表, 写入字节数)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    ok = 0
+    failures = []
+    total_bytes = 0
+    total = len(jobs)
+
+    async def _render(job):
+        nonlocal done, ok, total_bytes
+        book_name, ref, text, voice, rate = job
+        async with semaphore:
+            try:
+                path = await cache.aget(text, voice, rate)
+                total_bytes += os.path.getsize(path)
+                ok += 1
+                status = "✅"
+            except Exception as e:
+                failures.append((book_name, ref, voice, str(e)))
+                status = "❌"
+        done += 1
+        print(f"   [{done}/{total}] {status} {book_name} {ref} ({voice})")
+
+    await asyncio.gather(*(_render(job) for job in jobs))
+    return ok, failures, total_bytes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预渲染全部卡片的中文/ESV 音频到共享缓存")
+    parser.add_argument("--data-dir", default=bible_library.DATA_DIR)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--books", nargs="*", help="只渲染指定书卷（默认全部）")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时进行的 TTS 请求数")
+    parser.add_argument("--fake-tts", action="store_true", help="使用本地替身 TTS（测试用）")
+    args = parser.parse_args(argv)
+
+    library = bible_library.LazyLibrary(args.data_dir)
+    if args.books:
+        # 只解析指定的书卷
+        library = {name: library[name] for name in args.books if name in library}
+    if not library:
+        print("❌ 没有可渲染的书卷")
+        return 1
+
+    cache = TTSCache(args.cache_dir, synthesize=fake_synthesize if args.fake_tts else None)
+    jobs, cached = collect_jobs(library, cache)
+    print(f"🎧 书卷 {len(library)} 卷 · 待渲染 {len(jobs)} 条 · 已缓存 {cached} 条 (跳过)")
+    print(f"📁 缓存目录: {args.cache_dir} · 并发: {args.concurrency}")
+
+    start = time.perf_counter()
+    ok, failures, total_bytes = asyncio.run(render_all(jobs, cache, max(1, args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    print("\n" + "=" * 50)
+    print(f"📊 渲染完成: 成功 {ok} · 失败 {len(failures)} · 跳过 {cached}")
+    print(f"   ⏱️ 耗时 {elapsed:.2f}s · 吞吐 {ok / elapsed if elapsed > 0 else 0:.1f} 条/s")
+    print(f"   💾 写入 {total_bytes / 1024:.1f} KB")
+    for book_name, ref, voice, error in failures:
+        print(f"   ❌ {book_name} {ref} ({voice}): {error}")
+    if failures:
+        print("\n💡 重新运行即可只补渲染失败的条目")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import re
+import bisect
+from functools import lru_cache
+from collections import namedtuple
+
+# ==================== 经文引用解析与区间索引 ====================
+# 卡片 ref 是自由文本："John 1:14"、"Gen 50:20"、"Rom 5:1-6:2"、工厂脚本产出的 "Chapter:Verse"。
+# parse_ref 统一成整数元组 (书卷序号, 章, 节)，配合 RefIndex（有序数组 + bisect）
+# 做规范排序、范围查询和 O(log n) 查重。
+# - 书卷序号按新教正典 1–66；缩写 / 罗马数字 / "First John" 等写法都归一
+# - 整章引用（"Psalm 23"）记为第 0 节到第 VERSE_MAX 节
+
+VERSE_MAX = 999
+
+_BOOKS = [
+    ("Genesis", "gen ge gn"), ("Exodus", "exod exo ex"), ("Leviticus", "lev le lv"),
+    ("Numbers", "num nu nm nb"), ("Deuteronomy", "deut de dt"), ("Joshua", "josh jos"),
+    ("Judges", "judg jdg jg"), ("Ruth", "ru rth"), ("1 Samuel", "1sam 1sa 1sm"),
+    ("2 Samuel", "2sam 2sa 2sm"), ("1 Kings", "1kgs 1ki 1kg"), ("2 Kings", "2kgs 2ki 2kg"),
+    ("1 Chronicles", "1chr 1chron 1ch"), ("2 Chronicles", "2chr 2chron 2ch"), ("Ezra", "ezr"),
+    ("Nehemiah", "neh ne"), ("Esther", "esth est es"), ("Job", "jb"),
+    ("Psalms", "psalm ps psa pss psm"), ("Proverbs", "prov pro prv pr"),
+    ("Ecclesiastes", "eccl ecc eccles qoh"), ("Song of Solomon", "song songofsongs sos canticles"),
+    ("Isaiah", "isa is"), ("Jeremiah", "jer je"), ("Lamentations", "lam la"),
+    ("Ezekiel", "ezek eze ezk"), ("Daniel", "dan da dn"), ("Hosea", "hos ho"), ("Joel", "jl"),
+    ("Amos", "am"), ("Obadiah", "obad ob"), ("Jonah", "jon jnh"), ("Micah", "mic mc"),
+    ("Nahum", "nah na"), ("Habakkuk", "hab hb"), ("Zephaniah", "zeph zep zp"),
+    ("Haggai", "hag hg"), ("Zechariah", "zech zec zc"), ("Malachi", "mal ml"),
+    ("Matthew", "matt mt"), ("Mark", "mk mrk"), ("Luke", "lk luk"), ("John", "jn jhn"),
+    ("Acts", "ac act"), ("Romans", "rom ro rm"), ("1 Corinthians", "1cor 1co"),
+    ("2 Corinthians", "2cor 2co"), ("Galatians", "gal ga"), ("Ephesians", "eph ephes"),
+    ("Philippians", "phil php pp"), ("Colossians", "col"), ("1 Thessalonians", "1thess 1thes 1th"),
+    ("2 Thessalonians", "2thess 2thes 2th"), ("1 Timothy", "1tim 1ti"), ("2 Timothy", "2tim 2ti"),
+    ("Titus", "tit ti"), ("Philemon", "philem phm pm"), ("Hebrews", "heb"), ("James", "jas jm"),
+    ("1 Peter", "1pet 1pe 1pt"), ("2 Peter", "2pet 2pe 2pt"), ("1 John", "1jn 1jhn 1jo"),
+    ("2 John", "2jn 2jhn 2jo"), ("3 John", "3jn 3jhn 3jo"), ("Jude", "jud jd"),
+    ("Revelation", "rev re revelations"),
+]
+
+BOOK_NAMES = [name for name, _ in _BOOKS]  # 下标 + 1 = 书卷序号
+
+_ORDINAL_PATTERN = re.compile(r"^(first|second|third|1st|2nd|3rd|iii|ii|i)\s+")
+_ORDINALS = {"first": "1", "1st": "1", "i": "1", "second": "2", "2nd": "2", "ii": "2",
+             "third": "3", "3rd": "3", "iii": "3"}
+_REF_PATTERN = re.compile(
+    r"^\s*(?P<book>(?:[1-3]\s*)?[^\d\s:.][^\d]*?)?\s*"
+    r"(?P<chapter>\d+)(?:\s*[:.]\s*(?P<verse>\d+))?"
+    r"(?:\s*[-–—]\s*(?:(?P<end_chapter>\d+)\s*[:.]\s*)?(?P<end>\d+))?"
+    r"(?P<rest>\s*[,;].*)?\s*$"
+)
+_EXTRA_PART_PATTERN = re.compile(
+    r"^\s*(?:(?P<chapter>\d+)\s*[:.]\s*)?(?P<start>\d+)(?:\s*[-–—]\s*(?P<end>\d+))?\s*$"
+)
+
+
+def _normalize_book(text):
+    text = text.lower().replace(".", " ").strip()
+    text = _ORDINAL_PATTERN.sub(lambda m: _ORDINALS[m.group(1)], text)
+    return "".join(text.split())
+
+
+_ALIASES = {}
+for _number, (_name, _aliases) in enumerate(_BOOKS, start=1):
+    for _alias in [_name] + _aliases.split():
+        _ALIASES[_normalize_book(_alias)] = _number
+
+
+def book_number(name):
+    """书卷名 / 缩写 → 1–66；无法识别返回 None"""
+    if not name:
+        return None
+    return _ALIASES.get(_normalize_book(name))
+
+
+class ScriptureRef(namedtuple("ScriptureRef", "book chapter verse end_chapter end_verse")):
+    """书卷序号 + 起止 章:节（闭区间）；可直接按元组规范排序"""
+
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return (self.book, self.chapter, self.verse)
+
+    @property
+    def end(self):
+        return (self.book, self.end_chapter, self.end_verse)
+
+    @property
+    def start_key(self):
+        return encode(self.book, self.chapter, self.verse)
+
+    @property
+    def end_key(self):
+        return encode(self.book, self.end_chapter, self.end_verse)
+
+    def overlaps(self, other):
+        return self.start_key <= other.end_key and other.start_key <= self.end_key
+
+    def __str__(self):
+        return format_ref(self)
+
+
+def encode(book, chapter, verse):
+    """(书卷, 章, 节) → 单个整数，保持排序（章、节均 < 1000）"""
+    return (book * 1000 + chapter) * 1000 + verse
+
+
+@lru_cache(maxsize=65536)
+def parse_refs(text, default_book=None):
+    """
+    "John 1:14, 16" → (John 1:14, John 1:16)：逗号 / 分号列出的各段是独立引用（不合并成 14–16）
+    后续段只写节号时沿用上一段的章，写 "章:节" 时换章；整章引用后的段是章号
+    无法解析返回 ()；后续段中无法识别的部分（"see also ..."）忽略
+    """
+    match = _REF_PATTERN.match(text or "")
+    if not match:
+        return ()
+    book_text = match.group("book")
+    book = book_number(book_text) if book_text and book_text.strip() else book_number(default_book)
+    if book is None:
+        return ()
+
+    chapter = int(match.group("chapter"))
+    verse_text = match.group("verse")
+    end_text = match.group("end")
+    whole_chapter = verse_text is None
+    if whole_chapter:
+        # 整章 / 章范围："Psalm 23"、"Psalm 23-24"
+        first = ScriptureRef(book, chapter, 0, int(end_text) if end_text else chapter, VERSE_MAX)
+    else:
+        verse = int(verse_text)
+        end_chapter = int(match.group("end_chapter") or chapter)
+        first = ScriptureRef(book, chapter, verse, end_chapter, int(end_text) if end_text else verse)
+    if (first.end_chapter, first.end_verse) < (first.chapter, first.verse):
+        return ()
+
+    refs = [first]
+    chapter = first.end_chapter
+    for part in re.split(r"[,;]", match.group("rest") or "")[1:]:
+        extra = _EXTRA_PART_PATTERN.match(part)
+        if not extra:
+            continue
+        start, end = int(extra.group("start")), int(extra.group("end") or extra.group("start"))
+        if extra.group("chapter"):
+            chapter = int(extra.group("chapter"))
+            ref = ScriptureRef(book, chapter, start, chapter, end)
+        elif whole_chapter:
+            ref = ScriptureRef(book, start, 0, end, VERSE_MAX)
+            chapter = end
+        else:
+            ref = ScriptureRef(book, chapter, start, chapter, end)
+        if ref.end_key >= ref.start_key:
+            refs.append(ref)
+    return tuple(refs)
+
+
+def parse_ref(text, default_book=None):
+    """
+    "Rom 5:1-6:2" → ScriptureRef(45, 5, 1, 6, 2)；"3:16"（无书卷名）用 default_book
+    列表写法（"John 1:14, 16"）只返回第一段，全部各段用 parse_refs；无法解析返回 None
+    """
+    refs = parse_refs(text, default_book)
+    return refs[0] if refs else None
+
+
+def format_ref(ref):
+    """规范写法：John 1:14 / Romans 5:1-6:2 / Psalms 23"""
+    name = BOOK_NAMES[ref.book - 1]
+    if ref.verse == 0 and ref.end_verse == VERSE_MAX:
+        if ref.end_chapter == ref.chapter:
+            return f"{name} {ref.chapter}"
+        return f"{name} {ref.chapter}-{ref.end_chapter}"
+    if (ref.end_chapter, ref.end_verse) == (ref.chapter, ref.verse):
+        return f"{name} {ref.chapter}:{ref.verse}"
+    if ref.end_chapter == ref.chapter:
+        return f"{name} {ref.chapter}:{ref.verse}-{ref.end_verse}"
+    return f"{name} {ref.chapter}:{ref.verse}-{ref.end_chapter}:{ref.end_verse}"
+
+
+class RefIndex:
+    """
+    区间索引：按起点整数键排序的有序数组 + bisect
+    - overlapping(ref)：O(log n + k)，k 为候选数（受最长区间跨度限制）
+    - add() 用 insort，适合边查重边插入；一次性建索引用 build()（排序一次，O(n log n)）
+    """
+
+    def __init__(self):
+        self._starts = []
+        self._entries = []  # 与 _starts 对齐：(end_key, ref, item)
+        self._max_span = 0
+
+    @classmethod
+    def build(cls, pairs):
+        """[(ref, item)] → 索引"""
+        index = cls()
+        rows = sorted(((ref.start_key, ref.end_key, i, ref, item) for i, (ref, item) in enumerate(pairs)),
+                      key=lambda row: (row[0], row[2]))
+        index._starts = [row[0] for row in rows]
+        index._entries = [(end, ref, item) for _, end, _, ref, item in rows]
+        index._max_span = max((row[1] - row[0] for row in rows), default=0)
+        return index
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, ref, item=None):
+        start, end = ref.start_key, ref.end_key
+        position = bisect.bisect_right(self._starts, start)
+        self._starts.insert(position, start)
+        self._entries.insert(position, (end, ref, item))
+        self._max_span = max(self._max_span, end - start)
+
+    def _scan(self, start_key, end_key):
+        lo = bisect.bisect_left(self._starts, start_key - self._max_span)
+        hi = bisect.bisect_right(self._starts, end_key)
+        for i in range(lo, hi):
+            if self._entries[i][0] >= start_key:
+                yield self._entries[i]
+
+    def overlapping(self, ref):
+        """与 ref 有交集的 [(ref, item)]，按规范顺序"""
+        return [(other, item) for _, other, item in self._scan(ref.start_key, ref.end_key)]
+
+    def has_overlap(self, ref):
+        return next(self._scan(ref.start_key, ref.end_key), None) is not None
+
+    def in_range(self, start_ref, end_ref):
+        """起点落在 [start_ref 起点, end_ref 终点] 之间的 [(ref, item)]"""
+        lo = bisect.bisect_left(self._starts, start_ref.start_key)
+        hi = bisect.bisect_right(self._starts, end_ref.end_key)
+        return [(ref, item) for _, ref, item in self._entries[lo:hi]]
+
+    def __iter__(self):
+        return ((ref, item) for _, ref, item in self._entries)
+
+
+def sort_cards(cards, default_book=None):
+    """按规范经文顺序排序卡片；无法解析的排在最后并保持原相对顺序"""
+    def key(card):
+        ref = parse_ref(card.get("ref", ""), default_book)
+        return (0, ref.start_key, ref.end_key) if ref else (1, 0, 0)
+    return sorted(cards, key=key)
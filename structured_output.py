@@ -0,0 +1,182 @@
+import os
+import threading
+
+from llm_governor import RetryNow
+
+# ==================== 结构化输出（JSON Schema） ====================
+# 两个应用原来都是按 ``` 切分后 json.loads：模型多说一句话、输出被截断，整次评分作废，
+# 学生只能重新提交（再付一次调用费）。这里：
+# - 请求时附带 JSON Schema：代理（OpenAI 兼容）用 response_format=json_schema，
+#   直连 Gemini 用 response_mime_type + response_schema
+# - 后端拒绝 schema 参数（400 / InvalidArgument）时记下来，本进程内该后端改用普通请求；
+#   改发的普通请求经 llm_governor 重新排队（RetryNow），占用新的令牌
+# - 解析用 json_stream 的容错函数，能捞出的部分照常使用；闪电战只重新请求缺失的 id
+# - ParseMetrics 统计解析失败率、捞回率与重试率（侧边栏显示）
+
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "1") != "0"
+VALID_STATUSES = ("pass", "warning", "fail")
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "status": {"type": "string", "enum": list(VALID_STATUSES)},
+        "user_said": {"type": "string"},
+        "feedback": {"type": "string"},
+    },
+    "required": ["status", "user_said", "feedback"],
+}
+
+BLITZ_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "status": {"type": "string", "enum": list(VALID_STATUSES)},
+        "user_said": {"type": "string"},
+        "feedback": {"type": "string"},
+    },
+    "required": ["id", "status", "user_said", "feedback"],
+}
+
+# OpenAI 的 json_schema 要求顶层为对象，数组包在 results 里
+BLITZ_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"results": {"type": "array", "items": BLITZ_ITEM_SCHEMA}},
+    "required": ["results"],
+}
+
+
+def _strict(schema):
+    """OpenAI strict 模式：每个对象都要 additionalProperties=false"""
+    if not isinstance(schema, dict):
+        return schema
+    schema = {key: _strict(value) for key, value in schema.items()}
+    if schema.get("type") == "object":
+        schema["additionalProperties"] = False
+    return schema
+
+
+def openai_response_format(schema, name):
+    """chat.completions.create(response_format=...)"""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": _strict(schema), "strict": True}}
+
+
+def gemini_generation_config(schema):
+    """GenerativeModel.generate_content(generation_config=...)"""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+# ---------- 后端支持情况 ----------
+
+_unsupported = set()
+_unconfirmed = set()  # 带 schema 被拒、普通请求还没成功过的后端
+_unsupported_lock = threading.Lock()
+
+
+def schema_enabled(backend):
+    return STRUCTURED_OUTPUT and backend not in _unsupported
+
+
+def is_schema_rejection(exc):
+    """请求参数被拒（而不是网络 / 限流错误）"""
+    if getattr(exc, "status_code", None) in (400, 422):
+        return True
+    return type(exc).__name__ in ("BadRequestError", "InvalidArgument", "UnprocessableEntityError")
+
+
+def request_with_schema(backend, schema, send):
+    """
+    send(schema 或 None) 发出一次请求；须在 llm_governor.call 内调用
+    带 schema 的请求被拒时记下该后端不支持并抛 RetryNow：governor 重新排队后再次调用本函数，改发普通请求
+    （代理背后的模型换了、Gemini 旧模型不支持 response_schema 等）
+    """
+    if schema is None:
+        return send(None)
+    if schema_enabled(backend):
+        try:
+            return send(schema)
+        except Exception as e:
+            if not is_schema_rejection(e):
+                raise
+            with _unsupported_lock:
+                _unsupported.add(backend)
+                _unconfirmed.add(backend)
+            raise RetryNow(f"{backend} rejected the JSON Schema") from e
+    try:
+        response = send(None)
+    except Exception as e:
+        if is_schema_rejection(e):
+            # 不带 schema 也被拒说明 400 另有原因（音频格式等），不记为"不支持"
+            with _unsupported_lock:
+                if backend in _unconfirmed:
+                    _unconfirmed.discard(backend)
+                    _unsupported.discard(backend)
+        raise
+    with _unsupported_lock:
+        confirmed = backend in _unconfirmed
+        _unconfirmed.discard(backend)
+    if confirmed:
+        parse_metrics.record_schema_rejection()
+    return response
+
+
+# ---------- 解析统计 ----------
+
+class ParseMetrics:
+    """
+    每类响应（evaluate / blitz_batch / blitz_item）的解析结果：
+    clean = 直接解析成功；salvaged = 从不完整 / 被污染的文本里捞回（部分）结果；failed = 什么都没捞到
+    retries = 因解析失败或缺项而追加的请求；rerequested_ids = 追加请求里重新评分的短语数
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = {}
+        self.schema_rejections = 0
+
+    def _counts(self, source):
+        counts = self._sources.get(source)
+        if counts is None:
+            counts = self._sources[source] = {"responses": 0, "clean": 0, "salvaged": 0, "failed": 0,
+                                              "retries": 0, "rerequested_ids": 0}
+        return counts
+
+    def record(self, source, outcome, retry=False, rerequested=0):
+        with self._lock:
+            counts = self._counts(source)
+            counts["responses"] += 1
+            counts[outcome] += 1
+            if retry:
+                counts["retries"] += 1
+                counts["rerequested_ids"] += rerequested
+
+    def record_schema_rejection(self):
+        with self._lock:
+            self.schema_rejections += 1
+
+    def snapshot(self):
+        with self._lock:
+            totals = {"responses": 0, "clean": 0, "salvaged": 0, "failed": 0, "retries": 0, "rerequested_ids": 0}
+            for counts in self._sources.values():
+                for key, value in counts.items():
+                    totals[key] += value
+            responses = totals["responses"]
+            return {
+                **totals,
+                "sources": {source: dict(counts) for source, counts in self._sources.items()},
+                "parse_failure_rate": (totals["failed"] / responses) if responses else 0.0,
+                "salvage_rate": (totals["salvaged"] / responses) if responses else 0.0,
+                "retry_rate": (totals["retries"] / (responses - totals["retries"])) if responses > totals["retries"] else 0.0,
+                "schema_rejections": self.schema_rejections,
+                "schema_disabled": sorted(_unsupported),
+            }
+
+
+parse_metrics = ParseMetrics()
+
+
+def describe_metrics(snapshot):
+    """侧边栏一行摘要"""
+    return (f"🧩 JSON 解析 {snapshot['responses']} 次 · 失败率 {snapshot['parse_failure_rate']:.0%} · "
+            f"捞回 {snapshot['salvage_rate']:.0%} · 重试率 {snapshot['retry_rate']:.0%}"
+            + (f"（补评 {snapshot['rerequested_ids']} 项）" if snapshot['rerequested_ids'] else "")
+            + (f" · 不支持 Schema: {', '.join(snapshot['schema_disabled'])}" if snapshot['schema_disabled'] else ""))
@@ -0,0 +1,147 @@
+from blitz_engine import (
+    BatchSizeController, BlitzQueue, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, MIN_BATCH_SIZE, normalize_id,
+)
+
+
+def grade(batch, **statuses):
+    return [{"id": item_id, "status": statuses.get(str(item_id), "pass")} for item_id in batch]
+
+
+def test_normalize_id_accepts_numeric_strings():
+    assert normalize_id("3", {1, 2, 3}) == 3
+    assert normalize_id(" 2 ", {1, 2, 3}) == 2
+    assert normalize_id("9", {1, 2, 3}) is None
+    assert normalize_id("a", {"a"}) == "a"
+
+
+def test_settle_removes_passed_and_queues_failed_in_order():
+    queue = BlitzQueue("John", range(1, 8))
+    assert queue.next_batch(3) == [1, 2, 3]
+    outcomes = queue.settle([{"id": 3, "status": "fail"}, {"id": "1", "status": "FAIL"}, {"id": 2, "status": "warning"}])
+
+    assert outcomes == {3: "fail", 1: "fail", 2: "warning"}
+    assert list(queue.failed) == [1, 3]  # 按批次顺序重考，与结果顺序无关
+    assert queue.mastered == 1
+    assert list(queue.pending) == [4, 5, 6, 7]
+
+
+def test_unresolved_ids_go_back_to_the_front():
+    queue = BlitzQueue("John", range(1, 8))
+    queue.next_batch(3)
+    queue.settle([{"id": 2, "status": "pass"}, {"id": 42, "status": "fail"}])
+
+    assert list(queue.pending) == [1, 3, 4, 5, 6, 7]
+    assert queue.next_batch(3) == [1, 3, 4]
+
+
+def test_failed_ids_are_requeued_after_the_main_queue_empties():
+    queue = BlitzQueue("John", range(1, 6))
+    queue.settle(grade(queue.next_batch(3), **{"2": "fail"}))
+    queue.settle(grade(queue.next_batch(3), **{"5": "fail", "4": "fail"}))
+    assert not queue.pending
+
+    assert queue.next_batch(3) == [2, 4, 5]
+    assert queue.refills == 1
+    queue.settle(grade([2, 4, 5]))
+    assert queue.next_batch(3) == []
+    assert queue.stats()["completed"] == 5
+
+
+def test_duplicate_failures_are_queued_once():
+    queue = BlitzQueue("John", [1, 2])
+    queue.next_batch(2)
+    queue.settle([{"id": 1, "status": "fail"}, {"id": 1, "status": "pass"}])
+    assert list(queue.failed) == [1]
+    assert list(queue.pending) == [2]
+
+
+def test_settle_is_idempotent_and_rerun_keeps_the_batch():
+    queue = BlitzQueue("John", range(1, 8))
+    batch = queue.next_batch(3)
+    assert queue.next_batch(3) is batch  # rerun 不换题
+    queue.settle(grade(batch, **{"1": "fail"}))
+    assert queue.settle(grade(batch)) == {}
+    assert list(queue.failed) == [1]
+    assert queue.mastered == 2
+
+
+def test_clear_batch_returns_ungraded_ids_to_the_front():
+    queue = BlitzQueue("John", range(1, 8))
+    queue.next_batch(3)
+    queue.clear_batch()
+    assert list(queue.pending) == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_prepared_batch_is_reconciled_with_the_actual_batch():
+    queue = BlitzQueue("John", range(1, 6))
+    queue.next_batch(3)
+    assert queue.prepare_next(3) == [4, 5]
+    queue.settle(grade([1, 2, 3], **{"3": "fail"}))  # 3 未返回前的预测不含它
+    assert queue.next_batch(3) == [4, 5]
+    assert (queue.prepared_hits, queue.reconciled) == (2, 0)
+
+
+def test_peek_next_predicts_retries_when_the_main_queue_is_empty():
+    queue = BlitzQueue("John", [1, 2, 3])
+    queue.settle(grade(queue.next_batch(2), **{"1": "fail"}))
+    queue.next_batch(2)
+    assert queue.peek_next(3) == [1, 3]
+
+
+def test_first_healthy_batch_probes_upward():
+    controller = BatchSizeController()
+    assert controller.observe(5, cycle_seconds=20, rtt_seconds=3, passed=5, failed=0) == 6
+    assert controller.decisions == [(5, 6, "试探")]
+
+
+def test_empty_or_zero_length_batches_are_ignored():
+    controller = BatchSizeController()
+    assert controller.observe(5, 20, 3, passed=0, failed=0) == DEFAULT_BATCH_SIZE
+    assert controller.observe(5, 0, 3, passed=5, failed=0) == DEFAULT_BATCH_SIZE
+    assert controller.decisions == []
+    assert controller.calls == 0
+
+
+def test_high_failure_rate_shrinks_by_two_and_clamps_at_minimum():
+    controller = BatchSizeController(initial=4)
+    assert controller.observe(4, 20, 3, passed=0, failed=4) == MIN_BATCH_SIZE
+    assert controller.decisions[-1][2] == "失败率高，缩小批次"
+    assert controller.observe(MIN_BATCH_SIZE, 20, 3, passed=0, failed=3) == MIN_BATCH_SIZE
+
+
+def test_slow_grading_shrinks_by_one():
+    controller = BatchSizeController(slow_rtt=20.0)
+    assert controller.observe(5, 60, 45, passed=5, failed=0) == 4
+    assert controller.decisions[-1][2] == "评分往返过慢，缩小批次"
+
+
+def test_moderate_failure_rate_holds_instead_of_growing():
+    controller = BatchSizeController(fail_hold=0.3, fail_high=0.5)
+    assert controller.observe(5, 20, 3, passed=3, failed=2) == 5
+    assert controller.decisions[-1][2] == "失败率偏高，暂不加大"
+
+
+def test_size_never_exceeds_maximum():
+    controller = BatchSizeController(initial=MAX_BATCH_SIZE)
+    for _ in range(20):
+        size = controller.size
+        # 吞吐随批次增大：爬山会一直想加大，但不能越过上限
+        controller.observe(size, cycle_seconds=10, rtt_seconds=2, passed=size, failed=0)
+        assert MIN_BATCH_SIZE <= controller.size <= MAX_BATCH_SIZE
+
+
+def test_throughput_drop_reverses_direction():
+    controller = BatchSizeController(initial=5)
+    controller.observe(5, 20, 3, passed=5, failed=0)  # 15 个/分，试探 → 6
+    assert controller.observe(6, 40, 3, passed=6, failed=0) == 5  # 9 个/分 → 反向
+    assert controller.decisions[-1][2] == "吞吐下降，反向"
+
+
+def test_decisions_are_kept_in_memory_and_logged():
+    lines = []
+    controller = BatchSizeController(log=lines.append)
+    for _ in range(60):
+        controller.observe(controller.size, 20, 3, passed=controller.size, failed=0)
+    assert len(controller.decisions) == 50
+    assert len(lines) == 60
+    assert controller.stats()["phrases_per_call"] > 0
@@ -0,0 +1,71 @@
+import json
+
+from json_stream import IncrementalJSONObject, salvage_json_array, salvage_json_object
+
+ITEMS = [
+    {"id": 1, "status": "pass", "user_said": "abide", "feedback": "好"},
+    {"id": 2, "status": "fail", "user_said": "meat", "feedback": "不要用 'Meat'，{Establish} 更准确"},
+    {"id": 3, "status": "warning", "user_said": "remain", "feedback": "稍弱"},
+]
+
+
+def test_object_clean_and_fenced():
+    assert salvage_json_object('{"status": "pass"}') == ({"status": "pass"}, True)
+    fenced = '```json\n{"status": "PASS", "feedback": "ok"}\n```'
+    assert salvage_json_object(fenced) == ({"status": "PASS", "feedback": "ok"}, True)
+
+
+def test_object_with_chatter_is_salvaged_but_not_complete():
+    text = 'Sure! {"status": "warning", "feedback": "稍弱"} Hope this helps.'
+    assert salvage_json_object(text) == ({"status": "warning", "feedback": "稍弱"}, False)
+
+
+def test_truncated_object_keeps_finished_fields_and_partial_string():
+    text = '{"status": "fail", "user_said": "meat", "feedback": "不要用 \'Meat\'。保罗神学中'
+    value, complete = salvage_json_object(text)
+    assert complete is False
+    assert value["status"] == "fail"
+    assert value["user_said"] == "meat"
+    assert value["feedback"].startswith("不要用 'Meat'")
+
+
+def test_truncated_object_without_required_field_is_rejected():
+    assert salvage_json_object('{"user_said": "abide", "stat') == (None, False)
+    assert salvage_json_object("no json here") == (None, False)
+    assert salvage_json_object("") == (None, False)
+
+
+def test_array_clean_and_wrapped():
+    text = json.dumps(ITEMS, ensure_ascii=False)
+    assert salvage_json_array(text) == (ITEMS, True)
+    assert salvage_json_array(json.dumps({"results": ITEMS})) == (ITEMS, True)
+
+
+def test_truncated_array_keeps_complete_items():
+    text = json.dumps(ITEMS, ensure_ascii=False)
+    cut = text.index('{"id": 3') + 20
+    items, complete = salvage_json_array(text[:cut])
+    assert complete is False
+    assert items == ITEMS[:2]
+
+
+def test_truncated_inside_first_item_returns_nothing():
+    items, complete = salvage_json_array('[{"id": 1, "status": "pa')
+    assert (items, complete) == ([], False)
+
+
+def test_array_skips_broken_item_and_chatter():
+    parts = [json.dumps(item, ensure_ascii=False) for item in ITEMS]
+    parts[1] = parts[1].replace('"status": ', '"status" ', 1)
+    text = "Here are the results:\n[" + ", ".join(parts) + "]\nDone."
+    items, complete = salvage_json_array(text)
+    assert complete is False
+    assert [item["id"] for item in items] == [1, 3]
+
+
+def test_incremental_parser_matches_full_parse_at_any_split():
+    text = json.dumps(ITEMS[1], ensure_ascii=False)
+    for cut in range(1, len(text)):
+        parser = IncrementalJSONObject()
+        parser.feed(text[:cut])
+        assert parser.feed(text[cut:]) == ITEMS[1]
@@ -0,0 +1,151 @@
+import time
+import threading
+
+import pytest
+
+from llm_governor import BackendGate, GovernorTimeout, LLMGovernor, RetryNow
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        if retry_after is not None:
+            self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+
+def make_governor(cooldown=0.05, concurrency=4):
+    return LLMGovernor({"sim": {"rpm": 60000, "burst": 10, "concurrency": concurrency, "cooldown": cooldown}})
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_waiting_sessions_are_served_round_robin():
+    gate = BackendGate("sim", rpm=60000, burst=10, concurrency=1)
+    gate.acquire("holder")
+    order = []
+
+    def request(session_id):
+        gate.acquire(session_id)
+        order.append(session_id)
+        gate.release()
+
+    threads = []
+    for session_id in ["A", "A", "A", "B", "B"]:  # A 一次排 3 个请求，B 随后排 2 个
+        thread = threading.Thread(target=request, args=(session_id,))
+        thread.start()
+        threads.append(thread)
+        wait_for(lambda: gate.stats()["queue_depth"] == len(threads))
+    gate.release()
+    for thread in threads:
+        thread.join(2)
+
+    assert order == ["A", "B", "A", "B", "A"]
+    assert gate.stats()["in_flight"] == 0
+
+
+def test_acquire_times_out_and_leaves_the_queue():
+    gate = BackendGate("sim", rpm=60000, burst=10, concurrency=1)
+    gate.acquire("holder")
+    with pytest.raises(GovernorTimeout):
+        gate.acquire("late", timeout=0.05)
+    stats = gate.stats()
+    assert (stats["timeouts"], stats["queue_depth"], stats["waiting_sessions"]) == (1, 0, 0)
+
+
+def test_penalize_blocks_new_grants_until_the_cooldown_ends():
+    gate = BackendGate("sim", rpm=60000, burst=10, concurrency=4)
+    gate.penalize(0.1)
+    start = time.monotonic()
+    gate.acquire("s1")
+    assert time.monotonic() - start >= 0.09
+    assert gate.stats()["rate_limited"] == 1
+
+
+def test_429_cools_down_the_backend_and_retries():
+    governor = make_governor(cooldown=0.05)
+    responses = [RateLimitError(), "ok"]
+
+    def fn():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    start = time.monotonic()
+    assert governor.call("sim", "s1", fn) == "ok"
+    assert time.monotonic() - start >= 0.045
+    stats = governor.stats()["sim"]
+    assert (stats["granted"], stats["rate_limited"], stats["in_flight"]) == (2, 1, 0)
+
+
+def test_retry_after_header_overrides_the_cooldown():
+    governor = make_governor(cooldown=5.0)
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RateLimitError(retry_after=0.05)
+        return "ok"
+
+    assert governor.call("sim", "s1", fn) == "ok"
+    assert 0.045 <= calls[1] - calls[0] < 1.0
+
+
+def test_429_is_raised_after_the_last_retry():
+    governor = make_governor(cooldown=0.01)
+
+    def fn():
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        governor.call("sim", "s1", fn, retries=1)
+    stats = governor.stats()["sim"]
+    assert (stats["granted"], stats["rate_limited"], stats["in_flight"]) == (2, 1, 0)
+
+
+def test_other_errors_are_not_retried():
+    governor = make_governor()
+
+    def fn():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        governor.call("sim", "s1", fn)
+    stats = governor.stats()["sim"]
+    assert (stats["granted"], stats["in_flight"]) == (1, 0)
+
+
+def test_retry_now_takes_a_second_slot():
+    governor = make_governor()
+    calls = []
+
+    def fn():
+        calls.append(governor.stats()["sim"]["in_flight"])
+        if len(calls) == 1:
+            raise RetryNow("schema rejected")
+        return "plain"
+
+    assert governor.call("sim", "s1", fn) == "plain"
+    assert calls == [1, 1]  # 重试前已释放第一个名额
+    assert governor.stats()["sim"]["granted"] == 2
+
+
+def test_retry_now_on_the_last_attempt_raises_the_original_error():
+    governor = make_governor()
+
+    def fn():
+        try:
+            raise ValueError("400 schema not supported")
+        except ValueError as e:
+            raise RetryNow("fallback") from e
+
+    with pytest.raises(ValueError, match="schema not supported"):
+        governor.call("sim", "s1", fn, retries=0)
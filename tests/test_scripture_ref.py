@@ -0,0 +1,65 @@
+from scripture_ref import VERSE_MAX, RefIndex, ScriptureRef, book_number, format_ref, parse_ref, parse_refs, sort_cards
+
+JOHN = book_number("John")
+PSALMS = book_number("Psalms")
+
+
+def test_book_aliases():
+    assert JOHN == 43
+    assert book_number("1 Jn") == book_number("First John") == book_number("I John") == 62
+    assert book_number("Rom.") == 45
+    assert book_number("Hezekiah") is None
+
+
+def test_comma_listed_verses_stay_separate():
+    assert parse_refs("John 1:14, 16") == (
+        ScriptureRef(JOHN, 1, 14, 1, 14),
+        ScriptureRef(JOHN, 1, 16, 1, 16),
+    )
+
+
+def test_comma_list_with_range_and_chapter_change():
+    refs = parse_refs("John 1:14-16, 18; 3:16")
+    assert [format_ref(ref) for ref in refs] == ["John 1:14-16", "John 1:18", "John 3:16"]
+
+
+def test_comma_list_after_whole_chapter_lists_chapters():
+    refs = parse_refs("Psalm 23, 25-26")
+    assert refs == (
+        ScriptureRef(PSALMS, 23, 0, 23, VERSE_MAX),
+        ScriptureRef(PSALMS, 25, 0, 26, VERSE_MAX),
+    )
+
+
+def test_comma_list_ignores_unparseable_parts():
+    refs = parse_refs("John 1:14, see also 3:16, 18")
+    assert [format_ref(ref) for ref in refs] == ["John 1:14", "John 1:18"]
+
+
+def test_parse_ref_returns_first_part_of_a_list():
+    assert parse_ref("John 1:14, 16") == ScriptureRef(JOHN, 1, 14, 1, 14)
+
+
+def test_cross_chapter_range_and_default_book():
+    assert parse_ref("Rom 5:1-6:2") == ScriptureRef(45, 5, 1, 6, 2)
+    assert parse_ref("3:16", default_book="John") == ScriptureRef(JOHN, 3, 16, 3, 16)
+    assert parse_ref("3:16") is None
+
+
+def test_invalid_refs():
+    assert parse_refs("") == ()
+    assert parse_ref("John 3:16-3:10") is None
+    assert parse_ref("Chapter one") is None
+
+
+def test_sort_cards_canonical_order_with_unparseable_last():
+    cards = [{"ref": "John 3:16"}, {"ref": "???"}, {"ref": "Gen 1:1"}, {"ref": "John 1:14, 16"}]
+    assert [card["ref"] for card in sort_cards(cards)] == ["Gen 1:1", "John 1:14, 16", "John 3:16", "???"]
+
+
+def test_ref_index_overlap():
+    index = RefIndex.build([(parse_ref("John 1:1-18"), "prologue"), (parse_ref("John 3:16"), "gospel")])
+    assert [item for _, item in index.overlapping(parse_ref("John 1:14, 16"))] == ["prologue"]
+    assert not index.has_overlap(parse_ref("John 2:1"))
+    index.add(parse_ref("John 2"), "cana")
+    assert index.has_overlap(parse_ref("John 2:1"))
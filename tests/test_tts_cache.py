@@ -0,0 +1,88 @@
+import os
+import asyncio
+
+import pytest
+
+from tts_cache import TTSCache, CHINESE_VOICE, ESV_VOICE
+from prerender_audio import collect_jobs, fake_synthesize
+
+VOICE, RATE = CHINESE_VOICE
+
+
+def make_cache(tmp_path, chunks=(b"ID3", b"abc", b"def"), fail_after=None):
+    calls = []
+
+    async def synthesize(text, voice, rate):
+        calls.append((text, voice, rate))
+        for n, chunk in enumerate(chunks):
+            if fail_after is not None and n == fail_after:
+                raise ConnectionError("stream dropped")
+            await asyncio.sleep(0)
+            yield chunk
+
+    return TTSCache(str(tmp_path), synthesize=synthesize), calls
+
+
+def test_miss_writes_file_and_second_get_hits(tmp_path):
+    cache, calls = make_cache(tmp_path)
+    path = cache.get("**住在**我里面", VOICE, RATE)
+
+    with open(path, "rb") as f:
+        assert f.read() == b"ID3abcdef"
+    assert calls == [("住在我里面", VOICE, RATE)]
+
+    assert cache.get("住在我里面", VOICE, RATE) == path
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_voice_and_rate_are_part_of_the_key(tmp_path):
+    cache, calls = make_cache(tmp_path)
+    paths = {cache.get("Abide in me", voice, rate) for voice, rate in (CHINESE_VOICE, ESV_VOICE, (VOICE, "+0%"))}
+    assert len(paths) == 3
+    assert len(calls) == 3
+
+
+def test_failed_stream_leaves_no_partial_file(tmp_path):
+    cache, _ = make_cache(tmp_path, fail_after=2)
+    with pytest.raises(ConnectionError):
+        cache.get("Abide in me", VOICE, RATE)
+
+    assert os.listdir(tmp_path) == []
+    assert cache.lookup("Abide in me", VOICE, RATE) is None
+
+
+def test_empty_stream_is_not_cached(tmp_path):
+    cache, calls = make_cache(tmp_path, chunks=(b"", b""))
+    with pytest.raises(ValueError):
+        cache.get("Abide in me", VOICE, RATE)
+    assert os.listdir(tmp_path) == []
+
+    # 失败不会留下"命中"，下次仍重新合成
+    with pytest.raises(ValueError):
+        cache.get("Abide in me", VOICE, RATE)
+    assert len(calls) == 2
+
+
+def test_blank_text_is_rejected_before_synthesis(tmp_path):
+    cache, calls = make_cache(tmp_path)
+    with pytest.raises(ValueError):
+        cache.get("** `` **", VOICE, RATE)
+    assert calls == []
+
+
+def test_collect_jobs_skips_cached_and_duplicate_phrases(tmp_path):
+    cache = TTSCache(str(tmp_path), synthesize=fake_synthesize)
+    library = {
+        "John": [
+            {"ref": "John 15:4", "phrase_cn": "住在我里面", "phrase_en": "Abide in me"},
+            {"ref": "John 15:5", "phrase_cn": "住在我里面", "phrase_en": ""},
+        ],
+    }
+    cache.get("Abide in me", *ESV_VOICE)
+
+    jobs, cached = collect_jobs(library, cache)
+    assert cached == 1
+    assert jobs == [("John", "John 15:4", "住在我里面", *CHINESE_VOICE)]
@@ -0,0 +1,149 @@
+import os
+import re
+import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+
+# ==================== TTS 磁盘缓存 ====================
+# 文件名由 (清洗后文本, voice, rate) 的 sha256 决定：
+# - 同一文本/音色/语速永远命中同一个 mp3，不再发任何网络请求
+# - 文本或音色一变就是新文件，不会串书卷、不会复用旧音频
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "pulpit_power_cache")
+
+# (voice, rate)：app.py 播放与离线预渲染必须一致，否则哈希对不上
+CHINESE_VOICE = ("zh-CN-XiaoxiaoNeural", "-5%")
+ESV_VOICE = ("en-US-ChristopherNeural", "-10%")
+
+
+def clean_tts_text(text):
+    """清理 Markdown 符号和多余空白，避免 TTS 读出 * _ ` 等符号"""
+    clean_text = str(text or "")
+    clean_text = re.sub(r'[*_`\[\]()#]', '', clean_text)
+    clean_text = re.sub(r'\s+', ' ', clean_text).strip()
+    return clean_text
+
+
+def cache_key(text, voice, rate):
+    """(text, voice, rate) → 内容哈希（text 应为清洗后的文本）"""
+    payload = "\x1f".join([text, voice, rate])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def edge_stream(text, voice, rate):
+    """调用 edge_tts，逐块 yield mp3 字节（不在内存里拼接整段音频）"""
+    import edge_tts
+
+    # Set locale to UTF-8 to avoid encoding issues
+    os.environ['LC_ALL'] = 'C.UTF-8'
+    os.environ['LANG'] = 'C.UTF-8'
+
+    communicate = edge_tts.Communicate(text=text, voice=voice, rate=rate)
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            yield chunk["data"]
+
+
+class TTSCache:
+    """
+    内容寻址的 TTS 缓存（进程内共享）
+    synthesize: async 生成器 (text, voice, rate) -> 逐块 yield bytes，
+                默认 edge_tts，可替换为本地替身
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, synthesize=None):
+        self.cache_dir = cache_dir
+        self.synthesize = synthesize or edge_stream
+        self.hits = 0
+        self.misses = 0
+        self.first_chunk_seconds = []  # 最近若干次未命中的首块到达耗时
+        self._lock = threading.Lock()
+
+    def path_for(self, text, voice, rate):
+        """返回该 (text, voice, rate) 对应的缓存路径（不保证已存在）"""
+        key = cache_key(clean_tts_text(text), voice, rate)
+        return os.path.join(self.cache_dir, f"{key}.mp3")
+
+    def lookup(self, text, voice, rate):
+        """命中返回路径，否则返回 None（不计入统计）"""
+        path = self.path_for(text, voice, rate)
+        try:
+            if os.path.getsize(path) > 0:
+                return path
+        except OSError:
+            pass
+        return None
+
+    def _count_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    async def _render(self, clean_text, voice, rate):
+        """
+        未命中时的流式渲染：每个块到达即写入同目录 .part 文件并向外 yield，
+        全部写完后 os.replace 原子落盘；中途失败或被提前关闭则删除 .part
+        """
+        with self._lock:
+            self.misses += 1
+        path = self.path_for(clean_text, voice, rate)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        start = time.perf_counter()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in self.synthesize(clean_text, voice, rate):
+                    if not chunk:
+                        continue
+                    if size == 0:
+                        with self._lock:
+                            self.first_chunk_seconds = (self.first_chunk_seconds + [time.perf_counter() - start])[-50:]
+                    f.write(chunk)
+                    size += len(chunk)
+                    yield chunk
+            if size == 0:
+                raise ValueError("TTS returned no audio")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def aget(self, text, voice, rate):
+        """返回缓存中的 mp3 路径；未命中时流式合成直接写入缓存文件"""
+        clean_text = clean_tts_text(text)
+        if not clean_text:
+            raise ValueError("Text contains no valid characters after cleaning")
+
+        cached = self.lookup(clean_text, voice, rate)
+        if cached:
+            self._count_hit()
+            return cached
+
+        async for _ in self._render(clean_text, voice, rate):
+            pass
+        return self.path_for(clean_text, voice, rate)
+
+    def get(self, text, voice, rate):
+        """同步版本：命中时不启动事件循环"""
+        cached = self.lookup(text, voice, rate)
+        if cached:
+            self._count_hit()
+            return cached
+        return asyncio.run(self.aget(text, voice, rate))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            first_chunk = self.first_chunk_seconds
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "avg_first_chunk_seconds": (sum(first_chunk) / len(first_chunk)) if first_chunk else None,
+            }
+
+
+# 进程级共享实例：Streamlit 每次 rerun 不会重新导入模块，统计跨会话累积
+tts_cache = TTSCache()